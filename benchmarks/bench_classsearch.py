@@ -0,0 +1,83 @@
+import sys
+from pathlib import Path
+sys.path.append(Path(__file__).parents[1].as_posix())
+
+'''
+Benchmarks for searching class names as the user types.
+
+Run from the repository root:
+    python benchmarks/bench_classsearch.py [num_classes]
+'''
+import random
+import statistics
+import time
+
+from kivydesigner.classsearch import ClassNameIndex, split_humps
+from kivydesigner.uix.kivywidgetlistbox import KivyWidgetListBox
+from kivydesigner.uix.recyclegrouplistbox import RecycleGroupListBox
+
+def generate_classnames(num_classes, seed=0):
+    '''
+    Return num_classes unique names, made of 2 to 4 humps of the kivy class
+    names and a number, along with the kivy classes.
+    '''
+    rng = random.Random(seed)
+    kivy_classnames = KivyWidgetListBox.kivy_inheritance_tree.get_all_classes()
+    humps = sorted({hump for classname in kivy_classnames for hump in split_humps(classname)})
+    classnames = set(kivy_classnames)
+    while len(classnames) < num_classes:
+        classnames.add(''.join(rng.choices(humps, k=rng.randint(2, 4))) + str(rng.randint(0, 99)))
+    return classnames
+
+def bench_typing(index, text):
+    '''Return the seconds spent searching each prefix of the text, as if typed.'''
+    durations = list()
+    for idx in range(1, len(text) + 1):
+        start = time.perf_counter()
+        num_matches = len(index.search(text[:idx]))
+        durations.append(time.perf_counter() - start)
+    return durations, num_matches
+
+def bench_search(num_classes):
+    classnames = generate_classnames(num_classes)
+    start = time.perf_counter()
+    index = ClassNameIndex(classnames)
+    build_time = time.perf_counter() - start
+    print(f'class search ({len(index)} classes), index built in {build_time * 1000:.0f} ms')
+
+    for text in ('RecycleGridLayout', 'RGL', 'gridlay', 'TogBut', 'PopupHeader'):
+        durations, num_matches = bench_typing(index, text)
+        # The first keystrokes scan every name, later keystrokes filter the previous matches
+        print(f'  typed {text!r:20} {num_matches:5} matches, per keystroke: '
+            f'median {statistics.median(durations) * 1000:.3f} ms, '
+            f'max {max(durations) * 1000:.3f} ms')
+
+    queries = ('RGL', 'gridlay', 'TogBut', 'PopupHeader', 'ScrollView')
+    durations = list()
+    for query in queries * 20:
+        # Search from scratch, without the previous matches
+        index._last_query = None
+        start = time.perf_counter()
+        index.search(query)
+        durations.append(time.perf_counter() - start)
+    print(f'  cold queries: median {statistics.median(durations) * 1000:.3f} ms, '
+        f'max {max(durations) * 1000:.3f} ms')
+
+def bench_listbox_filter(num_classes):
+    '''Time each keystroke of the listbox search box, including the refresh of the RecycleView data.'''
+    listbox = RecycleGroupListBox()
+    listbox.add_group('USER DEFINED WIDGETS', generate_classnames(num_classes))
+    # Build the index before typing
+    listbox.filter_text = 'x'
+    listbox.filter_text = ''
+    durations = list()
+    for idx in range(1, len('RecGridLay') + 1):
+        start = time.perf_counter()
+        listbox.filter_text = 'RecGridLay'[:idx]
+        durations.append(time.perf_counter() - start)
+    print(f'  listbox filter, per keystroke: ' + ', '.join(f'{duration * 1000:.2f}' for duration in durations) + ' ms')
+
+if __name__ == '__main__':
+    num_classes = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    bench_search(num_classes)
+    bench_listbox_filter(num_classes)
@@ -0,0 +1,158 @@
+import sys
+from pathlib import Path
+sys.path.append(Path(__file__).parents[1].as_posix())
+
+'''
+Benchmarks for listing a large directory in the file explorer.
+
+Run from the repository root:
+    python benchmarks/bench_filechooser.py [num_files]
+'''
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from kivy.clock import Clock
+from kivy.uix.filechooser import FileChooserController
+from kivydesigner.uix.kdfilechooser import KDFilechooser
+from kivydesigner.uix.recyclefilechooser import RecycleFilechooser
+
+def _list_root(filechooser, update_files, num_files):
+    '''
+    Relist the root directory with update_files, and tick the clock until
+    every entry is shown. Return the seconds until the first entries were
+    shown, and the frame times.
+    '''
+    treeview = filechooser.layout.ids.treeview
+    frame_times, first_rows_time = list(), None
+    filechooser.dispatch('on_entries_cleared')
+    start = time.perf_counter()
+    update_files(filechooser)
+    frame_times.append(time.perf_counter() - start)
+    while len(treeview.root.nodes) < num_files:
+        frame_start = time.perf_counter()
+        Clock.tick()
+        frame_times.append(time.perf_counter() - frame_start)
+        if first_rows_time is None and treeview.root.nodes:
+            first_rows_time = time.perf_counter() - start
+    return first_rows_time, frame_times
+
+def bench_large_directory(num_files):
+    with tempfile.TemporaryDirectory() as root_dir:
+        for idx in range(num_files):
+            with open(os.path.join(root_dir, f'module{idx}.py'), 'w') as f:
+                f.write('')
+        filechooser = KDFilechooser(rootpath=root_dir)
+        for _ in range(3):
+            Clock.tick()
+        while filechooser.listing:
+            Clock.tick()
+
+        print(f'file explorer ({num_files} files)')
+        backends = (('background', KDFilechooser._update_files),
+            ('synchronous', FileChooserController._update_files))
+        for name, update_files in backends:
+            first_rows_time, frame_times = _list_root(filechooser, update_files, num_files)
+            print(f'  {name + ":":13} first rows after {first_rows_time * 1000:6.0f} ms, '
+                f'all rows after {sum(frame_times) * 1000:6.0f} ms, '
+                f'frame time median {statistics.median(frame_times) * 1000:5.1f} ms, '
+                f'max {max(frame_times) * 1000:6.1f} ms')
+
+def _wait_for_listing(filechooser):
+    while filechooser.listing:
+        Clock.tick()
+
+def bench_refresh_expanded_tree(num_dirs, num_files_per_dir):
+    '''Time refreshing an expanded tree after a single file was added.'''
+    with tempfile.TemporaryDirectory() as root_dir:
+        for dir_idx in range(num_dirs):
+            package_dir = os.path.join(root_dir, f'package{dir_idx}')
+            os.mkdir(package_dir)
+            for idx in range(num_files_per_dir):
+                with open(os.path.join(package_dir, f'module{idx}.py'), 'w') as f:
+                    f.write('')
+        filechooser = KDFilechooser(rootpath=root_dir)
+        for _ in range(3):
+            Clock.tick()
+        _wait_for_listing(filechooser)
+        treeview = filechooser.layout.ids.treeview
+        for node in list(treeview.root.nodes):
+            treeview.toggle_node(node)
+            _wait_for_listing(filechooser)
+
+        with open(os.path.join(root_dir, 'package0', 'added.py'), 'w') as f:
+            f.write('')
+        num_nodes = sum(1 for _ in treeview.iterate_all_nodes())
+        start = time.perf_counter()
+        filechooser.layout.refresh_entries()
+        _wait_for_listing(filechooser)
+        print(f'refresh of an expanded tree ({num_nodes} nodes), one file added: '
+            f'{(time.perf_counter() - start) * 1000:.0f} ms')
+
+def bench_recycle_explorer(num_files):
+    '''Time listing a large directory in the RecycleView explorer, and count its row widgets.'''
+    with tempfile.TemporaryDirectory() as root_dir:
+        for idx in range(num_files):
+            with open(os.path.join(root_dir, f'module{idx}.py'), 'w') as f:
+                f.write('')
+        explorer = RecycleFilechooser(size=(350, 800), size_hint=(None, None))
+        frame_times = list()
+        start = time.perf_counter()
+        explorer.rootpath = root_dir
+        while explorer.listing or len(explorer.recycleview.data) < num_files:
+            frame_start = time.perf_counter()
+            Clock.tick()
+            frame_times.append(time.perf_counter() - frame_start)
+        # Lay out the visible rows
+        frame_start = time.perf_counter()
+        Clock.tick()
+        frame_times.append(time.perf_counter() - frame_start)
+        num_widgets = len(explorer.recycleview.layout_manager.children)
+        print(f'recycle explorer ({num_files} files): all rows after '
+            f'{(time.perf_counter() - start) * 1000:.0f} ms, '
+            f'frame time max {max(frame_times) * 1000:.1f} ms, {num_widgets} row widgets')
+
+def _make_build_dir(root_dir, num_files):
+    build_dir = os.path.join(root_dir, 'build')
+    for idx in range(num_files):
+        if idx % 100 == 0:
+            subdir = os.path.join(build_dir, f'lib{idx // 100}')
+            os.makedirs(subdir)
+        with open(os.path.join(subdir, f'module{idx}.o'), 'w') as f:
+            f.write('')
+    return build_dir
+
+def bench_delete_large_directory(num_files):
+    '''Compare deleting a build folder on the UI thread, with deleting it in the background.'''
+    with tempfile.TemporaryDirectory() as root_dir:
+        build_dir = _make_build_dir(root_dir, num_files)
+        start = time.perf_counter()
+        shutil.rmtree(build_dir)
+        print(f'delete build folder ({num_files} files)')
+        print(f'  synchronous: UI blocked for {(time.perf_counter() - start) * 1000:.0f} ms')
+
+        _make_build_dir(root_dir, num_files)
+        filechooser = KDFilechooser(rootpath=root_dir)
+        for _ in range(3):
+            Clock.tick()
+        _wait_for_listing(filechooser)
+        build_node = filechooser.layout.ids.treeview.root.nodes[0]
+        frame_times = list()
+        start = time.perf_counter()
+        filechooser.delete_entry(build_node)
+        frame_times.append(time.perf_counter() - start)
+        while filechooser.file_operations_running:
+            frame_start = time.perf_counter()
+            Clock.tick()
+            frame_times.append(time.perf_counter() - frame_start)
+        print(f'  background:  done after {(time.perf_counter() - start) * 1000:.0f} ms, '
+            f'frame time max {max(frame_times) * 1000:.1f} ms')
+
+if __name__ == '__main__':
+    num_files = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    bench_large_directory(num_files)
+    bench_refresh_expanded_tree(20, 50)
+    bench_recycle_explorer(num_files)
+    bench_delete_large_directory(num_files * 5)
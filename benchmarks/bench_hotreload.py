@@ -0,0 +1,246 @@
+import sys
+from pathlib import Path
+sys.path.append(Path(__file__).parents[1].as_posix())
+
+'''
+Benchmarks for hot reloading kv strings in the visualization process.
+
+The send time is embedded in each kv string, and the visualizer reports the
+time until the next window flip, so the latency covers the full edit to 
+pixels path. time.perf_counter is system wide on Linux and Windows.
+
+Run from the repository root:
+    python benchmarks/bench_hotreload.py [num_reloads] [chrome_trace.json]
+'''
+import multiprocessing
+import pickle
+import statistics
+import time
+
+from kivydesigner.hotreload import HotReloadInstructionQueue, HotReloadApp, VisualizerProcess, \
+    run_visualization_app, default_mp_context
+from kivydesigner.reloadtrace import ReloadStats, ReloadTrace
+
+KV_TEMPLATE = \
+'''
+#:set sent_time {sent_time!r}
+BoxLayout:
+    orientation: 'vertical'
+    Label:
+        text: 'Reload {idx}'
+    GridLayout:
+        cols: 10
+        Button:
+            text: '0'
+        Button:
+            text: '1'
+        Button:
+            text: '2'
+        Button:
+            text: '3'
+        Button:
+            text: '4'
+'''
+
+def _visualize_and_report(reload_queue, latencies, in_place, standby=False):
+    from kivy.core.window import Window
+    from kivy.lang import Builder
+    load_string = Builder.load_string
+
+    def timed_load_string(kv_str, **kwargs):
+        root = load_string(kv_str, **kwargs)
+        sent_time = float(kv_str.split('sent_time ', 1)[1].split('\n', 1)[0])
+        def on_flip(*args):
+            Window.unbind(on_flip=on_flip)
+            latencies.put(time.perf_counter() - sent_time)
+        Window.bind(on_flip=on_flip)
+        return root
+    Builder.load_string = timed_load_string
+    run_visualization_app(reload_queue, in_place=in_place, standby=standby)
+
+def bench_reload_latency(num_reloads, in_place):
+    reload_queue = HotReloadInstructionQueue()
+    latencies = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_visualize_and_report, args=(reload_queue, latencies, in_place))
+    process.start()
+
+    results = list()
+    for idx in range(num_reloads + 1):
+        reload_queue.reload_kvstring(KV_TEMPLATE.format(sent_time=time.perf_counter(), idx=idx))
+        results.append(latencies.get(timeout=60))
+    reload_queue.stop_reload()
+    process.join()
+
+    # The first reload includes the window creation, report it separately
+    first_latency, reload_latencies = results[0], results[1:]
+    mode = 'in place' if in_place else 'app restart'
+    print(f'{mode} ({num_reloads} reloads)')
+    print(f'  first frame:    {first_latency * 1000:.1f} ms')
+    print(f'  median reload:  {statistics.median(reload_latencies) * 1000:.1f} ms')
+    print(f'  max reload:     {max(reload_latencies) * 1000:.1f} ms')
+
+def measure_first_frame(mp_context, warm):
+    '''
+    Return the latency from requesting a preview until its first frame. 
+    A cold preview starts its process on request, while a warm preview 
+    promotes a standby that was started ahead of time.
+    '''
+    reload_queue = HotReloadInstructionQueue(mp_context)
+    latencies = mp_context.Queue()
+    process = mp_context.Process(target=_visualize_and_report, 
+        args=(reload_queue, latencies, True, warm), daemon=True)
+    if warm:
+        process.start()
+        # Give the standby time to import kivy and create its window
+        time.sleep(5)
+    request_time = time.perf_counter()
+    if not warm:
+        process.start()
+    reload_queue.reload_kvstring(KV_TEMPLATE.format(sent_time=request_time, idx=0))
+    latency = latencies.get(timeout=60)
+    reload_queue.stop_reload()
+    process.join()
+    return latency
+
+def bench_first_frame(num_runs):
+    contexts = [('forkserver', default_mp_context()), ('spawn', multiprocessing.get_context('spawn'))]
+    if 'fork' in multiprocessing.get_all_start_methods():
+        contexts.append(('fork', multiprocessing.get_context('fork')))
+    print(f'first frame latency (median of {num_runs})')
+    for name, mp_context in contexts:
+        cold = statistics.median(measure_first_frame(mp_context, warm=False) for _ in range(num_runs))
+        warm = statistics.median(measure_first_frame(mp_context, warm=True) for _ in range(num_runs))
+        print(f'  {name + ":":12}cold {cold * 1000:.1f} ms, warm standby {warm * 1000:.1f} ms')
+
+TWEAK_KV_TEMPLATE = \
+'''
+<TweakedButton@Button>:
+    font_size: {font_size}
+
+GridLayout:
+    cols: 10
+    padding: dp({padding})
+'''
+
+def bench_property_tweak(num_buttons=500, num_tweaks=20):
+    '''Compare patching a property value against rebuilding the tree, in process.'''
+    from kivy.base import EventLoop
+    EventLoop.ensure_window()
+    app = HotReloadApp(HotReloadInstructionQueue())
+    kv_template = TWEAK_KV_TEMPLATE + ''.join(f'    TweakedButton:\n        text: "{idx}"\n' 
+        for idx in range(num_buttons))
+
+    def time_tweaks(patch):
+        elapsed = list()
+        for idx in range(num_tweaks):
+            if not patch:
+                # Forget the live document, so the tree is rebuilt
+                app._live_parser = None
+            start = time.perf_counter()
+            app.reload_kvstring(kv_template.format(font_size=10 + idx, padding=idx))
+            elapsed.append(time.perf_counter() - start)
+            assert app.last_reload_patched == patch or idx == 0
+        return statistics.median(elapsed[1:])
+
+    rebuild_time = time_tweaks(patch=False)
+    patch_time = time_tweaks(patch=True)
+    print(f'property tweak ({num_buttons} buttons, median of {num_tweaks - 1})')
+    print(f'  rebuild: {rebuild_time * 1000:.1f} ms')
+    print(f'  patch:   {patch_time * 1000:.1f} ms')
+    print(f'  speedup: {rebuild_time / patch_time:.1f}x')
+
+def bench_undo(num_buttons=500, num_undos=10):
+    '''Compare rebuilding against swapping in the cached tree, when undoing a structural edit.'''
+    from kivy.base import EventLoop
+    EventLoop.ensure_window()
+    app = HotReloadApp(HotReloadInstructionQueue())
+    kv_str = TWEAK_KV_TEMPLATE.format(font_size=10, padding=0) + ''.join(
+        f'    TweakedButton:\n        text: "{idx}"\n' for idx in range(num_buttons))
+    edited_kv_str = kv_str + '    Label:\n'
+
+    def time_undos(cached):
+        elapsed = list()
+        app.reload_kvstring(kv_str)
+        for idx in range(num_undos):
+            app.reload_kvstring(edited_kv_str)
+            if not cached:
+                app._tree_cache.clear()
+            start = time.perf_counter()
+            app.reload_kvstring(kv_str)
+            elapsed.append(time.perf_counter() - start)
+        return statistics.median(elapsed)
+
+    rebuild_time = time_undos(cached=False)
+    cached_time = time_undos(cached=True)
+    print(f'undo structural edit ({num_buttons} buttons, median of {num_undos})')
+    print(f'  rebuild:     {rebuild_time * 1000:.1f} ms')
+    print(f'  cached tree: {cached_time * 1000:.1f} ms')
+
+def bench_transport(num_labels=5000, num_keystrokes=50):
+    '''Compare the bytes sent and the latency of full and delta kv transports.'''
+    document = 'BoxLayout:\n' + ''.join(f'    Label:\n        text: "label {idx}"\n' for idx in range(num_labels))
+    edit_offset = len(document) // 2
+    print(f'kv transport ({len(document) / 1024:.0f} KiB document, {num_keystrokes} keystrokes)')
+
+    for delta_transport in (False, True):
+        reload_queue = HotReloadInstructionQueue(delta_transport=delta_transport)
+        sent_bytes = list()
+        put = reload_queue.queue.put
+        def measured_put(instruction):
+            sent_bytes.append(len(pickle.dumps(instruction)))
+            put(instruction)
+        reload_queue.queue.put = measured_put
+
+        reload_queue.reload_kvstring(document)
+        reload_queue.wait()
+        reload_queue.next_instruction()
+        sent_bytes.clear()
+
+        latencies = list()
+        text = document
+        for idx in range(num_keystrokes):
+            text = text[:edit_offset + idx] + 'x' + text[edit_offset + idx:]
+            start = time.perf_counter()
+            reload_queue.reload_kvstring(text)
+            reload_queue.wait()
+            received = reload_queue.next_instruction()
+            latencies.append(time.perf_counter() - start)
+            assert received.kv_str == text
+
+        mode = 'delta' if delta_transport else 'full'
+        print(f'  {mode + ":":7}{statistics.mean(sent_bytes):>9.0f} bytes/reload, '
+            f'median {statistics.median(latencies) * 1000:.3f} ms/reload')
+
+def bench_reload_stages(num_reloads, trace_path=None):
+    '''Report the p50 and p99 of each reload stage, from the visualizer's reload traces.'''
+    visualizer = VisualizerProcess(default_mp_context())
+    visualizer.start()
+    stats = ReloadStats()
+    for idx in range(num_reloads + 1):
+        visualizer.instructions.reload_kvstring(KV_TEMPLATE.format(sent_time=time.perf_counter(), idx=idx))
+        trace = visualizer.instructions.next_reply(timeout=60)
+        # Skip the ReloadResult sent before the trace
+        while not isinstance(trace, ReloadTrace):
+            trace = visualizer.instructions.next_reply(timeout=60)
+        # The first reload includes the window creation
+        if idx > 0:
+            stats.add(trace)
+    visualizer.stop()
+
+    print(f'reload stages ({num_reloads} in place reloads)')
+    for name, (p50, p99) in stats.summary().items():
+        print(f'  {name + ":":11}p50 {p50 * 1000:7.2f} ms, p99 {p99 * 1000:7.2f} ms')
+    if trace_path:
+        stats.write_chrome_trace(trace_path)
+        print(f'  chrome trace written to {trace_path}')
+
+if __name__ == '__main__':
+    num_reloads = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    trace_path = sys.argv[2] if len(sys.argv) > 2 else None
+    bench_reload_stages(num_reloads, trace_path)
+    bench_reload_latency(num_reloads, in_place=False)
+    bench_reload_latency(num_reloads, in_place=True)
+    bench_first_frame(num_runs=3)
+    bench_property_tweak()
+    bench_undo()
+    bench_transport()
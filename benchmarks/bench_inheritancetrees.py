@@ -0,0 +1,151 @@
+import sys
+from pathlib import Path
+sys.path.append(Path(__file__).parents[1].as_posix())
+
+'''
+Benchmarks for building inheritance trees from a synthetic kivy project.
+
+Run from the repository root:
+    python benchmarks/bench_inheritancetrees.py [num_files]
+'''
+import os
+import tempfile
+import time
+import tracemalloc
+
+from kivydesigner.inheritancetrees import InheritanceTreesBuilder, read_class_definitions
+from kivydesigner.scancache import ScanCache
+
+SYNTHETIC_MODULE = \
+'''
+from kivy.uix.widget import Widget
+from kivy.uix.boxlayout import BoxLayout
+
+def helper_{idx}(value):
+    return [value * i for i in range(10)]
+
+class GeneratedWidget{idx}(Widget):
+    def on_touch_down(self, touch):
+        return super().on_touch_down(touch)
+
+class GeneratedLayout{idx}(BoxLayout, GeneratedWidget{idx}):
+    spacing = {idx}
+
+    def compute(self):
+        return sum(helper_{idx}(self.spacing))
+'''
+
+def generate_project(root_dir, num_files, files_per_dir=100):
+    '''Write num_files synthetic modules, split across subdirectories.'''
+    for idx in range(num_files):
+        package_dir = os.path.join(root_dir, f'package{idx // files_per_dir}')
+        os.makedirs(package_dir, exist_ok=True)
+        with open(os.path.join(package_dir, f'module{idx}.py'), 'w') as f:
+            f.write(SYNTHETIC_MODULE.format(idx=idx))
+
+def time_build(project_dir, **build_kwargs):
+    builder = InheritanceTreesBuilder()
+    start = time.perf_counter()
+    builder.build_from_directory(project_dir, lambda filepath: True, **build_kwargs)
+    return time.perf_counter() - start, len(builder.tree)
+
+def bench_directory_build(num_files):
+    with tempfile.TemporaryDirectory() as project_dir:
+        generate_project(project_dir, num_files)
+        serial_time, serial_len = time_build(project_dir)
+        # Force a pool, even on single core machines where the build would run serially
+        max_workers = max(os.cpu_count() or 1, 2)
+        parallel_time, parallel_len = time_build(project_dir, parallel=True, max_workers=max_workers)
+        assert serial_len == parallel_len
+
+    print(f'build_from_directory ({num_files} files, {os.cpu_count()} cpus, {max_workers} workers)')
+    print(f'  serial:   {serial_time:.3f} s')
+    print(f'  parallel: {parallel_time:.3f} s')
+    print(f'  speedup:  {serial_time / parallel_time:.2f}x')
+
+def bench_scan_cache(num_files):
+    with tempfile.TemporaryDirectory() as project_dir, tempfile.TemporaryDirectory() as cache_dir:
+        generate_project(project_dir, num_files)
+        uncached_time, _ = time_build(project_dir)
+        cold_time, _ = time_build(project_dir, scan_cache=ScanCache.for_project(project_dir, cache_dir))
+        warm_time, _ = time_build(project_dir, scan_cache=ScanCache.for_project(project_dir, cache_dir))
+
+    print(f'build_from_directory with ScanCache ({num_files} files)')
+    print(f'  no cache:   {uncached_time:.3f} s')
+    print(f'  cold cache: {cold_time:.3f} s')
+    print(f'  warm cache: {warm_time:.3f} s')
+    print(f'  speedup:    {uncached_time / warm_time:.2f}x')
+
+def measure_extraction(filepaths, fast_scan):
+    start = time.perf_counter()
+    for filepath in filepaths:
+        read_class_definitions(filepath, fast_scan=fast_scan)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for filepath in filepaths:
+        read_class_definitions(filepath, fast_scan=fast_scan)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak_memory
+
+def bench_class_extraction(num_modules=20, classes_per_module=500):
+    with tempfile.TemporaryDirectory() as project_dir:
+        filepaths = list()
+        for module_idx in range(num_modules):
+            filepath = os.path.join(project_dir, f'large_module{module_idx}.py')
+            with open(filepath, 'w') as f:
+                for class_idx in range(classes_per_module):
+                    f.write(SYNTHETIC_MODULE.format(idx=class_idx))
+            filepaths.append(filepath)
+        ast_time, ast_memory = measure_extraction(filepaths, fast_scan=False)
+        scan_time, scan_memory = measure_extraction(filepaths, fast_scan=True)
+
+    print(f'read_class_definitions ({num_modules} modules, {classes_per_module * 2} classes each)')
+    print(f'  ast.parse:   {ast_time:.3f} s, peak {ast_memory / 2**20:.1f} MiB')
+    print(f'  header scan: {scan_time:.3f} s, peak {scan_memory / 2**20:.1f} MiB')
+    print(f'  speedup:     {ast_time / scan_time:.2f}x')
+
+def bench_closure_queries(num_classes=20000, num_queries=100):
+    builder = InheritanceTreesBuilder.kivy_widget_tree()
+    tree = builder.tree
+    for idx in range(num_classes):
+        # Every user class shares the Widget and Layout diamond
+        tree.add_class('', f'UserWidget{idx}', ['BoxLayout', 'FloatLayout'] if idx % 2 else [f'UserWidget{idx - 1}'])
+
+    start = time.perf_counter()
+    first_result = tree.get_subclasses('Widget')
+    first_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(num_queries):
+        tree.get_subclasses('Widget')
+    repeat_time = (time.perf_counter() - start) / num_queries
+
+    print(f'get_subclasses(\'Widget\') ({len(first_result)} subclasses)')
+    print(f'  first query:    {first_time * 1000:.2f} ms')
+    print(f'  repeated query: {repeat_time * 1000:.2f} ms')
+
+def bench_remove_source(num_files=5000, classes_per_file=10, num_refreshes=100):
+    tree = InheritanceTreesBuilder.kivy_widget_tree().tree
+    for file_idx in range(num_files):
+        for class_idx in range(classes_per_file):
+            tree.add_class(f'module{file_idx}.py', f'UserWidget{file_idx}_{class_idx}', ['BoxLayout'])
+
+    start = time.perf_counter()
+    for file_idx in range(num_refreshes):
+        # Mimic refresh_source_file, by removing and re-adding each class
+        tree.remove_source(f'module{file_idx}.py')
+        for class_idx in range(classes_per_file):
+            tree.add_class(f'module{file_idx}.py', f'UserWidget{file_idx}_{class_idx}', ['BoxLayout'])
+    refresh_time = (time.perf_counter() - start) / num_refreshes
+
+    print(f'remove_source + add_class ({len(tree)} classes, {classes_per_file} classes per file)')
+    print(f'  per file refresh: {refresh_time * 1000:.3f} ms')
+
+if __name__ == '__main__':
+    num_files = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    bench_directory_build(num_files)
+    bench_scan_cache(num_files)
+    bench_class_extraction()
+    bench_closure_queries()
+    bench_remove_source()
@@ -0,0 +1,95 @@
+import sys
+from pathlib import Path
+sys.path.append(Path(__file__).parents[1].as_posix())
+
+'''
+Benchmarks for populating the widget listbox from a synthetic kivy project,
+and for the TreeView and RecycleView group listbox backends.
+
+Run from the repository root:
+    python benchmarks/bench_widgetlistbox.py [num_files] [num_entries]
+'''
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from kivy.clock import Clock
+from kivydesigner.uix.grouplistbox import GroupListBox
+from kivydesigner.uix.recyclegrouplistbox import RecycleGroupListBox
+from kivydesigner.uix.kivywidgetlistbox import KivyWidgetListBox
+from bench_inheritancetrees import generate_project
+
+def bench_background_scan(num_files):
+    '''Compare the blocking scan against the longest frame during a background scan.'''
+    with tempfile.TemporaryDirectory() as project_dir:
+        generate_project(os.path.join(project_dir, 'project'), num_files)
+        # Keep the user scan cache out of the benchmark, and measure cold scans
+        os.environ['XDG_CACHE_HOME'] = os.path.join(project_dir, '.cache')
+        os.environ['LOCALAPPDATA'] = os.path.join(project_dir, '.cache')
+        project_path = os.path.join(project_dir, 'project')
+
+        listbox = KivyWidgetListBox()
+        listbox.project_path = project_path
+        listbox.cancel_scan()
+        Clock.tick()
+
+        start = time.perf_counter()
+        listbox.update_user_defined_widgets()
+        blocking_time = time.perf_counter() - start
+        num_widgets = len(listbox.get_group_items('USER DEFINED WIDGETS'))
+        for cache_file in Path(project_dir, '.cache').rglob('*.json'):
+            cache_file.unlink()
+
+        frame_times = list()
+        start = time.perf_counter()
+        listbox.scan_user_defined_widgets()
+        while listbox.scanning:
+            frame_start = time.perf_counter()
+            Clock.tick()
+            frame_times.append(time.perf_counter() - frame_start)
+        scan_time = time.perf_counter() - start
+        assert len(listbox.get_group_items('USER DEFINED WIDGETS')) == num_widgets
+
+    print(f'listbox scan ({num_files} files, {num_widgets} user widgets)')
+    print(f'  blocking scan:    {blocking_time * 1000:.0f} ms frozen')
+    print(f'  background scan:  {scan_time * 1000:.0f} ms total, {len(frame_times)} frames')
+    print(f'  frame time:       median {statistics.median(frame_times) * 1000:.1f} ms, '
+        f'max {max(frame_times) * 1000:.1f} ms')
+
+def _build_listbox(listbox_cls, items):
+    '''Build and lay out a listbox with a single group. Return the listbox and the seconds taken.'''
+    start = time.perf_counter()
+    listbox = listbox_cls(size=(300, 600), size_hint=(None, None))
+    listbox.add_group('USER DEFINED WIDGETS', items)
+    Clock.tick()
+    Clock.tick()
+    return listbox, time.perf_counter() - start
+
+def bench_group_listboxes(num_entries):
+    '''Compare the build time, memory and clear time of the TreeView and RecycleView backends.'''
+    items = [f'UserWidget{idx}' for idx in range(num_entries)]
+    print(f'group listbox ({num_entries} entries)')
+    # The TreeView goes last, since its leftover widgets slow down the garbage collector
+    for listbox_cls in (RecycleGroupListBox, GroupListBox):
+        listbox, build_time = _build_listbox(listbox_cls, items)
+        start = time.perf_counter()
+        listbox.clear()
+        Clock.tick()
+        clear_time = time.perf_counter() - start
+
+        # Measure the memory on a separate build, since tracemalloc slows the build down
+        tracemalloc.start()
+        listbox = _build_listbox(listbox_cls, items)
+        allocated, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del listbox
+        print(f'  {listbox_cls.__name__ + ":":21} build {build_time * 1000:6.0f} ms, '
+            f'{allocated / 2**20:6.1f} MiB, clear {clear_time * 1000:6.1f} ms')
+
+if __name__ == '__main__':
+    num_files = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    num_entries = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    bench_background_scan(num_files)
+    bench_group_listboxes(num_entries)
@@ -0,0 +1,142 @@
+'''
+classsearch.py finds class names matching a search query, as the user types.
+
+A class name matches a query if the query is a case insensitive substring
+of the name, or if the query is a camel case abbreviation of the name.
+Abbreviations start with an uppercase letter, and each uppercase letter
+starts a part that must prefix a hump of the name, in order. For example,
+'RGL' and 'RecGLay' both abbreviate RecycleGridLayout.
+
+The ClassNameIndex maps each lowercase substring of up to 3 characters to
+the names containing it, and each ordered pair of hump initials to the
+names with those humps. Queries of up to 3 characters are a single lookup,
+and longer queries only check the names sharing all of their trigrams.
+Abbreviations only check the names sharing their first initials pair,
+and the first characters of each part. Typing usually extends the
+previous query, and extending a query can only remove matches, so the
+candidates are narrowed down to the previous matches before they are
+checked.
+'''
+
+import re
+from collections import defaultdict
+
+_HUMP_PATTERN = re.compile(r'[A-Z][a-z0-9_]*|[a-z0-9_]+')
+_QUERY_PART_PATTERN = re.compile(r'[A-Z][^A-Z]*')
+
+def split_humps(name):
+    '''Split a camel case name into its humps, e.g. RecycleGridLayout -> Recycle, Grid, Layout.'''
+    return tuple(_HUMP_PATTERN.findall(name))
+
+_EMPTY = frozenset()
+
+def _trigrams(text):
+    return {text[idx:idx + 3] for idx in range(len(text) - 2)}
+
+def _ngrams(text):
+    '''Return the substrings of the text of up to 3 characters.'''
+    return {text[idx:idx + size] for size in (1, 2, 3) for idx in range(len(text) - size + 1)}
+
+def _initial_pairs(humps):
+    initials = [hump[0] for hump in humps]
+    return {first + second for idx, first in enumerate(initials) for second in initials[idx + 1:]}
+
+def _is_abbreviation(query_parts, humps):
+    # Matching each part to the first hump it prefixes never
+    # prevents the remaining parts from matching.
+    hump_idx = 0
+    for part in query_parts:
+        while hump_idx < len(humps) and not humps[hump_idx].startswith(part):
+            hump_idx += 1
+        if hump_idx == len(humps):
+            return False
+        hump_idx += 1
+    return True
+
+class ClassNameIndex:
+    '''
+    Index of class names for incremental substring and camel case searches.
+    See the module docstring for the matching rules.
+    '''
+    def __init__(self, names=()):
+        self._names = dict()
+        '''Map of name to its (lowercase name, humps) tuple.'''
+        self._ngrams = defaultdict(set)
+        '''Map of each lowercase substring of up to 3 characters to the names containing it.'''
+        self._initial_pairs = defaultdict(set)
+        self._last_query = None
+        self._last_matches = None
+        for name in names:
+            self.add(name)
+
+    @classmethod
+    def from_tree(cls, tree, classnames=None):
+        '''Index the classnames of an InheritanceTrees, or all of its classes.'''
+        return cls(tree.get_all_classes() if classnames is None else classnames)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def add(self, name):
+        if name in self._names:
+            return
+        lower_name, humps = name.lower(), split_humps(name)
+        self._names[name] = (lower_name, humps)
+        for ngram in _ngrams(lower_name):
+            self._ngrams[ngram].add(name)
+        for pair in _initial_pairs(humps):
+            self._initial_pairs[pair].add(name)
+        self._last_query = None
+
+    def remove(self, name):
+        if name not in self._names:
+            return
+        lower_name, humps = self._names.pop(name)
+        for ngram in _ngrams(lower_name):
+            self._ngrams[ngram].discard(name)
+        for pair in _initial_pairs(humps):
+            self._initial_pairs[pair].discard(name)
+        self._last_query = None
+
+    def search(self, query):
+        '''
+        Return the set of names matching the query. An empty query matches
+        every name. The returned set must not be modified.
+        '''
+        if not query:
+            return set(self._names)
+        lower_query = query.lower()
+        query_parts = _QUERY_PART_PATTERN.findall(query) if query[0].isupper() else ()
+        previous_matches = self._last_matches if self._last_query is not None \
+            and query.startswith(self._last_query) else None
+        names = self._names
+
+        if len(lower_query) <= 3:
+            # The names containing a short query are exactly its ngram entry
+            matches = self._ngrams.get(lower_query, _EMPTY)
+        else:
+            # The names containing every trigram of the query, starting with the rarest trigram
+            postings = sorted((self._ngrams.get(trigram, _EMPTY) for trigram in _trigrams(lower_query)), key=len)
+            candidates = _narrow(postings[0].intersection(*postings[1:]), previous_matches)
+            matches = {name for name in candidates if lower_query in names[name][0]}
+
+        # A single part abbreviation is also a substring, so only
+        # abbreviations of several parts can add matches.
+        if len(query_parts) >= 2:
+            # Each part is also a substring of the name
+            postings = [self._ngrams.get(part[:3].lower(), _EMPTY) for part in query_parts]
+            postings.append(self._initial_pairs.get(query_parts[0][0] + query_parts[1][0], _EMPTY))
+            postings.sort(key=len)
+            candidates = _narrow(postings[0].intersection(*postings[1:]), previous_matches)
+            abbreviations = {name for name in candidates
+                if name not in matches and _is_abbreviation(query_parts, names[name][1])}
+            if abbreviations:
+                matches = matches | abbreviations
+        self._last_query, self._last_matches = query, matches
+        return matches
+
+def _narrow(candidates, previous_matches):
+    return candidates if previous_matches is None else candidates & previous_matches
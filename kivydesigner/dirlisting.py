@@ -0,0 +1,157 @@
+'''
+dirlisting.py lists directories on background threads, so expanding a
+large directory, or a directory on a network share, does not block the UI.
+
+Each listing runs os.scandir on its own thread and reports the entries in
+chunks, so the first rows can be shown before the directory is fully
+listed. The first chunk is kept small for that reason.
+
+Listings only use the file type reported by scandir, so listing a
+directory does not stat each entry. The DirEntry of each ListedEntry is
+kept, and caches its stat result the first time it is needed. Listings are
+cached per directory, keyed by the directory mtime. Adding, removing or
+renaming an entry updates the directory mtime, so re-listing an unchanged
+directory only costs a single stat.
+
+The on_chunk callback is invoked from the listing thread. Kivy widgets
+must only be updated from the main thread, so UI callbacks should be
+wrapped with kivy.clock.mainthread, or queue the chunks for a Clock trigger.
+'''
+
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+DEFAULT_FIRST_CHUNK_SIZE = 50
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_MAX_CACHED_DIRS = 64
+
+@dataclass
+class ListedEntry:
+    name: str
+    path: str
+    is_dir: bool
+    dir_entry: os.DirEntry = field(default=None, repr=False, compare=False)
+
+    @property
+    def is_hidden(self):
+        return self.name.startswith('.')
+
+    def stat(self):
+        '''Return the stat result of the entry. The DirEntry caches it after the first call.'''
+        if self.dir_entry is None:
+            return os.stat(self.path)
+        return self.dir_entry.stat()
+
+def _listed_entry(dir_entry):
+    try:
+        # Uses the file type reported by scandir, without a system call on most platforms
+        is_dir = dir_entry.is_dir()
+    except OSError:
+        is_dir = False
+    return ListedEntry(dir_entry.name, dir_entry.path, is_dir, dir_entry)
+
+class ListingRequest:
+    '''A running directory listing. Call cancel to stop reporting its chunks.'''
+    def __init__(self, path, on_chunk):
+        self.path = path
+        self.on_chunk = on_chunk
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+class DirectoryLister:
+    '''
+    List directories on background threads. Completed listings are cached
+    for the max_cached_dirs most recently listed directories.
+    '''
+    def __init__(self, first_chunk_size=DEFAULT_FIRST_CHUNK_SIZE, chunk_size=DEFAULT_CHUNK_SIZE,
+        max_cached_dirs=DEFAULT_MAX_CACHED_DIRS):
+        self.first_chunk_size = first_chunk_size
+        self.chunk_size = chunk_size
+        self.max_cached_dirs = max_cached_dirs
+        self._cache = OrderedDict()
+        '''Map of directory path to its (mtime_ns, [ListedEntry]) tuple.'''
+        self._cache_lock = threading.Lock()
+
+    def list_directory(self, path, on_chunk):
+        '''
+        Start listing the directory, and return its ListingRequest. on_chunk
+        is called from the listing thread with the request, a list of
+        ListedEntry and True for the last chunk. The last chunk may be
+        empty. Errors, such as a missing directory, end the listing with
+        an empty last chunk.
+        '''
+        request = ListingRequest(os.path.abspath(path), on_chunk)
+        threading.Thread(target=self._run, args=(request,), daemon=True,
+            name=f'DirectoryLister({request.path})').start()
+        return request
+
+    def list_directory_sync(self, path):
+        '''List the directory on the calling thread. Return the list of ListedEntry.'''
+        entries = list()
+        request = ListingRequest(os.path.abspath(path), lambda request, chunk, is_last: entries.extend(chunk))
+        self._run(request)
+        return entries
+
+    def invalidate(self, path=None):
+        '''Drop the cached listing of the directory, or of every directory.'''
+        with self._cache_lock:
+            if path is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(os.path.abspath(path), None)
+
+    def _run(self, request):
+        try:
+            dir_mtime_ns = os.stat(request.path).st_mtime_ns
+        except OSError:
+            request.on_chunk(request, [], True)
+            return
+
+        with self._cache_lock:
+            cached = self._cache.get(request.path)
+            if cached and cached[0] == dir_mtime_ns:
+                self._cache.move_to_end(request.path)
+        if cached and cached[0] == dir_mtime_ns:
+            self._report_cached(request, cached[1])
+            return
+
+        entries, chunk = list(), list()
+        chunk_size = self.first_chunk_size
+        try:
+            with os.scandir(request.path) as dir_entries:
+                for dir_entry in dir_entries:
+                    if request.is_cancelled():
+                        return
+                    chunk.append(_listed_entry(dir_entry))
+                    if len(chunk) >= chunk_size:
+                        request.on_chunk(request, chunk, False)
+                        entries.extend(chunk)
+                        chunk, chunk_size = list(), self.chunk_size
+        except OSError:
+            # Report what was listed. The listing is not cached.
+            request.on_chunk(request, chunk, True)
+            return
+        entries.extend(chunk)
+        request.on_chunk(request, chunk, True)
+
+        with self._cache_lock:
+            self._cache[request.path] = (dir_mtime_ns, entries)
+            self._cache.move_to_end(request.path)
+            while len(self._cache) > self.max_cached_dirs:
+                self._cache.popitem(last=False)
+
+    def _report_cached(self, request, entries):
+        start, chunk_size = 0, self.first_chunk_size
+        while start + chunk_size < len(entries):
+            if request.is_cancelled():
+                return
+            request.on_chunk(request, entries[start:start + chunk_size], False)
+            start, chunk_size = start + chunk_size, self.chunk_size
+        request.on_chunk(request, entries[start:], True)
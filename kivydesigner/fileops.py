@@ -0,0 +1,261 @@
+'''
+fileops.py runs file operations on a background thread, so deleting or
+copying a large directory, such as a build folder, does not block the UI.
+
+Operations run one at a time, in the order they were submitted, on a
+single worker thread, since an operation may depend on the previous ones.
+Each operation first lists the files and directories it will process, and
+then reports its progress as they are processed. Operations are cancelled
+between files.
+
+A failed or cancelled copy removes the files it already copied. A move
+within a device is a single rename. A move across devices copies the
+files, and then deletes the source, so it leaves the source in place if it
+fails or is cancelled while copying. Deleted files can not be restored, so
+a failed or cancelled deletion leaves the remaining files in place.
+
+The on_progress and on_done callbacks are invoked from the worker thread.
+Kivy widgets must only be updated from the main thread, so UI callbacks
+should be wrapped with kivy.clock.mainthread.
+'''
+
+import errno
+import os
+import shutil
+import threading
+import time
+from collections import deque
+
+DELETE = 'delete'
+RENAME = 'rename'
+COPY = 'copy'
+MOVE = 'move'
+DEFAULT_PROGRESS_INTERVAL = 0.1
+
+class _Cancelled(Exception):
+    pass
+
+class FileOperation:
+    '''A submitted file operation. Call cancel to stop it before its next file.'''
+    def __init__(self, kind, src, dst, on_progress, on_done):
+        self.kind = kind
+        self.src = os.path.abspath(src)
+        self.dst = os.path.abspath(dst) if dst is not None else None
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.num_done = 0
+        self.num_total = 0
+        self.error = None
+        '''The OSError that failed the operation.'''
+        self._cancelled = threading.Event()
+        self._finished = False
+        self._done = threading.Event()
+        self._last_progress = 0
+
+    @property
+    def progress(self):
+        '''Fraction of the files processed, from 0 to 1.'''
+        return self.num_done / self.num_total if self.num_total else 0
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def is_done(self):
+        return self._finished
+
+    def succeeded(self):
+        return self.is_done() and self.error is None and not self.is_cancelled()
+
+    def wait(self, timeout=None):
+        '''Wait until the operation is done, and on_done returned. Return False on timeout.'''
+        return self._done.wait(timeout)
+
+class FileOperationWorker:
+    '''Run file operations on a background thread, one at a time.'''
+    def __init__(self, progress_interval=DEFAULT_PROGRESS_INTERVAL):
+        self.progress_interval = progress_interval
+        '''Minimum seconds between the progress reports of an operation.'''
+        self._operations = deque()
+        self._current = None
+        self._lock = threading.Lock()
+        self._running = False
+
+    def delete(self, path, on_progress=None, on_done=None):
+        '''Delete the file or directory.'''
+        return self.submit(DELETE, path, None, on_progress, on_done)
+
+    def rename(self, src, dst, on_progress=None, on_done=None):
+        '''Rename the file or directory. Fails if dst exists.'''
+        return self.submit(RENAME, src, dst, on_progress, on_done)
+
+    def copy(self, src, dst, on_progress=None, on_done=None):
+        '''Copy the file or directory to dst. Fails if dst exists.'''
+        return self.submit(COPY, src, dst, on_progress, on_done)
+
+    def move(self, src, dst, on_progress=None, on_done=None):
+        '''Move the file or directory to dst, across devices if needed. Fails if dst exists.'''
+        return self.submit(MOVE, src, dst, on_progress, on_done)
+
+    def submit(self, kind, src, dst=None, on_progress=None, on_done=None):
+        '''
+        Queue the operation, and return its FileOperation. on_progress is
+        called with the operation as files are processed, at most every
+        progress_interval. on_done is called with the operation once it
+        succeeded, failed or was cancelled.
+        '''
+        operation = FileOperation(kind, src, dst, on_progress, on_done)
+        with self._lock:
+            self._operations.append(operation)
+            if not self._running:
+                self._running = True
+                threading.Thread(target=self._run, daemon=True, name='FileOperationWorker').start()
+        return operation
+
+    def cancel_all(self):
+        '''Cancel the running operation, and every queued operation.'''
+        with self._lock:
+            for operation in self._operations:
+                operation.cancel()
+            self._operations.clear()
+            if self._current is not None:
+                self._current.cancel()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._operations:
+                    self._running = False
+                    self._current = None
+                    return
+                operation = self._current = self._operations.popleft()
+            self._run_operation(operation)
+
+    def _run_operation(self, operation):
+        try:
+            if operation.is_cancelled():
+                raise _Cancelled()
+            if operation.kind == DELETE:
+                self._delete(operation)
+            elif operation.kind == RENAME:
+                self._rename(operation)
+            elif operation.kind == COPY:
+                self._copy(operation)
+            elif operation.kind == MOVE:
+                self._move(operation)
+            else:
+                raise ValueError(f'Unknown file operation {operation.kind!r}')
+        except _Cancelled:
+            pass
+        except OSError as e:
+            operation.error = e
+        finally:
+            operation._finished = True
+            try:
+                if operation.on_done is not None:
+                    operation.on_done(operation)
+            finally:
+                operation._done.set()
+
+    def _advance(self, operation):
+        operation.num_done += 1
+        now = time.perf_counter()
+        if operation.on_progress is not None and (operation.num_done == operation.num_total
+                or now - operation._last_progress >= self.progress_interval):
+            operation._last_progress = now
+            operation.on_progress(operation)
+
+    def _check_cancelled(self, operation):
+        if operation.is_cancelled():
+            raise _Cancelled()
+
+    def _check_dst(self, operation):
+        # os.rename silently replaces files on posix
+        if os.path.lexists(operation.dst):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), operation.dst)
+
+    def _rename(self, operation):
+        self._check_dst(operation)
+        operation.num_total = 1
+        os.rename(operation.src, operation.dst)
+        self._advance(operation)
+
+    def _delete(self, operation, paths=None, cancellable=True):
+        paths = _delete_paths(operation.src) if paths is None else paths
+        operation.num_total = operation.num_total or len(paths)
+        for path, is_dir in paths:
+            if cancellable:
+                self._check_cancelled(operation)
+            if is_dir:
+                os.rmdir(path)
+            else:
+                os.remove(path)
+            self._advance(operation)
+
+    def _copy(self, operation, paths=None):
+        self._check_dst(operation)
+        paths = _copy_paths(operation.src, operation.dst) if paths is None else paths
+        operation.num_total = operation.num_total or len(paths)
+        try:
+            for src, dst, is_dir in paths:
+                self._check_cancelled(operation)
+                if is_dir:
+                    os.mkdir(dst)
+                    shutil.copystat(src, dst)
+                else:
+                    shutil.copy2(src, dst, follow_symlinks=False)
+                self._advance(operation)
+        except BaseException:
+            # Remove the partial copy. dst did not exist, so every file below it was copied.
+            if os.path.isdir(operation.dst) and not os.path.islink(operation.dst):
+                shutil.rmtree(operation.dst, ignore_errors=True)
+            elif os.path.lexists(operation.dst):
+                os.remove(operation.dst)
+            raise
+
+    def _move(self, operation):
+        self._check_dst(operation)
+        try:
+            operation.num_total = 1
+            os.rename(operation.src, operation.dst)
+            self._advance(operation)
+            return
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+        # Moving across devices copies the files, then deletes the source
+        copy_paths, delete_paths = _copy_paths(operation.src, operation.dst), _delete_paths(operation.src)
+        operation.num_done, operation.num_total = 0, len(copy_paths) + len(delete_paths)
+        self._copy(operation, copy_paths)
+        # Once copied, the move completes. Cancelling would leave the files in both places.
+        self._delete(operation, delete_paths, cancellable=False)
+
+def _raise(e):
+    raise e
+
+def _delete_paths(path):
+    '''Return the (path, is_dir) of the file, or of the directory and its contents, bottom up.'''
+    if os.path.islink(path) or not os.path.isdir(path):
+        return [(path, False)]
+    paths = list()
+    for dirpath, dirnames, filenames in os.walk(path, topdown=False, onerror=_raise):
+        paths.extend((os.path.join(dirpath, filename), False) for filename in filenames)
+        # os.walk lists the links to directories with the directories, without following them
+        paths.extend((os.path.join(dirpath, dirname), False) for dirname in dirnames
+            if os.path.islink(os.path.join(dirpath, dirname)))
+        paths.append((dirpath, True))
+    return paths
+
+def _copy_paths(src, dst):
+    '''Return the (src, dst, is_dir) of the file, or of the directory and its contents, top down.'''
+    if os.path.islink(src) or not os.path.isdir(src):
+        return [(src, dst, False)]
+    paths = list()
+    for dirpath, dirnames, filenames in os.walk(src, onerror=_raise):
+        dst_dirpath = dst + dirpath[len(src):]
+        paths.append((dirpath, dst_dirpath, True))
+        names = filenames + [dirname for dirname in dirnames if os.path.islink(os.path.join(dirpath, dirname))]
+        paths.extend((os.path.join(dirpath, name), os.path.join(dst_dirpath, name), False) for name in names)
+    return paths
@@ -0,0 +1,334 @@
+'''
+filewatcher.py notifies the designer when files within a project directory
+change on disk.
+
+Changes are detected on a background thread, using inotify when it is
+available and periodically diffing a stat snapshot of the directory
+otherwise. Bursts of changes, such as a git checkout, are debounced and
+coalesced into a single FileChanges batch. The inotify watcher blocks
+until the kernel reports a change, so it does not use any CPU while idle.
+
+The on_changes callback is invoked from the watcher thread. Kivy widgets
+must only be updated from the main thread, so UI callbacks should be
+wrapped with kivy.clock.mainthread.
+'''
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import threading
+import ctypes
+import ctypes.util
+from dataclasses import dataclass, field
+
+DEFAULT_DEBOUNCE = 0.25
+'''Seconds without a new change before a batch of changes is reported.'''
+DEFAULT_MAX_DELAY = 2.0
+'''Maximum seconds a change can wait for the debounce during a continuous burst.'''
+DEFAULT_POLL_INTERVAL = 1.0
+'''Seconds between directory snapshots of the PollingFileWatcher.'''
+
+@dataclass
+class FileChanges:
+    paths: set = field(default_factory=set)
+    '''Paths of the files and directories that were created, modified, moved or deleted.'''
+    directories_changed: bool = False
+    '''True if a directory was moved or deleted, or if changes were dropped. The files
+    within the directory may have changed without being listed in paths.'''
+
+    def __bool__(self):
+        return bool(self.paths) or self.directories_changed
+
+def is_ignored_dir(dirname):
+    '''Hidden directories (.git, .venv, ...) and bytecode caches are not watched.'''
+    return dirname.startswith('.') or dirname == '__pycache__'
+
+class FileWatcher:
+    '''
+    Base class for the directory watchers. Subclasses detect changes, and
+    this class debounces them and reports each batch to on_changes.
+
+    Use create_file_watcher to create the best watcher for the platform.
+    '''
+    def __init__(self, root_path, on_changes, debounce=DEFAULT_DEBOUNCE,
+        max_delay=DEFAULT_MAX_DELAY, ignore_dir=is_ignored_dir):
+        self.root_path = os.path.abspath(root_path)
+        self.on_changes = on_changes
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.ignore_dir = ignore_dir
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        self._stopping.clear()
+        self._setup()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+            name=f'{type(self).__name__}({self.root_path})')
+        self._thread.start()
+
+    def stop(self):
+        '''Stop the watcher thread, and discard any changes that were not yet reported.'''
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wakeup()
+        self._thread.join()
+        self._thread = None
+        self._teardown()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        self._initial_scan()
+        changes = FileChanges()
+        first_change_time = last_change_time = None
+        while not self._stopping.is_set():
+            timeout = None
+            if changes:
+                now = time.monotonic()
+                flush_time = min(last_change_time + self.debounce, first_change_time + self.max_delay)
+                timeout = max(flush_time - now, 0)
+
+            # Only actual changes start or extend the debounce and max_delay windows
+            if self._wait_for_changes(timeout, changes) and changes:
+                last_change_time = time.monotonic()
+                first_change_time = first_change_time or last_change_time
+
+            if changes and not self._stopping.is_set():
+                now = time.monotonic()
+                if now - last_change_time >= self.debounce or now - first_change_time >= self.max_delay:
+                    self.on_changes(changes)
+                    changes = FileChanges()
+                    first_change_time = last_change_time = None
+
+    def _iter_watched_dirs(self, directory):
+        '''Yield the directory, and each of its subdirectories that is not ignored.'''
+        yield directory
+        try:
+            with os.scandir(directory) as entries:
+                subdirs = [entry.path for entry in entries
+                    if entry.is_dir(follow_symlinks=False) and not self.ignore_dir(entry.name)]
+        except OSError:
+            return
+        for subdir in subdirs:
+            yield from self._iter_watched_dirs(subdir)
+
+    def _setup(self):
+        '''Called from start, before the watcher thread is started.'''
+        pass
+
+    def _initial_scan(self):
+        '''Called from the watcher thread, before waiting for the first change.'''
+        pass
+
+    def _teardown(self):
+        pass
+
+    def _wakeup(self):
+        '''Wake the watcher thread if it is blocked in _wait_for_changes.'''
+        pass
+
+    def _wait_for_changes(self, timeout, changes):
+        '''
+        Block until changes are detected, the timeout expires or the watcher
+        is stopped. A timeout of None blocks indefinitely. Add the detected
+        changes to changes, and return True if any were detected.
+        '''
+        raise NotImplementedError()
+
+class PollingFileWatcher(FileWatcher):
+    '''
+    Detect changes by diffing a stat snapshot of the directory tree every
+    poll_interval seconds. Used on platforms without inotify.
+    '''
+    def __init__(self, root_path, on_changes, poll_interval=DEFAULT_POLL_INTERVAL, **kwargs):
+        super().__init__(root_path, on_changes, **kwargs)
+        self.poll_interval = poll_interval
+        self._snapshot = dict()
+
+    def _take_snapshot(self):
+        snapshot = dict()
+        for directory in self._iter_watched_dirs(self.root_path):
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            stat = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        if is_dir and self.ignore_dir(entry.name):
+                            continue
+                        snapshot[entry.path] = (is_dir, stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                continue
+        return snapshot
+
+    def _initial_scan(self):
+        self._snapshot = self._take_snapshot()
+
+    def _wait_for_changes(self, timeout, changes):
+        if timeout is None or timeout > self.poll_interval:
+            timeout = self.poll_interval
+        if self._stopping.wait(timeout):
+            return False
+
+        new_snapshot = self._take_snapshot()
+        old_snapshot = self._snapshot
+        self._snapshot = new_snapshot
+        changed_paths = {path for path, stat in new_snapshot.items() if old_snapshot.get(path) != stat}
+        removed_paths = old_snapshot.keys() - new_snapshot.keys()
+        if any(old_snapshot[path][0] for path in removed_paths):
+            changes.directories_changed = True
+        changed_paths.update(removed_paths)
+        changes.paths.update(changed_paths)
+        return bool(changed_paths)
+
+# inotify constants, from sys/inotify.h
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+_INOTIFY_WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        # Raises AttributeError if the libc does not provide inotify
+        libc.inotify_init1, libc.inotify_add_watch
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+_libc = _load_libc()
+
+def inotify_available():
+    return _libc is not None
+
+class InotifyFileWatcher(FileWatcher):
+    '''
+    Detect changes using Linux inotify. A watch is added to every directory
+    in the tree, and new directories are watched as they are created. The
+    watcher thread blocks in select until the kernel reports an event.
+    '''
+    def __init__(self, root_path, on_changes, **kwargs):
+        super().__init__(root_path, on_changes, **kwargs)
+        self._fd = None
+        self._wakeup_pipe = None
+        self._watched_dirs = dict()
+        '''Map of inotify watch descriptor to the watched directory.'''
+
+    def _setup(self):
+        self._fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._wakeup_pipe = os.pipe()
+        self._watched_dirs.clear()
+
+    def _initial_scan(self):
+        self._add_watches(self.root_path)
+
+    def _teardown(self):
+        os.close(self._fd)
+        for pipe_fd in self._wakeup_pipe:
+            os.close(pipe_fd)
+        self._fd = self._wakeup_pipe = None
+        self._watched_dirs.clear()
+
+    def _wakeup(self):
+        os.write(self._wakeup_pipe[1], b'\0')
+
+    def _add_watches(self, directory, changes=None):
+        '''
+        Watch the directory tree. If changes is provided, the files already
+        within the tree are also reported, since they may have been created
+        before the watch was added.
+        '''
+        for watched_dir in self._iter_watched_dirs(directory):
+            wd = _libc.inotify_add_watch(self._fd, os.fsencode(watched_dir), _INOTIFY_WATCH_MASK)
+            if wd < 0:
+                # Most likely the directory was already removed, or the user's
+                # inotify watch limit was reached. Skip the directory.
+                continue
+            self._watched_dirs[wd] = watched_dir
+            if changes is not None:
+                try:
+                    changes.paths.update(entry.path for entry in os.scandir(watched_dir))
+                except OSError:
+                    pass
+
+    def _wait_for_changes(self, timeout, changes):
+        readable, _, _ = select.select([self._fd, self._wakeup_pipe[0]], [], [], timeout)
+        if self._fd not in readable:
+            return False
+        try:
+            buffer = os.read(self._fd, 64 * 1024)
+        except OSError as err:
+            if err.errno == errno.EAGAIN:
+                return False
+            raise
+
+        # Events of ignored directories and removed watches are not changes
+        num_paths, directories_changed = len(changes.paths), changes.directories_changed
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, name_len = _INOTIFY_EVENT.unpack_from(buffer, offset)
+            offset += _INOTIFY_EVENT.size
+            name = buffer[offset:offset + name_len].rstrip(b'\0')
+            offset += name_len
+            self._handle_event(wd, mask, os.fsdecode(name), changes)
+        return len(changes.paths) != num_paths or changes.directories_changed != directories_changed
+
+    def _handle_event(self, wd, mask, name, changes):
+        if mask & IN_Q_OVERFLOW:
+            # The kernel dropped events. The listeners must rescan.
+            changes.directories_changed = True
+            return
+        directory = self._watched_dirs.get(wd)
+        if directory is None:
+            return
+        if mask & IN_IGNORED:
+            # The watch was removed, because the directory was deleted or unmounted
+            del self._watched_dirs[wd]
+            return
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            changes.directories_changed = True
+            return
+
+        path = os.path.join(directory, name)
+        if mask & IN_ISDIR:
+            if self.ignore_dir(name):
+                return
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._add_watches(path, changes)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                changes.directories_changed = True
+        changes.paths.add(path)
+
+def create_file_watcher(root_path, on_changes, **kwargs):
+    '''
+    Return an unstarted watcher for root_path. Use inotify if available,
+    and fall back to polling otherwise.
+    '''
+    if inotify_available():
+        return InotifyFileWatcher(root_path, on_changes, **kwargs)
+    return PollingFileWatcher(root_path, on_changes, **kwargs)
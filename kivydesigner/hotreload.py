@@ -1,64 +1,418 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from kivy.clock import Clock
 from kivy.lang import Builder
+from kivy.lang.parser import Parser
 from kivy.app import App
 from kivy.base import EventLoop, stopTouchApp
 from kivy.config import Config
+from kivy.logger import Logger
 from kivy.uix.label import Label
+from kivydesigner.kvdiff import KvPatchError, diff_kv, apply_property_updates, update_builder_rules, kv_digest
+from kivydesigner.pyreload import ModuleReloader
+from kivydesigner.reloadtrace import ReloadTrace
 
-from multiprocessing import Queue
+import os
+import time
+from collections import OrderedDict
+import threading
+import multiprocessing
 from queue import Empty
-from functools import partial
+
+HOT_RELOAD_KV_FILENAME = 'kivydesigner_hotreload.kv'
+'''Stable filename the hot reloaded kv rules are loaded under, so the 
+previous rules can be unloaded before the next kv string is loaded.'''
+
+MAX_CACHED_TREES = 4
+'''Number of replaced widget trees the in place visualizer keeps, so undoing
+to a recent document swaps its tree back in instead of rebuilding it.'''
+
+MAX_DELTA_RATIO = 0.5
+'''Deltas that insert more than this fraction of the document are sent as a 
+full KvStrInstruction instead.'''
 
 @dataclass 
 class KvStrInstruction:
     kv_str: str 
+    version: int = None
+    trace: ReloadTrace = field(default=None, compare=False)
+@dataclass 
+class KvDeltaInstruction:
+    '''
+    Edit of the previously sent kv string: replace delete_length characters
+    at offset with insert_text. Only valid if the receiver's document is 
+    at base_version.
+    '''
+    base_version: int
+    version: int
+    offset: int
+    delete_length: int
+    insert_text: str
+    trace: ReloadTrace = field(default=None, compare=False)
+@dataclass 
+class ProjectPathInstruction:
+    '''
+    Add the project_path to the visualizer's import path, so the kv string
+    can import the project's modules. Nothing is reloaded.
+    '''
+    project_path: str
+@dataclass 
+class PyModuleInstruction:
+    '''
+    Reload the imported modules affected by changes to the python source
+    files within the project_path. See pyreload.ModuleReloader.
+    '''
+    project_path: str
+    filepaths: list
 @dataclass 
 class StopInstruction:
     pass
 
+@dataclass
+class ReloadResult:
+    '''
+    Reply sent by the visualizer after building or patching each kv string.
+    '''
+    version: int
+    '''Version of the kv string, see HotReloadInstructionQueue.reload_kvstring.'''
+    success: bool
+    error: str = None
+    '''Text of the build exception, if the build failed.'''
+    error_line: int = None
+    '''Line of the kv string that failed to build, starting at 1, if known.'''
+    build_duration: float = 0.0
+    '''Seconds spent building or patching the widget tree.'''
+    widget_count: int = 0
+    patched: bool = False
+
+@dataclass
+class ResyncRequest:
+    '''
+    Reply sent by the visualizer when it dropped a delta it could not apply.
+    The sender should call HotReloadInstructionQueue.resync.
+    '''
+    pass
+
+def coalesce_instructions(instructions):
+    '''
+    Return the shortest list of instructions equivalent to the given list.
+    A StopInstruction supersedes every other instruction, and only the newest
+    kv string and project path are kept. Python module reloads are merged, 
+    and come before the kv string since the kv string may use the reloaded 
+    classes. The project path comes first.
+    '''
+    project_instruction = module_instruction = newest_instruction = None
+    for instruction in instructions:
+        if isinstance(instruction, StopInstruction):
+            return [instruction]
+        elif isinstance(instruction, ProjectPathInstruction):
+            project_instruction = instruction
+        elif isinstance(instruction, PyModuleInstruction):
+            if module_instruction is None or module_instruction.project_path != instruction.project_path:
+                module_instruction = PyModuleInstruction(instruction.project_path, list())
+            module_instruction.filepaths.extend(filepath for filepath in instruction.filepaths
+                if filepath not in module_instruction.filepaths)
+        elif instruction is not None:
+            newest_instruction = instruction
+    return [instruction for instruction in (project_instruction, module_instruction, newest_instruction) 
+        if instruction is not None]
+
+_DELTA_CHUNK_SIZE = 4096
+
+def _common_prefix_length(old_text, new_text):
+    # Compare chunks, which runs at memcmp speed, and then binary search the
+    # first chunk that differs
+    max_length = min(len(old_text), len(new_text))
+    low = 0
+    while low < max_length and old_text[low:low + _DELTA_CHUNK_SIZE] == new_text[low:low + _DELTA_CHUNK_SIZE]:
+        low += _DELTA_CHUNK_SIZE
+    high = min(low + _DELTA_CHUNK_SIZE, max_length)
+    low = min(low, max_length)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if old_text[low:mid] == new_text[low:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+def _common_suffix_length(old_text, new_text, max_length):
+    def suffix_matches(start, end):
+        return old_text[len(old_text) - end:len(old_text) - start] == new_text[len(new_text) - end:len(new_text) - start]
+    low = 0
+    while low < max_length and suffix_matches(low, min(low + _DELTA_CHUNK_SIZE, max_length)):
+        low += _DELTA_CHUNK_SIZE
+    high = min(low + _DELTA_CHUNK_SIZE, max_length)
+    low = min(low, max_length)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if suffix_matches(low, mid):
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+def text_delta(old_text, new_text):
+    '''
+    Return the (offset, delete_length, insert_text) edit that turns old_text
+    into new_text. Characters shared by the start and end of both texts
+    are not part of the edit.
+    '''
+    prefix_length = _common_prefix_length(old_text, new_text)
+    max_suffix = min(len(old_text), len(new_text)) - prefix_length
+    suffix_length = _common_suffix_length(old_text, new_text, max_suffix)
+    delete_length = len(old_text) - prefix_length - suffix_length
+    insert_text = new_text[prefix_length:len(new_text) - suffix_length]
+    return prefix_length, delete_length, insert_text
+
+def apply_text_delta(text, offset, delete_length, insert_text):
+    return text[:offset] + insert_text + text[offset + delete_length:]
+
 class HotReloadInstructionQueue:
-    
-    def __init__(self):
-        self.queue = Queue()
+    '''
+    Instruction channel from the designer to a visualizer process.
+
+    If delta_transport is True, each kv string is sent as a KvDeltaInstruction
+    against the previously sent version, so a keystroke in a large document
+    only pickles and copies the changed characters. The receiver rebuilds 
+    the full document. If the receiver's document is not at the delta's 
+    base version, it replies with a ResyncRequest, and the sender resends
+    the current kv string in full.
+
+    Each kv string carries a ReloadTrace, stamped when it is enqueued. The
+    receiver sends the completed traces back over the replies queue.
+    '''
+    def __init__(self, mp_context=None, delta_transport=True):
+        mp_context = mp_context or multiprocessing
+        self.queue = mp_context.Queue()
+        self.replies = mp_context.Queue()
+        self.delta_transport = delta_transport
+        self._resync_requested = mp_context.Event()
+        # Sender state
+        self._sent_kv_str = None
+        self._sent_version = 0
+        # Receiver state
+        self._received = None
+        '''Instruction received by wait, but not yet returned by next_instruction.'''
+        self._coalesced = list()
+        '''Coalesced instructions, not yet returned by next_instruction.'''
+        self._document = None
+        self._document_version = None
 
     def reload_kvstring(self, kv_build_string: str):
-        self.queue.put(KvStrInstruction(kv_build_string))
+        '''Send the kv string to the visualizer. Return the version of the kv string.'''
+        base_version, base_kv_str = self._sent_version, self._sent_kv_str
+        self._sent_version += 1
+        self._sent_kv_str = kv_build_string
+        if self._resync_requested.is_set():
+            self._resync_requested.clear()
+            base_kv_str = None
+
+        trace = ReloadTrace(self._sent_version)
+        trace.stamp('enqueue')
+        if self.delta_transport and base_kv_str is not None:
+            offset, delete_length, insert_text = text_delta(base_kv_str, kv_build_string)
+            if len(insert_text) <= MAX_DELTA_RATIO * len(kv_build_string):
+                self.queue.put(KvDeltaInstruction(base_version, self._sent_version, 
+                    offset, delete_length, insert_text, trace))
+                return self._sent_version
+        self.queue.put(KvStrInstruction(kv_build_string, self._sent_version, trace))
+        return self._sent_version
+
+    def resync(self):
+        '''
+        Resend the last kv string in full, under its current version, if the
+        receiver requested a resync. Return True if the kv string was sent.
+        '''
+        if not self._resync_requested.is_set() or self._sent_kv_str is None:
+            return False
+        self._resync_requested.clear()
+        trace = ReloadTrace(self._sent_version)
+        trace.stamp('enqueue')
+        self.queue.put(KvStrInstruction(self._sent_kv_str, self._sent_version, trace))
+        return True
+
+    def set_project_path(self, project_path):
+        self.queue.put(ProjectPathInstruction(str(project_path)))
+
+    def reload_pymodules(self, project_path, filepaths):
+        self.queue.put(PyModuleInstruction(str(project_path), [str(filepath) for filepath in filepaths]))
 
     def stop_reload(self):
         self.queue.put(StopInstruction())
 
-    def empty(self):
-        return self.queue.empty()
+    def send_reply(self, reply):
+        '''Send a reply, such as a ReloadResult or ReloadTrace, back to the sender.'''
+        self.replies.put(reply)
 
-    def next_instruction(self):
+    def next_reply(self, timeout=None):
+        '''
+        Block until the next reply arrives, and return it. Return None if
+        the timeout expired. A timeout of None blocks indefinitely.
+        '''
         try:
-            return self.queue.get(block=False)
+            return self.replies.get(timeout=timeout)
         except Empty:
             return None
 
+    def empty(self):
+        return not self._coalesced and self._received is None and self.queue.empty()
+
+    def wait(self, timeout=None):
+        '''
+        Block until an instruction is available, without consuming it. 
+        A timeout of None blocks indefinitely. Return True if an 
+        instruction is available, and False if the timeout expired.
+        '''
+        if self._received is None and not self._coalesced:
+            try:
+                self._received = self.queue.get(timeout=timeout)
+            except Empty:
+                return False
+        return True
+
+    def next_instruction(self):
+        '''
+        Return the next pending instruction, or None if the queue is empty.
+        The pending instructions are coalesced, see coalesce_instructions. 
+        Every queued KvStrInstruction supersedes the previous ones, so stale
+        kv strings are dropped and only the newest text is built. Deltas are
+        applied in order, and returned as a KvStrInstruction of the full 
+        document. A pending StopInstruction takes precedence over any other
+        instruction.
+        '''
+        if not self._coalesced:
+            pending_instructions = list()
+            if self._received is not None:
+                pending_instructions.append(self._receive(self._received))
+                self._received = None
+            while True:
+                try:
+                    pending_instructions.append(self._receive(self.queue.get(block=False)))
+                except Empty:
+                    break
+            self._coalesced = coalesce_instructions(pending_instructions)
+        return self._coalesced.pop(0) if self._coalesced else None
+
+    def _receive(self, instruction):
+        '''
+        Track the document of kv string instructions, and turn deltas into
+        a KvStrInstruction. Return None if a delta cannot be applied.
+        '''
+        if isinstance(instruction, KvStrInstruction):
+            self._document, self._document_version = instruction.kv_str, instruction.version
+        elif isinstance(instruction, KvDeltaInstruction):
+            if self._document is None or instruction.base_version != self._document_version:
+                # Drop deltas until the sender resends the full document
+                self._document = self._document_version = None
+                if not self._resync_requested.is_set():
+                    self._resync_requested.set()
+                    self.send_reply(ResyncRequest())
+                return None
+            self._document = apply_text_delta(self._document, instruction.offset,
+                instruction.delete_length, instruction.insert_text)
+            self._document_version = instruction.version
+            instruction = KvStrInstruction(self._document, self._document_version, instruction.trace)
+        return instruction
+
+def _build_kv_root(kv_str, filename=None):
+    '''
+    Build the root widget of kv_str. Display build errors in a label.
+    Return the root widget, and the build exception or None.
+    '''
+    try:
+        return Builder.load_string(kv_str, filename=filename), None
+    except Exception as builderr:
+        return Label(text=str(builderr)), builderr
+
+def _reload_result(version, build_start, root, error=None, patched=False):
+    '''Return the ReloadResult of a build that started at build_start.'''
+    build_duration = time.perf_counter() - build_start
+    if error is not None:
+        # kivy's ParserException and BuilderException store the 0-based line
+        line = getattr(error, 'line', None)
+        return ReloadResult(version, False, str(error), line + 1 if isinstance(line, int) else None, 
+            build_duration)
+    widget_count = sum(1 for _ in root.walk(restrict=True)) if root is not None else 0
+    return ReloadResult(version, True, build_duration=build_duration, widget_count=widget_count, patched=patched)
+
+def _blank_root_widget(kv_str, parser):
+    '''
+    Return kv_str with the lines of the root widget blanked out, so loading
+    it only loads the rules. Line numbers and directives are kept.
+    '''
+    if parser.root is None:
+        return kv_str
+    lines = kv_str.splitlines()
+    end = parser.root.line + 1
+    while end < len(lines):
+        line = lines[end]
+        # The root widget ends at the next unindented line, that is not a comment
+        if line.strip() and not line[0].isspace() and (not line.startswith('#') or line.startswith('#:')):
+            break
+        end += 1
+    blanked = ['' if not line.strip().startswith('#:') else line for line in lines[parser.root.line:end]]
+    return '\n'.join(lines[:parser.root.line] + blanked + lines[end:])
+
+def _stamp(instruction, stage):
+    '''Stamp the instruction's ReloadTrace, if it has one.'''
+    trace = getattr(instruction, 'trace', None)
+    if trace is not None:
+        trace.stamp(stage)
+
+def _reply_on_next_flip(reload_queue, trace, on_drawn=None):
+    '''
+    Stamp the trace once the next frame is drawn, and send it back over
+    the reload_queue. on_drawn is called after the frame is drawn.
+    '''
+    win = EventLoop.window
+    def on_reload_drawn(*args):
+        win.unbind(on_flip=on_reload_drawn)
+        if on_drawn is not None:
+            on_drawn()
+        if trace is not None:
+            trace.stamp('draw')
+            reload_queue.send_reply(trace)
+    win.bind(on_flip=on_reload_drawn)
+    win.canvas.ask_update()
+
 class KvBuilderApp(App):
 
-    def __init__(self, kv_str, **kwargs):
+    def __init__(self, kv_str, reload_queue=None, trace=None, version=None, **kwargs):
         super(KvBuilderApp, self).__init__(**kwargs)
         self.kv_str = kv_str 
+        self.reload_queue = reload_queue
+        self.trace = trace
+        self.version = version
 
     def build(self):
-        try:
-            root = Builder.load_string(self.kv_str)
-        except Exception as builderr:
-            root = Label(text=str(builderr))
+        build_start = time.perf_counter()
+        if self.trace is not None:
+            self.trace.stamp('build_start')
+        root, error = _build_kv_root(self.kv_str)
+        if self.trace is not None:
+            self.trace.stamp('build_end')
+        if self.reload_queue is not None:
+            self.reload_queue.send_reply(_reload_result(self.version, build_start, root, error))
         return root
 
-def _visualization_update(reload_queue, dt):
-    if not reload_queue.empty():
-        EventLoop.close()
-    if EventLoop.status == 'started':
+    def on_start(self):
         # Restarting the application doesn't automatically refresh the window
         # since we are using a preexisting window instance. Force the refresh.
         win = EventLoop.window
         if win and win.canvas:
-            win.canvas.ask_update()
+            if self.reload_queue is not None:
+                _reply_on_next_flip(self.reload_queue, self.trace)
+            else:
+                win.canvas.ask_update()
+
+def _close_on_next_instruction(reload_queue):
+    '''
+    Block until the next instruction arrives, then close the running app
+    from the kivy thread. Runs on a background thread, so the visualizer 
+    does not poll the queue while idle.
+    '''
+    reload_queue.wait()
+    Clock.schedule_once(lambda dt: EventLoop.close())
 
 def _tearDown():
     stopTouchApp()
@@ -74,7 +428,7 @@ def _setUp():
     for items in Config.items('input'):
         Config.remove_option('input', items[0])
 
-def _visualize(app):
+def _visualize(app, reload_queue):
     '''kivy is designed to run a single application during an interpreter
     session. To run multiple application instances we need to do some
     special setup and teardown to ensure kivy's global variables are 
@@ -84,32 +438,346 @@ def _visualize(app):
     for more information.
     '''
     _setUp()
+    threading.Thread(target=_close_on_next_instruction, args=(reload_queue,), daemon=True).start()
     try:
         app.run()
     finally:
         _tearDown()
 
-def run_visualization_app(hot_reload_queue: HotReloadInstructionQueue):
+class HotReloadApp(App):
     '''
-    Run a hot reload app, controlled by the hot_reload_queue. 
-    The hot reload app is designed to run as the only kivy app within the 
-    interpreter session. This method will block the thread, so it 
-    must be run in a separate thread or process.
+    Long-lived visualization app. Each KvStrInstruction unloads the rules
+    of the previous kv string, loads the new kv string and swaps only the
+    root widget of the window, instead of restarting the app and the 
+    event loop. The time from receiving an instruction until the new 
+    widget tree is drawn is logged, and stored in last_reload_latency.
+    A ReloadResult is sent back over the reload queue for each kv string.
 
-    See HotReloadInstructionQueue for full instruction set. 
+    If only constant property values changed since the previous kv string,
+    the live widgets are patched instead of rebuilding the tree. See kvdiff.
+    Replaced widget trees are kept in a small cache, keyed by kv_digest, so
+    undoing to a recent document only reloads its rules and swaps its tree.
+
+    If hidden_until_reload is True, the window is created hidden and shown
+    by the first reload, so a standby visualizer stays invisible.
+
+    Each PyModuleInstruction reloads the changed user modules, and then
+    rebuilds the live kv string so the widgets use the reloaded classes.
+    '''
+    def __init__(self, reload_queue, hidden_until_reload=False, **kwargs):
+        super().__init__(**kwargs)
+        self.reload_queue = reload_queue
+        self.hidden_until_reload = hidden_until_reload
+        self.last_reload_latency = None
+        self.last_reload_patched = False
+        self.last_reload_result = None
+        self._live_parser = None
+        '''Parsed kv document of the live widget tree, or None if the tree failed to build.'''
+        self._live_kv_str = None
+        self._live_version = None
+        self._live_digest = None
+        self._tree_cache = OrderedDict()
+        '''Map of kv_digest to the replaced root widget built from the document.'''
+        self.module_reloader = None
+        self._pending_instructions = list()
+        self._pending_lock = threading.Lock()
+        self._apply_trigger = Clock.create_trigger(self._apply_pending_instruction)
+
+    def build(self):
+        # The first kv string is applied by the instruction listener. Without
+        # a root widget, the app does not create the window, so create it here.
+        EventLoop.ensure_window()
+        threading.Thread(target=self._listen_for_instructions, daemon=True).start()
+
+    def reload_kvstring(self, kv_str, version=None, trace=None):
+        '''
+        Show the widget tree of kv_str. Patch the property values of the live
+        widget tree if possible, otherwise replace the root widget with a new
+        tree built from kv_str. If a ReloadTrace is given, its build and draw
+        stages are stamped, and it is sent back over the reload queue.
+        '''
+        reload_start = time.perf_counter()
+        if trace is not None:
+            trace.stamp('build_start')
+        self._live_kv_str, self._live_version = kv_str, version
+        try:
+            parser = Parser(content=kv_str, filename=HOT_RELOAD_KV_FILENAME)
+        except Exception:
+            # The Builder will report the error when rebuilding
+            parser = None
+        digest = kv_digest(kv_str)
+        self.last_reload_patched = self._patch_properties(parser)
+        if self.last_reload_patched:
+            self._live_digest, error = digest, None
+        else:
+            error = self._rebuild(kv_str, parser, digest)
+        self.last_reload_result = _reload_result(version, reload_start, self.root, error, self.last_reload_patched)
+        self.reload_queue.send_reply(self.last_reload_result)
+        if trace is not None:
+            trace.patched = self.last_reload_patched
+            trace.stamp('build_end')
+        self._report_latency(reload_start, trace)
+
+    def reload_pymodules(self, project_path, filepaths):
+        '''
+        Reload the user modules affected by the changed python files, and
+        rebuild the live widget tree from the reloaded classes.
+        '''
+        self.module_reloader = _get_module_reloader(self.module_reloader, project_path)
+        reloaded_modules = self.module_reloader.reload_files(filepaths)
+        if reloaded_modules:
+            # The cached trees are built from the previous classes
+            self._tree_cache.clear()
+        if reloaded_modules and self._live_kv_str is not None:
+            # Patching would keep the widgets built from the previous classes
+            self._live_parser = None
+            self.reload_kvstring(self._live_kv_str, self._live_version)
+
+    def _patch_properties(self, parser):
+        '''Return True if the live widget tree was patched to match the parsed kv document.'''
+        if parser is None or self._live_parser is None:
+            return False
+        updates = diff_kv(self._live_parser, parser)
+        if updates is None:
+            return False
+        try:
+            if self.root is not None:
+                apply_property_updates(self.root, parser, updates)
+            update_builder_rules(HOT_RELOAD_KV_FILENAME, parser, updates)
+        except KvPatchError as err:
+            Logger.debug(f'HotReload: Cannot patch the widget tree, rebuilding. {err}')
+            return False
+        self._live_parser = parser
+        return True
+
+    def _rebuild(self, kv_str, parser, digest):
+        '''
+        Replace the root widget with a tree built from kv_str, or with the
+        cached tree of the document. Return the build exception, or None.
+        '''
+        if self.root is not None and self._live_parser is not None:
+            self._tree_cache[self._live_digest] = self.root
+            while len(self._tree_cache) > MAX_CACHED_TREES:
+                self._tree_cache.popitem(last=False)
+        Builder.unload_file(HOT_RELOAD_KV_FILENAME)
+        cached_root = self._tree_cache.pop(digest, None)
+        if cached_root is not None and self._load_rules(kv_str, parser):
+            new_root, error = cached_root, None
+        else:
+            new_root, error = _build_kv_root(kv_str, HOT_RELOAD_KV_FILENAME)
+        self._live_parser = parser if error is None else None
+        self._live_digest = digest if error is None else None
+
+        win = EventLoop.window
+        if self.hidden_until_reload:
+            self.hidden_until_reload = False
+            win.show()
+        if self.root is not None:
+            win.remove_widget(self.root)
+        self.root = new_root
+        if new_root is not None:
+            win.add_widget(new_root)
+        return error
+
+    def _load_rules(self, kv_str, parser):
+        '''Load only the rules of kv_str. Return True if the rules loaded.'''
+        if parser is None:
+            return False
+        try:
+            Builder.load_string(_blank_root_widget(kv_str, parser), filename=HOT_RELOAD_KV_FILENAME)
+        except Exception:
+            Builder.unload_file(HOT_RELOAD_KV_FILENAME)
+            return False
+        return True
+
+    def _report_latency(self, reload_start, trace=None):
+        '''Log the time from reload_start until the next frame is drawn, and reply with the trace.'''
+        action = 'Patched' if self.last_reload_patched else 'Reloaded'
+        def on_reload_drawn():
+            self.last_reload_latency = time.perf_counter() - reload_start
+            Logger.info(f'HotReload: {action} in {self.last_reload_latency * 1000:.1f} ms')
+        _reply_on_next_flip(self.reload_queue, trace, on_reload_drawn)
+
+    def _listen_for_instructions(self):
+        '''
+        Block until instructions arrive, and hand them to the kivy thread.
+        Instructions that arrive before the kivy thread applies the previous
+        ones are coalesced. Runs on a background thread.
+        '''
+        while True:
+            self.reload_queue.wait()
+            instruction = self.reload_queue.next_instruction()
+            _stamp(instruction, 'dequeue')
+            with self._pending_lock:
+                self._pending_instructions = coalesce_instructions(self._pending_instructions + [instruction])
+            self._apply_trigger()
+            if isinstance(instruction, StopInstruction):
+                return
+
+    def _apply_pending_instruction(self, dt):
+        with self._pending_lock:
+            instructions, self._pending_instructions = self._pending_instructions, list()
+        for instruction in instructions:
+            if isinstance(instruction, KvStrInstruction):
+                self.reload_kvstring(instruction.kv_str, instruction.version, instruction.trace)
+            elif isinstance(instruction, ProjectPathInstruction):
+                self.module_reloader = _get_module_reloader(self.module_reloader, instruction.project_path)
+            elif isinstance(instruction, PyModuleInstruction):
+                self.reload_pymodules(instruction.project_path, instruction.filepaths)
+            elif isinstance(instruction, StopInstruction):
+                self.stop()
+            else:
+                raise ValueError("Hot Reload type not recognized")
+
+def _get_module_reloader(module_reloader, project_path):
+    '''
+    Return the module_reloader, or a new ModuleReloader if the project path
+    changed. The ModuleReloader only scans the project once a file changes.
     '''
-    Clock.schedule_interval(partial(_visualization_update, hot_reload_queue), 0)   
-    while hot_reload_queue.empty():
-        continue 
+    if module_reloader is None or module_reloader.project_path != os.path.abspath(project_path):
+        module_reloader = ModuleReloader(project_path)
+    return module_reloader
+
+def _run_in_place(hot_reload_queue, standby):
+    if standby:
+        Config.set('graphics', 'window_state', 'hidden')
+    HotReloadApp(hot_reload_queue, hidden_until_reload=standby).run()
+
+def _run_with_restarts(hot_reload_queue):
+    hot_reload_queue.wait()
 
     next_instruction = None
+    last_kv_str = None
+    module_reloader = None
     while not isinstance(next_instruction, StopInstruction):
         next_instruction = hot_reload_queue.next_instruction()
+        _stamp(next_instruction, 'dequeue')
+        if isinstance(next_instruction, (ProjectPathInstruction, PyModuleInstruction)):
+            module_reloader = _get_module_reloader(module_reloader, next_instruction.project_path)
+            if isinstance(next_instruction, PyModuleInstruction):
+                module_reloader.reload_files(next_instruction.filepaths)
+            if last_kv_str is None:
+                # Nothing to visualize yet
+                hot_reload_queue.wait()
+                continue
+            next_instruction = KvStrInstruction(last_kv_str)
         if isinstance(next_instruction, KvStrInstruction):
-            _visualize(KvBuilderApp(kv_str=next_instruction.kv_str))
+            last_kv_str = next_instruction.kv_str
+            app = KvBuilderApp(next_instruction.kv_str, hot_reload_queue, next_instruction.trace, 
+                next_instruction.version)
+            _visualize(app, hot_reload_queue)
         elif next_instruction and not isinstance(next_instruction, StopInstruction):
             raise ValueError("Hot Reload type not recognized")
 
         # If no instruction is available, but we've exited _visualize, then the 
         # user manually stopped the visualized application. 
-        next_instruction = next_instruction or StopInstruction()
\ No newline at end of file
+        next_instruction = next_instruction or StopInstruction()
+
+def run_visualization_app(hot_reload_queue: HotReloadInstructionQueue, in_place=True, standby=False):
+    '''
+    Run a hot reload app, controlled by the hot_reload_queue. 
+    The hot reload app is designed to run as the only kivy app within the 
+    interpreter session. This method will block the thread, so it 
+    must be run in a separate thread or process.
+
+    If in_place is True, a single HotReloadApp is kept running and only its
+    root widget is rebuilt on each reload. Otherwise a new KvBuilderApp is
+    started for each reload, which also resets any app and window state 
+    modified by the previous kv string.
+
+    If standby is True, the in place app creates its window hidden, and 
+    only shows it once the first kv string is received. 
+
+    See HotReloadInstructionQueue for full instruction set. 
+    '''
+    # Replies are only telemetry. Never block the exit on unread replies.
+    hot_reload_queue.replies.cancel_join_thread()
+    if in_place:
+        _run_in_place(hot_reload_queue, standby)
+    else:
+        _run_with_restarts(hot_reload_queue)
+
+def default_mp_context():
+    '''
+    Return the multiprocessing context used to start visualizer processes.
+    Use a forkserver when available. The forkserver is a template process 
+    that imports this module once, and each visualizer is forked from it, 
+    so respawning a visualizer skips the python startup and kivy import. 
+    Forking the template also keeps the designer's kivy globals out of the 
+    visualizer. Fall back to spawn on platforms without forkserver.
+    '''
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        mp_context = multiprocessing.get_context('forkserver')
+        mp_context.set_forkserver_preload([__name__])
+        return mp_context
+    return multiprocessing.get_context('spawn')
+
+class VisualizerProcess:
+    '''
+    Visualization app running in a child process, controlled through 
+    its instructions queue. See run_visualization_app.
+    '''
+    def __init__(self, mp_context=None, standby=False):
+        mp_context = mp_context or multiprocessing.get_context()
+        self.instructions = HotReloadInstructionQueue(mp_context)
+        self.process = mp_context.Process(
+            target=run_visualization_app,
+            args=(self.instructions,),
+            kwargs={'standby': standby},
+            daemon=True
+        )
+        self.start_time = None
+        '''time.perf_counter() when the process was started.'''
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.process.start()
+
+    def is_alive(self):
+        try:
+            return self.process.is_alive()
+        except ValueError:
+            # is_alive will throw a ValueError if the process is 
+            # already closed
+            return False
+
+    def stop(self, timeout=None):
+        '''Ask the visualizer to stop, and wait for the process to exit.'''
+        if self.is_alive():
+            self.instructions.stop_reload()
+            self.process.join(timeout)
+
+class VisualizerPool:
+    '''
+    Keeps a standby VisualizerProcess running, with kivy imported and its
+    window created but hidden, so the first preview only costs a widget
+    tree build. acquire promotes the standby, or cold starts a visualizer 
+    if warm_standby is False or the standby is not running.
+    '''
+    def __init__(self, warm_standby=True, mp_context=None):
+        self.warm_standby = warm_standby
+        self.mp_context = mp_context or default_mp_context()
+        self.standby = None
+
+    def start_standby(self):
+        '''Start a standby visualizer, unless one is already running.'''
+        if not self.warm_standby or (self.standby and self.standby.is_alive()):
+            return
+        self.standby = VisualizerProcess(self.mp_context, standby=True)
+        self.standby.start()
+
+    def acquire(self):
+        '''
+        Return a running visualizer. The pool no longer owns the returned
+        visualizer. Call start_standby to replace the promoted standby.
+        '''
+        visualizer, self.standby = self.standby, None
+        if visualizer is None or not visualizer.is_alive():
+            visualizer = VisualizerProcess(self.mp_context)
+            visualizer.start()
+        return visualizer
+
+    def shutdown(self, timeout=None):
+        if self.standby:
+            self.standby.stop(timeout)
+            self.standby = None
@@ -1,19 +1,41 @@
 import ast 
+import importlib.util
+import multiprocessing
+import os
+import re
+import site
 from pathlib import Path
 from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from kivydesigner.scancache import read_source_bytes
 
 @dataclass
 class ClassDefNode:
     name: str
     source_path: str
     parents: list[str]
-    children: list[str]
+    children: set[str]
     def is_empty(self):
         return len(self.parents) == 0 and len(self.children) == 0
 
 class InheritanceTrees:
+    '''
+    Collection of inheritance trees, keyed by classname. 
+
+    The subclass and superclass closures are computed iteratively and cached
+    on first request. Adding or removing a class only invalidates the cached 
+    closures of its ancestors and descendants. 
+
+    Classes are also indexed by their source path, so removing a source 
+    file only visits the classes defined within that file.
+    '''
     def __init__(self) -> None:
         self.nodes = dict()
+        self.sources = dict()
+        '''Map of source path to the set of classnames defined within the source.'''
+        self._subclass_cache = dict()
+        self._superclass_cache = dict()
 
     def __len__(self):
         return len(self.nodes)
@@ -25,26 +47,34 @@ class InheritanceTrees:
         If the parents already exist, update their children.
         Ignore duplicate entries. Enforce that a class can only have one set of parents.
         '''
+        if source_path is not None:
+            source_path = os.fspath(source_path)
         class_node = self.get_class(classname)
         if class_node:
             if len(class_node.parents) == 0:
                 class_node.parents = parent_classnames
+                if not class_node.source_path:
+                    # The class was previously only known as a parent. 
+                    class_node.source_path = source_path
+                    self.sources.setdefault(source_path, set()).add(classname)
             elif class_node.parents == parent_classnames:
                 # Duplicate entry. Ignore and exit. 
                 return
             else:
                 raise Exception("Class already exists with different parents.")
         else:
-            class_node = ClassDefNode(classname, source_path, parent_classnames, list())
+            class_node = ClassDefNode(classname, source_path, parent_classnames, set())
             self.nodes[classname] = class_node
+            self.sources.setdefault(source_path, set()).add(classname)
 
         for parent_classname in parent_classnames:
             parent_node = self.get_class(parent_classname)
             if parent_node:
-                parent_node.children.append(class_node.name)
+                parent_node.children.add(class_node.name)
             else:
-                parent_node = ClassDefNode(parent_classname, '', list(), [class_node.name])
+                parent_node = ClassDefNode(parent_classname, '', list(), {class_node.name})
                 self.nodes[parent_classname] = parent_node
+        self._invalidate_closures(classname)
 
     def get_class(self, classname):
         return self.nodes.get(classname)
@@ -53,25 +83,57 @@ class InheritanceTrees:
         '''
         Return a list of all subclasses of the given class.
         '''
-        class_node = self.get_class(classname)
-        if class_node:
-            subclasses = set(class_node.children)
-            for child in class_node.children:
-                subclasses.update(self.get_subclasses(child))
-            return subclasses
-        return set()
+        subclasses = self._subclass_cache.get(classname)
+        if subclasses is None:
+            subclasses = self._get_closure(classname, 'children')
+            self._subclass_cache[classname] = subclasses
+        # Return a copy, since callers are free to modify the result
+        return set(subclasses)
 
     def get_superclasses(self, classname):
         '''
         Return a list of all superclasses of the given class.
         '''
+        superclasses = self._superclass_cache.get(classname)
+        if superclasses is None:
+            superclasses = self._get_closure(classname, 'parents')
+            self._superclass_cache[classname] = superclasses
+        return set(superclasses)
+
+    def _get_closure(self, classname, direction):
+        '''
+        Return a frozenset of all classes reachable from classname by 
+        following the node's children or parents. Each class is visited once, 
+        so diamond inheritance and deep hierarchies are handled without recursion.
+        '''
         class_node = self.get_class(classname)
-        if class_node:
-            superclasses = set(class_node.parents)
-            for parent in class_node.parents:
-                superclasses.update(self.get_superclasses(parent))
-            return superclasses
-        return set()
+        if not class_node:
+            return frozenset()
+        closure = set()
+        pending = list(getattr(class_node, direction))
+        while pending:
+            related_classname = pending.pop()
+            if related_classname in closure:
+                continue
+            closure.add(related_classname)
+            related_node = self.get_class(related_classname)
+            if related_node:
+                pending.extend(getattr(related_node, direction))
+        return frozenset(closure)
+
+    def _invalidate_closures(self, classname):
+        '''
+        Discard the cached closures affected by adding or removing the 
+        parents of classname. The subclasses of classname's ancestors and 
+        the superclasses of classname's descendants may have changed.
+        Must be called while the class's edges are still in the graph.
+        '''
+        if self._subclass_cache:
+            for ancestor in self._get_closure(classname, 'parents') | {classname}:
+                self._subclass_cache.pop(ancestor, None)
+        if self._superclass_cache:
+            for descendant in self._get_closure(classname, 'children') | {classname}:
+                self._superclass_cache.pop(descendant, None)
 
     def get_all_classes(self):
         return self.nodes.keys()
@@ -82,12 +144,14 @@ class InheritanceTrees:
         '''
         class_node = self.get_class(classname)
         if class_node:
+            self._invalidate_closures(classname)
             for parent in class_node.parents:
                 parent_node = self.get_class(parent)
-                parent_node.children.remove(class_node.name)
+                parent_node.children.discard(class_node.name)
             for child in class_node.children:
                 child_node = self.get_class(child)
                 child_node.parents.remove(class_node.name)
+            self._unindex_source(class_node)
             del self.nodes[classname]
     
     def remove_class_and_subclasses(self, classname):
@@ -100,19 +164,302 @@ class InheritanceTrees:
         
     def remove_source(self, source_path):
         '''
-        Remove all class definitions from a given source file.
+        Remove all class definitions from a given source file. Classes that are
+        still referenced as a parent are kept, without a source path. 
         '''
-        for class_node in self.nodes.values():
-            if class_node.source_path == source_path:
-                for parent in class_node.parents:
-                    parent_node = self.get_class(parent)
-                    parent_node.children.remove(class_node.name)
-                class_node.parents = []
-                class_node.source_path = ''
-
-        empty_nodes = [name for name, node in self.nodes.items() if node.is_empty()]
-        for node in empty_nodes:
-            del self.nodes[node]
+        if source_path is not None:
+            source_path = os.fspath(source_path)
+        possibly_empty = set()
+        for classname in self.sources.pop(source_path, set()):
+            class_node = self.get_class(classname)
+            self._invalidate_closures(classname)
+            for parent in class_node.parents:
+                self.get_class(parent).children.discard(classname)
+                possibly_empty.add(parent)
+            class_node.parents = []
+            class_node.source_path = ''
+            possibly_empty.add(classname)
+
+        for classname in possibly_empty:
+            class_node = self.get_class(classname)
+            if class_node and class_node.is_empty():
+                self._unindex_source(class_node)
+                del self.nodes[classname]
+                self._subclass_cache.pop(classname, None)
+                self._superclass_cache.pop(classname, None)
+
+    def _unindex_source(self, class_node):
+        classnames = self.sources.get(class_node.source_path)
+        if classnames is not None:
+            classnames.discard(class_node.name)
+            if not classnames:
+                del self.sources[class_node.source_path]
+
+PARALLEL_BUILD_MIN_FILES = 64
+'''Batches with fewer python files than this are always parsed serially.'''
+
+def get_base_classnames(classdef_node):
+    '''
+    Return the list of parent classnames declared by an ast.ClassDef node.
+    '''
+    parents = list()
+    for base in classdef_node.bases:
+        if isinstance(base, ast.Name):
+            # Standard base class declaration
+            parents.append(base.id)
+        elif isinstance(base, ast.Attribute):
+            # Parent of form module.Class
+            parents.append(base.attr)
+        elif isinstance(base, ast.Subscript):
+            # Generic Parent of form Generic[T1,...,Tn]
+            if isinstance(base.slice, ast.Name):
+                type_params = [base.slice.id]
+            elif isinstance(base.slice, ast.Tuple):
+                type_params = [e.id for e in base.slice.elts]
+            elif isinstance(base.slice, ast.Constant):
+                type_params = [base.slice.value]
+            else:
+                raise Exception("Unknown subscript type: " + str(type(base.slice)))
+            parents.append(base.value.id + "[" + ",".join(type_params) + "]")
+        elif isinstance(base, ast.Call):
+            # Call classdef bases not supported.
+            # Our goals is to avoid executing any code, and
+            # we can't determine the return value of a Call
+            # node without execution.
+            pass
+        else:
+            raise Exception("Unknown base type: " + str(type(base)))
+    return parents
+
+class ClassDefCollector(ast.NodeVisitor):
+    '''
+    Collect (classname, parent_classnames) tuples from an AST, using the 
+    same traversal as InheritanceTreesBuilder. Nested classes are skipped.
+    '''
+    def __init__(self) -> None:
+        self.classdefs = list()
+
+    def visit_ClassDef(self, node):
+        self.classdefs.append((node.name, get_base_classnames(node)))
+
+# Matches the string literals and comments that must be skipped while 
+# scanning for class headers, and any line that starts with the class keyword.
+_CLASS_SCAN_RE = re.compile(r'''
+      (?P<string>\'\'\'[^'\\]*(?:(?:\\.|'(?!''))[^'\\]*)*\'\'\'
+        | """[^"\\]*(?:(?:\\.|"(?!""))[^"\\]*)*"""
+        | '[^'\\\n]*(?:\\.[^'\\\n]*)*'
+        | "[^"\\\n]*(?:\\.[^"\\\n]*)*")
+    | (?P<comment>\#[^\n]*)
+    | (?P<header>^[ \t]*class\b)
+    ''', re.MULTILINE | re.DOTALL | re.VERBOSE)
+_CLASS_HEADER_RE = re.compile(r'class[ \t]+([^\W\d]\w*)[ \t]*(?:\(([^()]*)\))?[ \t]*:')
+_DOTTED_NAME_RE = re.compile(r'[^\W\d]\w*(?:\s*\.\s*[^\W\d]\w*)*')
+_KEYWORD_BASE_RE = re.compile(r'[^\W\d]\w*\s*=\s*[^\W\d]\w*(?:\s*\.\s*[^\W\d]\w*)*')
+
+def scan_class_headers(file_source):
+    '''
+    Return the list of (classname, parent_classnames) tuples defined within
+    the python source, by scanning for class headers instead of parsing 
+    the full AST. Return None if the source is ambiguous, and must be 
+    parsed with ast.parse to guarantee the same result as ClassDefCollector.
+
+    The scan only handles module-level classes whose bases are names or 
+    dotted names (keyword arguments, such as metaclass=, are ignored). The
+    source is considered ambiguous if it contains indented class headers,
+    since telling nested classes apart from classes declared within 
+    functions or if-blocks requires the full AST, or if it contains bases
+    that are subscripted, called, or otherwise complex. 
+
+    Unlike ast.parse, the scan does not validate the syntax of the source 
+    outside of the class headers. A file with a syntax error in a function
+    body still returns its classes, while ast.parse returns no classes at 
+    all. This is deliberate: validating the syntax costs as much as the 
+    full parse, and a file the user is editing keeps its classes in the 
+    widget list while it is temporarily broken.
+    '''
+    if 'class' not in file_source:
+        return []
+
+    classdefs = list()
+    for match in _CLASS_SCAN_RE.finditer(file_source):
+        header_start = match.start('header')
+        if header_start < 0:
+            continue
+        if file_source[header_start] != 'c':
+            # Indented class header
+            return None
+        header = _CLASS_HEADER_RE.match(file_source, header_start)
+        if not header:
+            return None
+
+        classname, bases = header.groups()
+        parents = list()
+        for base in (bases or '').split(','):
+            base = base.strip()
+            if not base or _KEYWORD_BASE_RE.fullmatch(base):
+                continue
+            if not _DOTTED_NAME_RE.fullmatch(base):
+                return None
+            parents.append(base.rsplit('.', 1)[-1].strip())
+        classdefs.append((classname, parents))
+    return classdefs
+
+def read_class_definitions(filepath, fast_scan=False):
+    '''
+    Return the list of (classname, parent_classnames) tuples defined within
+    a python file. Classes found before a read or parse failure are 
+    still returned, matching InheritanceTreesBuilder.build_from_file.
+
+    If fast_scan is True the file is first scanned with scan_class_headers, 
+    and only parsed with ast.parse if the scan is ambiguous. The fast scan 
+    also returns the classes of files with syntax errors, see scan_class_headers.
+
+    This is a module level function so it can be pickled and run 
+    within a process pool.
+    '''
+    try:
+        data = Path(filepath).read_bytes()
+    except OSError:
+        return list()
+    return _parse_class_definitions(data, fast_scan)
+
+def read_source_file(filepath, fast_scan=False):
+    '''
+    Return a (classdefs, source_stat) tuple, where classdefs is the 
+    read_class_definitions result, and source_stat the scancache.SourceStat 
+    of the parsed bytes, or None if the file could not be read. 
+    Module level, so it can run within a process pool.
+    '''
+    try:
+        data, source_stat = read_source_bytes(filepath)
+    except OSError:
+        return list(), None
+    return _parse_class_definitions(data, fast_scan), source_stat
+
+def _parse_class_definitions(data, fast_scan):
+    collector = ClassDefCollector()
+    try:
+        # Decode like the interpreter, from the coding declaration
+        file_source = importlib.util.decode_source(data)
+        if fast_scan:
+            classdefs = scan_class_headers(file_source)
+            if classdefs is not None:
+                return classdefs
+        collector.visit(ast.parse(file_source))
+    except:
+        pass
+    return collector.classdefs
+
+def read_all_class_definitions(source_files, parallel=False, max_workers=None, fast_scan=False):
+    '''
+    Return a list containing the read_class_definitions result of each 
+    source file, in the same order as source_files. 
+
+    If parallel is True the files are fanned out to a pool of max_workers 
+    processes. Small batches, and batches limited to a single worker, are
+    always parsed serially since spawning the pool would cost more than it saves.
+    '''
+    return list(iter_class_definitions(source_files, parallel, max_workers, fast_scan))
+
+def iter_class_definitions(source_files, parallel=False, max_workers=None, fast_scan=False):
+    '''
+    Yield the read_class_definitions result of each source file, in the 
+    same order as source_files, as soon as it is available. Closing the 
+    generator cancels the files that were not read yet. 
+    See read_all_class_definitions.
+    '''
+    yield from _iter_read_files(partial(read_class_definitions, fast_scan=fast_scan), source_files, 
+        parallel, max_workers)
+
+def _iter_read_files(read_file, source_files, parallel, max_workers):
+    '''Yield the read_file result of each source file, see iter_class_definitions.'''
+    max_workers = max_workers or os.cpu_count() or 1
+    if not parallel or max_workers < 2 or len(source_files) < PARALLEL_BUILD_MIN_FILES:
+        for filepath in source_files:
+            yield read_file(filepath)
+        return
+
+    chunksize = max(1, len(source_files) // (max_workers * 4))
+    # Forking would copy the locks held by the designer's other threads, 
+    # such as a background scan, into the workers. The forkserver is left 
+    # to the visualizers, see hotreload.default_mp_context.
+    executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        yield from executor.map(read_file, source_files, chunksize=chunksize)
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+def iter_directory_class_definitions(directory, file_filter=None, parallel=False, max_workers=None, 
+    scan_cache=None, fast_scan=False):
+    '''
+    Recursively yield a (filepath, classdefs) tuple for each python file 
+    within the directory that passes the file_filter, in directory order.
+    See InheritanceTreesBuilder.build_from_directory for the arguments. 
+    The scan_cache is updated and saved once every file was yielded.
+    '''
+    source_files = list(_iter_source_files(directory, file_filter))
+    if scan_cache is None:
+        parsed_classdefs = iter_class_definitions(source_files, parallel, max_workers, fast_scan)
+        try:
+            yield from zip(source_files, parsed_classdefs)
+        finally:
+            parsed_classdefs.close()
+        return
+
+    cached_classdefs = dict()
+    for filepath in source_files:
+        classdefs = scan_cache.get(filepath, fast_scan)
+        if classdefs is not None:
+            cached_classdefs[filepath] = classdefs
+
+    # The workers return the stat of the bytes they parsed, so the files are only read once
+    files_to_parse = [filepath for filepath in source_files if filepath not in cached_classdefs]
+    parsed_files = _iter_read_files(partial(read_source_file, fast_scan=fast_scan), files_to_parse, 
+        parallel, max_workers)
+    try:
+        for filepath in source_files:
+            if filepath in cached_classdefs:
+                yield filepath, cached_classdefs[filepath]
+                continue
+            classdefs, source_stat = next(parsed_files)
+            scan_cache.set(filepath, classdefs, source_stat, fast_scan)
+            yield filepath, classdefs
+    finally:
+        parsed_files.close()
+
+    scan_cache.retain(source_files)
+    scan_cache.save()
+
+def is_project_source(filepath):
+    '''
+    Return True if the file or directory is part of a project search path.
+    External packages, and directories starting with '.' or '_' such as
+    __pycache__ and .git, are excluded from the search.
+    '''
+    filepath = Path(filepath)
+    dirs_to_exclude = [Path(path) for path in site.getsitepackages()]
+    from_excluded_dir = any(filepath.is_relative_to(parent) for parent in dirs_to_exclude)
+    if from_excluded_dir:
+        return False
+    # Parts will return a list of the directory names and
+    # the root drive path. This excludes paths such as
+    # __pycache__ and .git. Instead of doing an exhaustive search,
+    # just check if the child directory starts with a prefix
+    if filepath.is_dir():
+        child_dir = filepath.parts[-1]
+        return not any(child_dir.startswith(prefix) for prefix in ('.', '_', '__'))
+    return True
+
+def _iter_source_files(directory, file_filter=None):
+    '''
+    Recursively yield the python files within directory that pass the file_filter.
+    '''
+    for pathitem in Path(directory).glob('*'):
+        if file_filter and file_filter(pathitem):
+            if pathitem.is_dir():
+                yield from _iter_source_files(pathitem, file_filter)
+            elif pathitem.is_file() and pathitem.suffix == ".py":
+                yield pathitem
 
 class InheritanceTreesBuilder(ast.NodeVisitor):
     '''
@@ -134,35 +481,7 @@ class InheritanceTreesBuilder(ast.NodeVisitor):
         self.tree = InheritanceTrees()
 
     def visit_ClassDef(self, node):
-        parents = list()
-        for base in node.bases:
-            if isinstance(base, ast.Name):
-                # Standard base class declaration
-                parents.append(base.id)
-            elif isinstance(base, ast.Attribute):
-                # Parent of form module.Class
-                parents.append(base.attr)
-            elif isinstance(base, ast.Subscript):
-                # Generic Parent of form Generic[T1,...,Tn]
-                if isinstance(base.slice, ast.Name):
-                    type_params = [base.slice.id]
-                elif isinstance(base.slice, ast.Tuple):
-                    type_params = [e.id for e in base.slice.elts]
-                elif isinstance(base.slice, ast.Constant):
-                    type_params = [base.slice.value]
-                else:
-                    raise Exception("Unknown subscript type: " + str(type(base.slice)))
-                parents.append(base.value.id + "[" + ",".join(type_params) + "]")
-            elif isinstance(base, ast.Call):
-                # Call classdef bases not supported.
-                # Our goals is to avoid executing any code, and
-                # we can't determine the return value of a Call
-                # node without execution.
-                pass
-            else:
-                raise Exception("Unknown base type: " + str(type(base)))
-                
-        self.tree.add_class(self.current_filepath, node.name, parents)
+        self.tree.add_class(self.current_filepath, node.name, get_base_classnames(node))
 
     def build(self, file_source, source_filepath=None):
         tree = ast.parse(file_source)
@@ -178,21 +497,52 @@ class InheritanceTreesBuilder(ast.NodeVisitor):
         except:
             return None
 
-    def build_from_directory(self, directory, file_filter=None):
-        for pathitem in Path(directory).glob('*'):
-            if file_filter and file_filter(pathitem):
-                print(pathitem)
-                if pathitem.is_dir():
-                    self.build_from_directory(pathitem, file_filter)
-                elif pathitem.is_file() and pathitem.suffix == ".py":
-                    self.build_from_file(pathitem)
+    def build_from_classdefs(self, source_filepath, classdefs):
+        '''
+        Add (classname, parent_classnames) tuples that were previously 
+        extracted from source_filepath. Mirrors build_from_file, so a 
+        conflicting class definition stops the remainder of the file 
+        from being added. 
+        '''
+        try:
+            for classname, parent_classnames in classdefs:
+                self.tree.add_class(source_filepath, classname, parent_classnames)
+            return self.tree
+        except:
+            return None
+
+    def build_from_directory(self, directory, file_filter=None, parallel=False, max_workers=None, scan_cache=None,
+        fast_scan=False):
+        '''
+        Recursively parse all python files within the directory. 
+
+        If parallel is True the files are read and parsed by a pool of 
+        max_workers processes. See read_all_class_definitions.
+
+        If fast_scan is True, files are scanned for class headers and only 
+        parsed into a full AST when the scan is ambiguous. See scan_class_headers.
+
+        If a ScanCache is provided, files that are unchanged since the 
+        previous scan are loaded from the cache instead of being parsed. 
+        The cache is updated and saved once the scan completes.
+
+        The results are always merged into the tree in directory order, so 
+        the parallel and cached builds produce the same tree as a serial 
+        build. The fast_scan tree only differs by the classes of files with
+        syntax errors, which a full parse skips.
+        '''
+        for filepath, classdefs in iter_directory_class_definitions(directory, file_filter, parallel, 
+            max_workers, scan_cache, fast_scan):
+            self.build_from_classdefs(filepath, classdefs)
 
-    def refresh_source_file(self, filepath):
+    def refresh_source_file(self, filepath, fast_scan=False):
         '''
-        Refresh the inheritance tree by re-parsing a single file.
+        Refresh the inheritance tree by re-parsing a single file. Use the
+        same fast_scan as the build_from_directory that built the tree, so
+        the refreshed file contributes the same classes as a full rebuild.
         '''
         self.tree.remove_source(filepath)
-        self.build_from_file(filepath)
+        self.build_from_classdefs(filepath, read_class_definitions(filepath, fast_scan))
 
     @classmethod
     def empty(cls):
@@ -1,11 +1,27 @@
 import os
+import threading
+from collections import OrderedDict
+from functools import partial
 from pathlib import Path
 from kivy.app import App
+from kivy.clock import Clock, mainthread
 from kivy.lang import Builder
 from kivy.uix.boxlayout import BoxLayout
 
-import multiprocessing
-from kivydesigner.hotreload import run_visualization_app, HotReloadInstructionQueue
+from kivydesigner.hotreload import VisualizerPool, ReloadResult, ResyncRequest
+from kivydesigner.kvdiff import kv_digest
+from kivydesigner.filewatcher import create_file_watcher
+from kivydesigner.reloadtrace import ReloadTrace, ReloadStats
+
+STANDBY_START_DELAY = 2.0
+'''Seconds to wait before starting a standby visualizer, so the standby 
+does not compete with the designer startup or a promoted visualizer.'''
+
+MAX_FAILED_DOCUMENTS = 8
+'''Number of documents that failed to build to remember, so they are not sent again.'''
+
+REPLY_POLL_INTERVAL = 0.5
+'''Seconds to wait for a visualizer reply before checking if the visualizer exited.'''
 
 class RootWidget(BoxLayout):
     pass
@@ -23,60 +39,173 @@ class KivyDesignerApp(App):
 
     Updates to the visualized applications are triggered 
     by sending a HotReloadInstruction to the child process,
-    through a multiprocessing Queue.  
+    through a multiprocessing Queue. A hidden standby visualizer
+    is kept warm, so opening the preview does not wait for a new
+    process to import kivy and create its window.
+
+    The project folder is watched for changes on disk, which are 
+    forwarded to the file explorer and the widget listbox.
+
+    The visualizer replies with a ReloadResult for each reload, and build
+    errors are shown below the kv editor. Recent documents that failed to
+    build are not sent again, and their error is shown immediately, until
+    the project's python files change. Documents that only differ from the
+    last sent document by comments or whitespace are not sent at all.
+    Each reload's ReloadTrace is collected in reload_stats, and the reload
+    latency is shown below the kv editor. Call reload_stats.write_chrome_trace
+    to export the traces.
     '''
     def build(self):
         self.title = 'Kivy Designer'
-        self.visualization_instructions = HotReloadInstructionQueue()
-        self.visualization_subprocess = None
+        self.visualizer_pool = VisualizerPool()
+        self.visualizer = None
+        self.project_watcher = None
+        self.reload_stats = ReloadStats()
+        self._sent_version = None
+        self._sent_kv_str = None
+        self._sent_digest = None
+        self._failed_documents = OrderedDict()
+        '''Map of recent documents the visualizer failed to build to their ReloadResult.'''
         return super().build()
 
+    def on_start(self):
+        self._schedule_standby_visualizer()
+        file_explorer = self.root.ids.get('file_explorer')
+        if file_explorer:
+            file_explorer.bind(rootpath=self._watch_project)
+            self._watch_project(file_explorer, file_explorer.rootpath)
+
     def on_stop(self):
         '''
         Gracefully terminate the visualization subprocess when the kivy 
         designer is stopped.
         '''
+        self._stop_watching_project()
         if self._is_visualizing():
-            self.visualization_instructions.stop_reload()
-            self.visualization_subprocess.join()
+            self.visualizer.stop()
+        self.visualizer_pool.shutdown()
+
+    def _watch_project(self, instance, project_path):
+        '''
+        Start watching the project folder for changes on disk. Stop 
+        watching the previous project folder, if any.
+        '''
+        self._stop_watching_project()
+        if project_path and os.path.isdir(project_path):
+            root_path = os.path.abspath(project_path)
+            self.project_watcher = create_file_watcher(root_path, 
+                partial(self._on_project_files_changed, root_path))
+            self.project_watcher.start()
+
+    def _stop_watching_project(self):
+        if self.project_watcher:
+            self.project_watcher.stop()
+            self.project_watcher = None
+
+    @mainthread
+    def _on_project_files_changed(self, root_path, changes):
+        '''
+        Forward a batch of file changes to the widgets that display the project,
+        and reload the changed python modules in the visualizer. 
+        Called on the main thread, once per debounced batch of changes.
+        '''
+        if self.project_watcher is None or self.project_watcher.root_path != root_path:
+            # The batch was queued before the project was closed or switched
+            return
+        self.root.ids.widget_listbox.apply_file_changes(changes)
+        self.root.ids.file_explorer.refresh_entries()
+        changed_sources = [path for path in changes.paths if path.endswith('.py')]
+        if changed_sources:
+            # The failed documents may use the changed classes
+            self._failed_documents.clear()
+        if changed_sources and self._is_visualizing():
+            self.visualizer.instructions.reload_pymodules(root_path, changed_sources)
 
     def _is_visualizing(self):
         '''
         Return true if a kivy visualizer subprocess is running. 
         Return false otherwise.
         '''
-        result = self.visualization_subprocess is not None
-        if result:
-            try:
-                result = self.visualization_subprocess.is_alive()
-            except ValueError as e:
-                # is_alive will throw a ValueError if the process is 
-                # already closed
-                result = False
-
+        result = self.visualizer is not None and self.visualizer.is_alive()
         # We know the subprocess is no longer valid. Clear our ref
-        if not result and self.visualization_subprocess:
-            self.visualization_subprocess = None 
+        if not result:
+            self.visualizer = None 
         return result
 
+    def _schedule_standby_visualizer(self):
+        Clock.schedule_once(lambda dt: self.visualizer_pool.start_standby(), STANDBY_START_DELAY)
+
     def _start_visualizing(self):
         '''
-        Run the VisualizationSubprocess on a new child process. 
-        Hot reloads can be performed by putting reload instructions
-        onto the visualization_instructions queue. 
+        Promote the standby visualizer, or start a new visualizer if no
+        standby is ready. Hot reloads can be performed by putting reload 
+        instructions onto the visualizer's instructions queue. 
         '''
-        # We are taking special care to avoid creating VisualizationSubprocess within
-        # this interpreter session to avoid initializing the VisualizationSubprocess 
-        # app using the KivyDesignerApp config. Kivy's initialization relies on global 
-        # singletons, so mixing the environments will cause the visualization to fail.
-        new_process = multiprocessing.Process(
-            target=run_visualization_app,
-            args=(self.visualization_instructions,)
-        )
-        new_process.start()
-        self.visualization_subprocess = new_process
+        # The visualizers are forked from a template process, or spawned, 
+        # instead of forking this interpreter session, to avoid initializing
+        # the visualized app using the KivyDesignerApp config. Kivy's 
+        # initialization relies on global singletons, so mixing the 
+        # environments will cause the visualization to fail.
+        self.visualizer = self.visualizer_pool.acquire()
+        self._schedule_standby_visualizer()
+        self._sent_version = self._sent_kv_str = self._sent_digest = None
+        self._failed_documents.clear()
+        threading.Thread(target=self._listen_for_replies, args=(self.visualizer,), daemon=True).start()
+        if self.project_watcher:
+            # Add the project to the visualizer's import path, so the kv 
+            # string can import the project's modules
+            self.visualizer.instructions.set_project_path(self.project_watcher.root_path)
+
+    def _listen_for_replies(self, visualizer):
+        '''
+        Forward the visualizer's replies to the kivy thread until the 
+        visualizer exits. Runs on a background thread.
+        '''
+        while visualizer.is_alive():
+            reply = visualizer.instructions.next_reply(timeout=REPLY_POLL_INTERVAL)
+            if reply is not None:
+                self._on_visualizer_reply(visualizer, reply)
+
+    @mainthread
+    def _on_visualizer_reply(self, visualizer, reply):
+        if visualizer is not self.visualizer:
+            # Reply from a visualizer the user closed
+            return
+        if isinstance(reply, ReloadResult):
+            # Results of older documents are out of date
+            if reply.version != self._sent_version:
+                return
+            if reply.success:
+                self._failed_documents.pop(self._sent_kv_str, None)
+            else:
+                self._failed_documents[self._sent_kv_str] = reply
+                if len(self._failed_documents) > MAX_FAILED_DOCUMENTS:
+                    self._failed_documents.popitem(last=False)
+            self.root.ids.visualizer.show_reload_result(reply)
+        elif isinstance(reply, ResyncRequest):
+            # The visualizer dropped an edit, and shows an old document 
+            # until it receives the current one in full
+            visualizer.instructions.resync()
+        elif isinstance(reply, ReloadTrace) and reply.is_complete():
+            self.reload_stats.add(reply)
+            self.root.ids.visualizer.show_reload_latency(reply.duration(), self.reload_stats.p50, 
+                self.reload_stats.p99)
 
     def hot_reload(self, new_kv_str):
         if not self._is_visualizing():
             self._start_visualizing()
-        self.visualization_instructions.reload_kvstring(new_kv_str) 
\ No newline at end of file
+        elif new_kv_str in self._failed_documents:
+            # Rebuilding the document would fail with the same error. 
+            # The visualizer keeps showing the previous document, and its 
+            # pending result no longer matches the editor.
+            self._sent_version = self._sent_kv_str = self._sent_digest = None
+            self._failed_documents.move_to_end(new_kv_str)
+            self.root.ids.visualizer.show_reload_result(self._failed_documents[new_kv_str])
+            return
+        digest = kv_digest(new_kv_str)
+        if digest == self._sent_digest and self._sent_kv_str not in self._failed_documents:
+            # Only comments or whitespace changed, so the widget tree is the same.
+            # Failed documents are sent again, to report the new error lines.
+            return
+        self._sent_version = self.visualizer.instructions.reload_kvstring(new_kv_str)
+        self._sent_kv_str, self._sent_digest = new_kv_str, digest
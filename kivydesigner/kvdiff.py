@@ -0,0 +1,221 @@
+'''
+kvdiff.py compares two parsed kv documents, and patches the live widget
+tree when only property values changed.
+
+Two documents have the same structure if they define the same directives,
+rules, widgets, ids, handlers and canvas instructions, with the same
+property names in the same order. If only the values of widget properties
+changed, either in the root widget tree or on the top level of a class
+rule, the new values are assigned to the live widgets instead of
+rebuilding the widget tree.
+
+normalize_kv and kv_digest identify documents that build the same widget
+tree, even if their comments, blank lines or trailing whitespace differ.
+
+Only constant values can be patched, such as numbers, colors, strings and
+calls like dp(10). Values that bind to other properties (self.width / 2)
+are set up by the Builder, so changing them requires a rebuild. Any change
+that cannot be patched makes diff_kv return None, or apply_property_updates
+raise a KvPatchError, and the caller should fall back to a full rebuild.
+'''
+
+import hashlib
+from copy import copy
+from dataclasses import dataclass
+from types import CodeType
+from typing import Optional
+
+from kivy.lang import Builder
+from kivy.lang.parser import global_idmap
+
+class KvPatchError(Exception):
+    pass
+
+@dataclass
+class PropertyUpdate:
+    prop: object
+    '''The new kivy.lang.parser.ParserRuleProperty.'''
+    rule_index: Optional[int] = None
+    '''Index of the changed class rule in Parser.rules, or None if the
+    property is part of the root widget tree.'''
+    widget_path: tuple = ()
+    '''Child indices from the root widget rule to the changed widget rule,
+    if the property is part of the root widget tree.'''
+
+def normalize_kv(kv_str):
+    '''
+    Return kv_str without comments, blank lines and trailing whitespace.
+    Like kivy's Parser, only lines starting with # are comments, and lines
+    starting with #: are directives.
+    '''
+    lines = list()
+    for line in kv_str.splitlines():
+        line = line.rstrip()
+        stripped = line.lstrip()
+        if not stripped or (stripped.startswith('#') and not stripped.startswith('#:')):
+            continue
+        lines.append(line)
+    return '\n'.join(lines)
+
+def kv_digest(kv_str):
+    '''Return a hash of the normalized kv_str. See normalize_kv.'''
+    return hashlib.blake2b(normalize_kv(kv_str).encode('utf8'), digest_size=16).hexdigest()
+
+def _is_constant(prop):
+    # Properties that reference other properties are bound by the Builder
+    return prop.watched_keys is None
+
+def _rule_signature(rule, compare_values=True, compare_child_values=True):
+    '''
+    Return a comparable summary of the rule. Property values are only
+    included if compare_values is True, and the property values of the
+    child rules only if compare_child_values is True. Handlers and canvas
+    instructions are always compared by value.
+    '''
+    if rule is None:
+        return None
+    return (
+        rule.name, rule.id, rule.avoid_previous_rules,
+        tuple((name, prop.value if compare_values else None) for name, prop in rule.properties.items()),
+        tuple((handler.name, handler.value) for handler in rule.handlers),
+        _rule_signature(rule.canvas_before),
+        _rule_signature(rule.canvas_root),
+        _rule_signature(rule.canvas_after),
+        tuple(_rule_signature(child, compare_child_values, compare_child_values) for child in rule.children)
+    )
+
+def _diff_properties(old_rule, new_rule, updates, **update_kwargs):
+    '''Add an update for each changed property value. Return False if a change cannot be patched.'''
+    for name, new_prop in new_rule.properties.items():
+        old_prop = old_rule.properties[name]
+        if old_prop.value == new_prop.value:
+            continue
+        if not (_is_constant(old_prop) and _is_constant(new_prop)):
+            return False
+        updates.append(PropertyUpdate(new_prop, **update_kwargs))
+    return True
+
+def _diff_widget_tree(old_rule, new_rule, widget_path, updates):
+    if not _diff_properties(old_rule, new_rule, updates, widget_path=widget_path):
+        return False
+    return all(_diff_widget_tree(old_child, new_child, widget_path + (idx,), updates)
+        for idx, (old_child, new_child) in enumerate(zip(old_rule.children, new_rule.children)))
+
+def diff_kv(old_parser, new_parser):
+    '''
+    Return the list of PropertyUpdates that turn the old kv document into
+    the new kv document, or None if the structure of the documents differ.
+    Both arguments are kivy.lang.parser.Parser instances.
+    '''
+    if [cmd.strip() for _, cmd in old_parser.directives] != [cmd.strip() for _, cmd in new_parser.directives]:
+        return None
+    if old_parser.dynamic_classes != new_parser.dynamic_classes:
+        return None
+    old_templates = [(name, base, _rule_signature(rule)) for name, base, rule in old_parser.templates]
+    new_templates = [(name, base, _rule_signature(rule)) for name, base, rule in new_parser.templates]
+    if old_templates != new_templates or len(old_parser.rules) != len(new_parser.rules):
+        return None
+
+    updates = list()
+    for rule_index, ((old_selector, old_rule), (new_selector, new_rule)) in \
+        enumerate(zip(old_parser.rules, new_parser.rules)):
+        if (type(old_selector), old_selector.key) != (type(new_selector), new_selector.key):
+            return None
+        # Only the top level of a class rule can be patched. The widgets
+        # created by the rule's children are not tracked.
+        if _rule_signature(old_rule, False, True) != _rule_signature(new_rule, False, True):
+            return None
+        if not _diff_properties(old_rule, new_rule, updates, rule_index=rule_index):
+            return None
+
+    if _rule_signature(old_parser.root, False, False) != _rule_signature(new_parser.root, False, False):
+        return None
+    if new_parser.root and not _diff_widget_tree(old_parser.root, new_parser.root, (), updates):
+        return None
+    return updates
+
+def _map_instance_rules(widget, rule, instance_rules):
+    '''
+    Map each widget of the live tree to the root tree rule that created it.
+    The rule's children are the last widgets added to the widget, after any
+    children added by class rules.
+    '''
+    instance_rules[widget] = rule
+    num_children = len(rule.children)
+    if num_children == 0:
+        return
+    kv_children = list(reversed(widget.children))[-num_children:]
+    if len(kv_children) != num_children:
+        raise KvPatchError(f'{rule.name} has {len(kv_children)} children, expected {num_children}')
+    for child_widget, child_rule in zip(kv_children, rule.children):
+        if type(child_widget).__name__ != child_rule.name:
+            raise KvPatchError(f'Expected a {child_rule.name}, found {type(child_widget).__name__}')
+        _map_instance_rules(child_widget, child_rule, instance_rules)
+
+def _evaluate(prop, widget, rule_root):
+    value = prop.co_value
+    if type(value) is CodeType:
+        idmap = copy(global_idmap)
+        idmap.update(rule_root.ids)
+        idmap['self'] = widget.proxy_ref
+        idmap['root'] = rule_root.proxy_ref
+        try:
+            value = eval(value, idmap)
+        except Exception as err:
+            raise KvPatchError(f'Could not evaluate {prop.name}: {err}') from err
+    return value
+
+def apply_property_updates(root_widget, parser, updates):
+    '''
+    Assign the updated property values to the live widget tree, built from
+    the previous version of parser's document. All values are evaluated
+    before any are assigned, so evaluation errors leave the tree unchanged.
+    '''
+    if parser.root is None:
+        return
+    instance_rules = dict()
+    _map_instance_rules(root_widget, parser.root, instance_rules)
+    rule_widgets = {id(rule): widget for widget, rule in instance_rules.items()}
+
+    assignments = list()
+    for update in updates:
+        name = update.prop.name
+        if update.rule_index is None:
+            rule = parser.root
+            for idx in update.widget_path:
+                rule = rule.children[idx]
+            widget = rule_widgets[id(rule)]
+            assignments.append((widget, name, _evaluate(update.prop, widget, root_widget)))
+            continue
+
+        selector, _ = parser.rules[update.rule_index]
+        later_rules = parser.rules[update.rule_index + 1:]
+        for widget in root_widget.walk(restrict=True):
+            if not selector.match(widget):
+                continue
+            if widget not in instance_rules:
+                # Created by a class rule, which may override the value
+                raise KvPatchError(f'Cannot patch {name} of {type(widget).__name__} created by a class rule')
+            # Later rules, and the widget's own rule, take precedence
+            overridden = name in instance_rules[widget].properties or any(
+                name in rule.properties and later_selector.match(widget) for later_selector, rule in later_rules)
+            if not overridden:
+                assignments.append((widget, name, _evaluate(update.prop, widget, widget)))
+
+    for widget, name, value in assignments:
+        try:
+            setattr(widget, name, value)
+        except Exception as err:
+            raise KvPatchError(f'Could not set {name} of {type(widget).__name__}: {err}') from err
+
+def update_builder_rules(filename, parser, updates):
+    '''
+    Replace the changed properties of the class rules the Builder loaded
+    from filename, so widgets created after the patch use the new values.
+    '''
+    loaded_rules = [rule for _, rule in Builder.rules if rule.ctx.filename == filename]
+    if len(loaded_rules) != len(parser.rules):
+        raise KvPatchError(f'The Builder rules of {filename} do not match the document')
+    for update in updates:
+        if update.rule_index is not None:
+            loaded_rules[update.rule_index].properties[update.prop.name] = update.prop
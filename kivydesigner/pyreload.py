@@ -0,0 +1,165 @@
+'''
+pyreload.py reloads the user's python modules within the visualization
+process, without restarting the interpreter.
+
+The project's InheritanceTrees is used to find the classes affected by a
+changed file: the classes defined in the file, and all of their subclasses.
+Only the imported modules that define an affected class are reloaded, bases
+before subclasses, so each reloaded subclass inherits from the reloaded base.
+The reloaded classes replace the previous classes in the kivy Factory, so kv
+rules and Factory lookups build the new classes.
+
+Modules that only reference an affected class, without subclassing it, are
+not reloaded and keep a reference to the previous class.
+
+The inheritance tree is only built once a file changes, from the project's
+ScanCache, so the designer's scan of the project is reused instead of
+parsing every file again.
+'''
+
+import os
+import sys
+import importlib
+
+from kivy.factory import Factory
+from kivy.logger import Logger
+from kivydesigner.inheritancetrees import InheritanceTreesBuilder, is_project_source
+from kivydesigner.scancache import ScanCache
+
+class ModuleReloader:
+    '''
+    Reload the modules of a project directory affected by changed source files.
+    The project directory is added to sys.path, so its modules can be imported.
+    The scan_cache defaults to the project's ScanCache.
+    '''
+    def __init__(self, project_path, scan_cache=None):
+        self.project_path = os.path.abspath(project_path)
+        self.scan_cache = scan_cache
+        self._tree_builder = None
+        if self.project_path not in sys.path:
+            sys.path.insert(0, self.project_path)
+
+    @property
+    def tree_builder(self):
+        '''The project's InheritanceTreesBuilder, built on first use.'''
+        if self._tree_builder is None:
+            scan_cache = self.scan_cache if self.scan_cache is not None else ScanCache.for_project(self.project_path)
+            self._tree_builder = InheritanceTreesBuilder()
+            self._tree_builder.build_from_directory(self.project_path, is_project_source, 
+                scan_cache=scan_cache, fast_scan=True)
+        return self._tree_builder
+
+    @property
+    def tree(self):
+        return self.tree_builder.tree
+
+    def get_affected_classes(self, filepaths):
+        '''
+        Refresh the inheritance tree from the changed files, and return the
+        classes defined in the files before and after the change, along with
+        all of their subclasses.
+        '''
+        affected_classes = set()
+        imported_modules = _get_imported_modules()
+        for filepath in filepaths:
+            filepath = os.path.abspath(filepath)
+            # The tree may be built after the change, so the classes of the 
+            # imported module are the classes defined before the change
+            if filepath in imported_modules:
+                affected_classes |= _get_module_classnames(imported_modules[filepath])
+            affected_classes |= self.tree.sources.get(filepath, set())
+            self.tree_builder.refresh_source_file(filepath, fast_scan=True)
+            affected_classes |= self.tree.sources.get(filepath, set())
+        for classname in list(affected_classes):
+            affected_classes |= self.tree.get_subclasses(classname)
+        return affected_classes
+
+    def reload_files(self, filepaths):
+        '''
+        Reload the imported modules affected by the changed files. Return the
+        names of the reloaded modules, in reload order.
+        '''
+        if not filepaths:
+            return list()
+        affected_classes = self.get_affected_classes(filepaths)
+        affected_files = {os.path.abspath(filepath) for filepath in filepaths}
+        for classname in affected_classes:
+            class_node = self.tree.get_class(classname)
+            if class_node and class_node.source_path:
+                affected_files.add(class_node.source_path)
+
+        imported_modules = _get_imported_modules()
+        modules_by_file = {filepath: imported_modules[filepath]
+            for filepath in affected_files if filepath in imported_modules}
+
+        reloaded_modules = list()
+        for filepath in self._sort_by_inheritance(modules_by_file.keys()):
+            module = modules_by_file[filepath]
+            if self._reload_module(module, filepath, affected_classes):
+                reloaded_modules.append(module.__name__)
+        return reloaded_modules
+
+    def _sort_by_inheritance(self, filepaths):
+        '''
+        Order the files so each file comes after the files defining its
+        base classes. Files within an import cycle keep their relative order.
+        '''
+        base_files = dict()
+        for filepath in sorted(filepaths):
+            superclasses = set()
+            for classname in self.tree.sources.get(filepath, set()):
+                superclasses |= self.tree.get_superclasses(classname)
+            base_files[filepath] = {self.tree.get_class(superclass).source_path
+                for superclass in superclasses} - {filepath}
+
+        ordered_files = list()
+        while base_files:
+            ready = [filepath for filepath, bases in base_files.items() if not bases & base_files.keys()]
+            # Break cycles by taking the files in their original order
+            ready = ready or list(base_files.keys())[:1]
+            for filepath in ready:
+                del base_files[filepath]
+            ordered_files.extend(ready)
+        return ordered_files
+
+    def _reload_module(self, module, filepath, affected_classes):
+        # Factory.register ignores classes that are already registered,
+        # so the previous classes must be unregistered first
+        previous_classes = {classname: entry['cls'] for classname, entry in Factory.classes.items()
+            if entry['cls'] is not None and getattr(entry['cls'], '__module__', None) == module.__name__}
+        Factory.unregister(*previous_classes)
+
+        try:
+            importlib.reload(module)
+        except Exception:
+            # Most likely the user is mid edit. Keep the previous classes.
+            Logger.exception(f'HotReload: Could not reload module {module.__name__}')
+            for classname, cls in previous_classes.items():
+                Factory.register(classname, cls=cls)
+            return False
+
+        for classname in self.tree.sources.get(filepath, set()) | previous_classes.keys():
+            cls = getattr(module, classname, None)
+            if isinstance(cls, type) and classname not in Factory.classes:
+                Factory.register(classname, cls=cls)
+
+        # Dynamic kv classes cache the class created from their bases
+        for entry in Factory.classes.values():
+            if entry['baseclasses'] and affected_classes & set(entry['baseclasses'].split('+')):
+                entry['cls'] = None
+        Logger.info(f'HotReload: Reloaded module {module.__name__}')
+        return True
+
+def _get_module_classnames(module):
+    '''Return the names of the classes defined by the module.'''
+    return {name for name, value in list(vars(module).items()) 
+        if isinstance(value, type) and value.__module__ == module.__name__}
+
+def _get_imported_modules():
+    '''Return a map of source path to each imported module loaded from a file.'''
+    imported_modules = dict()
+    for module in list(sys.modules.values()):
+        module_file = getattr(module, '__file__', None)
+        if module_file:
+            imported_modules[os.path.abspath(module_file)] = module
+    return imported_modules
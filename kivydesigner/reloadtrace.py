@@ -0,0 +1,116 @@
+'''
+reloadtrace.py measures where the time goes during a hot reload.
+
+Each kv string instruction carries a ReloadTrace, stamped with the time
+of each reload stage. The designer stamps the trace when it enqueues the
+instruction, and the visualizer stamps the remaining stages and sends the
+trace back over the instruction queue's reply channel. Timestamps are
+time.monotonic_ns values. The monotonic clock is system wide on Linux,
+Windows and macOS, so stamps from both processes can be compared, and
+unlike the wall clock it is not adjusted during a reload.
+
+ReloadStats keeps the most recent traces, reports rolling percentiles,
+and exports the traces in the Chrome trace event format, which can be
+opened with chrome://tracing or https://ui.perfetto.dev.
+'''
+
+import json
+import math
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+STAGES = ('enqueue', 'dequeue', 'build_start', 'build_end', 'draw')
+'''Reload stages, in the order they are stamped.'''
+
+INTERVALS = (
+    ('queued', 'enqueue', 'dequeue'),
+    ('scheduled', 'dequeue', 'build_start'),
+    ('build', 'build_start', 'build_end'),
+    ('draw', 'build_end', 'draw'),
+)
+'''Name, start stage and end stage of each interval between stages.'''
+
+@dataclass
+class ReloadTrace:
+    instruction_id: int
+    stamps: dict = field(default_factory=dict)
+    '''Map of stage name to time.monotonic_ns() value.'''
+    patched: bool = False
+    '''True if the live widget tree was patched instead of rebuilt.'''
+
+    def stamp(self, stage):
+        self.stamps[stage] = time.monotonic_ns()
+
+    def duration(self, start_stage='enqueue', end_stage='draw'):
+        '''Return the seconds between the stages, or None if either stage is missing.'''
+        if start_stage not in self.stamps or end_stage not in self.stamps:
+            return None
+        return (self.stamps[end_stage] - self.stamps[start_stage]) / 1e9
+
+    def is_complete(self):
+        return all(stage in self.stamps for stage in STAGES)
+
+def percentile(values, percent):
+    '''Return the nearest-rank percentile of the values, or None if there are no values.'''
+    if not values:
+        return None
+    values = sorted(values)
+    rank = math.ceil(percent / 100 * len(values))
+    return values[max(rank, 1) - 1]
+
+class ReloadStats:
+    '''
+    Rolling statistics of the max_traces most recent complete reload traces.
+    '''
+    def __init__(self, max_traces=500):
+        self.traces = deque(maxlen=max_traces)
+
+    def add(self, trace):
+        '''Add a trace. Incomplete traces are ignored.'''
+        if trace.is_complete():
+            self.traces.append(trace)
+
+    def percentile(self, percent, start_stage='enqueue', end_stage='draw'):
+        '''Return the percentile of the seconds between the stages, or None if there are no traces.'''
+        return percentile([trace.duration(start_stage, end_stage) for trace in self.traces], percent)
+
+    @property
+    def p50(self):
+        return self.percentile(50)
+
+    @property
+    def p99(self):
+        return self.percentile(99)
+
+    def summary(self):
+        '''
+        Return a map of interval name to its (p50, p99) in seconds. The
+        'total' interval covers the enqueue until the reload is drawn.
+        '''
+        summary = {name: (self.percentile(50, start, end), self.percentile(99, start, end))
+            for name, start, end in INTERVALS}
+        summary['total'] = (self.p50, self.p99)
+        return summary
+
+    def chrome_trace_events(self):
+        '''
+        Return the traces as Chrome trace complete events. Each reload is
+        drawn as a span on the first row, and its intervals on the second.
+        '''
+        events = list()
+        for trace in self.traces:
+            args = {'instruction_id': trace.instruction_id, 'patched': trace.patched}
+            spans = [(f'reload {trace.instruction_id}', 'enqueue', 'draw', 0)]
+            spans += [(name, start, end, 1) for name, start, end in INTERVALS]
+            for name, start, end, tid in spans:
+                events.append({
+                    'name': name, 'cat': 'hotreload', 'ph': 'X', 'pid': 0, 'tid': tid,
+                    'ts': trace.stamps[start] / 1e3, 'dur': trace.duration(start, end) * 1e6,
+                    'args': args,
+                })
+        return events
+
+    def write_chrome_trace(self, filepath):
+        with open(filepath, 'w') as f:
+            json.dump({'traceEvents': self.chrome_trace_events(), 'displayTimeUnit': 'ms'}, f)
@@ -0,0 +1,149 @@
+'''
+scancache.py persists the class definitions parsed from a project, so a
+warm start of the designer only re-parses the source files that changed.
+
+Each cached file is keyed by its path, and stores the file size, mtime and
+content hash alongside the list of (classname, parent_classnames) tuples
+found in the file. A cache entry is trusted if the size and mtime are
+unchanged, so a warm scan only needs to stat each file. If the size or
+mtime changed, the content hash is checked before the file is re-parsed.
+
+The size, mtime and hash are computed from the bytes that were parsed, see
+read_source_bytes, so a file modified during the scan is never cached 
+under the stat of its new contents. Entries also record whether the file
+was parsed with fast_scan, since the fast scan may find other classes.
+'''
+
+import os
+import sys
+import json
+import hashlib
+from pathlib import Path
+from typing import NamedTuple
+
+SCAN_CACHE_VERSION = 2
+'''Increment when the cache format, or the parsed classdef format, changes.'''
+
+def default_cache_dir():
+    '''Return the per-user cache directory used by the kivy designer.'''
+    if sys.platform == 'win32':
+        base_dir = os.environ.get('LOCALAPPDATA') or Path.home() / 'AppData' / 'Local'
+        return Path(base_dir) / 'kivydesigner' / 'Cache'
+    if sys.platform == 'darwin':
+        return Path.home() / 'Library' / 'Caches' / 'kivydesigner'
+    base_dir = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base_dir) / 'kivydesigner'
+
+class SourceStat(NamedTuple):
+    '''Size, mtime and content hash of the bytes a source file was parsed from.'''
+    size: int
+    mtime_ns: int
+    content_hash: str
+
+def read_source_bytes(filepath):
+    '''
+    Return the bytes of the file, and their SourceStat. The mtime is read 
+    before the bytes, so a file modified while it is read gets an older 
+    mtime than the file, and is checked against its hash by the next scan.
+    '''
+    with open(filepath, 'rb') as reader:
+        mtime_ns = os.fstat(reader.fileno()).st_mtime_ns
+        data = reader.read()
+    return data, SourceStat(len(data), mtime_ns, _content_hash(data))
+
+def _content_hash(data):
+    return hashlib.sha1(data).hexdigest()
+
+class ScanCache:
+    '''
+    Persistent cache of the class definitions parsed from a project's
+    source files. Use ScanCache.for_project to load the cache of a project
+    directory from the user cache dir.
+    '''
+    def __init__(self, cache_filepath):
+        self.cache_filepath = Path(cache_filepath)
+        self.entries = dict()
+        self.load()
+
+    @classmethod
+    def for_project(cls, project_path, cache_dir=None):
+        '''
+        Return the scan cache for the project_path. Each project is stored
+        in a separate file within cache_dir, defaulting to default_cache_dir().
+        '''
+        project_key = os.path.normcase(os.path.abspath(project_path))
+        project_hash = hashlib.sha1(project_key.encode('utf8')).hexdigest()[:16]
+        cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+        return cls(cache_dir / f'scan-{project_hash}.json')
+
+    def load(self):
+        '''Load the cache file. Missing, corrupt or outdated caches are ignored.'''
+        self.entries = dict()
+        try:
+            with open(self.cache_filepath, 'r', encoding='utf8') as reader:
+                cache_data = json.load(reader)
+            if cache_data.get('version') == SCAN_CACHE_VERSION:
+                self.entries = cache_data['entries']
+        except:
+            pass
+
+    def save(self):
+        '''
+        Write the cache file. The file is replaced atomically, so a crash
+        mid-save leaves the previous cache intact. Save failures are ignored
+        since the cache can always be rebuilt.
+        '''
+        cache_data = {'version': SCAN_CACHE_VERSION, 'entries': self.entries}
+        tmp_filepath = self.cache_filepath.with_suffix('.tmp')
+        try:
+            self.cache_filepath.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_filepath, 'w', encoding='utf8') as writer:
+                json.dump(cache_data, writer)
+            os.replace(tmp_filepath, self.cache_filepath)
+        except:
+            pass
+
+    def get(self, filepath, fast_scan=False):
+        '''
+        Return the cached (classname, parent_classnames) tuples of filepath,
+        or None if the file is not cached, has changed since it was cached,
+        or was parsed with another fast_scan mode.
+        '''
+        entry = self.entries.get(os.fspath(filepath))
+        if entry is None or entry['fast_scan'] != fast_scan:
+            return None
+        try:
+            stat = os.stat(filepath)
+            if stat.st_size != entry['size'] or stat.st_mtime_ns != entry['mtime_ns']:
+                # The file was touched. Only trust the entry if the contents match.
+                if stat.st_size != entry['size'] or _content_hash(Path(filepath).read_bytes()) != entry['hash']:
+                    return None
+                entry['mtime_ns'] = stat.st_mtime_ns
+        except OSError:
+            return None
+        return [(classname, parents) for classname, parents in entry['classdefs']]
+
+    def set(self, filepath, classdefs, source_stat, fast_scan=False):
+        '''
+        Cache the (classname, parent_classnames) tuples parsed from filepath.
+        source_stat is the SourceStat of the parsed bytes, or None if the 
+        file could not be read, which drops the file from the cache.
+        '''
+        if source_stat is None:
+            self.entries.pop(os.fspath(filepath), None)
+            return
+        self.entries[os.fspath(filepath)] = {
+            'size': source_stat.size,
+            'mtime_ns': source_stat.mtime_ns,
+            'hash': source_stat.content_hash,
+            'fast_scan': fast_scan,
+            'classdefs': classdefs
+        }
+
+    def retain(self, filepaths):
+        '''Drop all cache entries except for the given filepaths.'''
+        keep = set(os.fspath(filepath) for filepath in filepaths)
+        self.entries = {key: entry for key, entry in self.entries.items() if key in keep}
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,46 @@
+from kivydesigner.classsearch import ClassNameIndex, split_humps
+from kivydesigner.inheritancetrees import InheritanceTreesBuilder
+
+CLASSNAMES = ('RecycleGridLayout', 'GridLayout', 'RecycleView', 'Label', 'ToggleButton', 'Button')
+
+def test_split_humps():
+    assert split_humps('RecycleGridLayout') == ('Recycle', 'Grid', 'Layout')
+    assert split_humps('GLWidget2') == ('G', 'L', 'Widget2')
+    assert split_humps('my_widget') == ('my_widget',)
+
+def test_substring_search():
+    '''Test that queries match case insensitive substrings of any length'''
+    index = ClassNameIndex(CLASSNAMES)
+    assert index.search('') == set(CLASSNAMES)
+    assert index.search('la') == {'RecycleGridLayout', 'GridLayout', 'Label'}
+    assert index.search('gridlay') == {'RecycleGridLayout', 'GridLayout'}
+    assert index.search('button') == {'ToggleButton', 'Button'}
+    assert index.search('xyz') == set()
+
+def test_camel_case_search():
+    '''Test that uppercase queries match camel case abbreviations'''
+    index = ClassNameIndex(CLASSNAMES)
+    assert index.search('RGL') == {'RecycleGridLayout'}
+    assert index.search('RecGLay') == {'RecycleGridLayout'}
+    assert index.search('RL') == {'RecycleGridLayout'}
+    assert index.search('TB') == {'ToggleButton'}
+    assert index.search('LR') == set()
+    # Lowercase queries are only matched as substrings
+    assert index.search('rgl') == set()
+
+def test_incremental_search():
+    '''Test that extending, shortening, and changing the query, and updating the index, give fresh matches'''
+    index = ClassNameIndex.from_tree(InheritanceTreesBuilder.kivy_widget_tree().tree)
+    expected = dict()
+    for query in ('R', 'Re', 'Rec', 'RecycleV', 'RecycleG', 'RG', 'RGL', 'G', 'grid'):
+        expected[query] = index.search(query)
+        index._last_query = None
+        assert index.search(query) == expected[query]
+    assert 'RecycleGridLayout' in expected['RGL']
+    assert expected['grid'] == {name for name in index._names if 'grid' in name.lower()}
+
+    index.search('RG')
+    index.add('RedGreenWidget')
+    assert 'RedGreenWidget' in index.search('RGW')
+    index.remove('RecycleGridLayout')
+    assert 'RecycleGridLayout' not in index.search('RGL')
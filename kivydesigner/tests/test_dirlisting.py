@@ -0,0 +1,52 @@
+import os
+import threading
+from kivydesigner.dirlisting import DirectoryLister
+from kivydesigner.tests.common import test_output_dir
+
+def _make_files(directory, num_files):
+    for idx in range(num_files):
+        with open(os.path.join(directory, f'file{idx}.py'), 'w') as f:
+            f.write('')
+
+def _list(lister, path):
+    '''List the directory in the background, and return the chunk sizes and the entries.'''
+    chunks, finished = list(), threading.Event()
+    def on_chunk(request, chunk, is_last):
+        chunks.append(chunk)
+        if is_last:
+            finished.set()
+    lister.list_directory(path, on_chunk)
+    assert finished.wait(5)
+    return [len(chunk) for chunk in chunks], [entry for chunk in chunks for entry in chunk]
+
+def test_listing_is_streamed_in_chunks(test_output_dir):
+    '''Test that the first chunk is small, and that every entry is listed once'''
+    _make_files(test_output_dir, 12)
+    os.mkdir(os.path.join(test_output_dir, 'package'))
+    lister = DirectoryLister(first_chunk_size=2, chunk_size=5)
+
+    chunk_sizes, entries = _list(lister, test_output_dir)
+    assert chunk_sizes == [2, 5, 5, 1]
+    assert sorted(entry.name for entry in entries) == sorted(os.listdir(test_output_dir))
+    assert [entry.name for entry in entries if entry.is_dir] == ['package']
+    assert entries[0].stat().st_size == 0
+
+def test_unchanged_directories_are_cached(test_output_dir):
+    '''Test that re-listing an unchanged directory reuses the entries, until the directory changes'''
+    _make_files(test_output_dir, 3)
+    lister = DirectoryLister()
+    _, entries = _list(lister, test_output_dir)
+    _, cached_entries = _list(lister, test_output_dir)
+    assert all(entry is cached for entry, cached in zip(entries, cached_entries))
+
+    os.remove(os.path.join(test_output_dir, 'file0.py'))
+    # Ensure the directory mtime changes, even on file systems with a coarse mtime resolution
+    dir_stat = os.stat(test_output_dir)
+    os.utime(test_output_dir, ns=(dir_stat.st_atime_ns, dir_stat.st_mtime_ns + 10**9))
+    _, entries = _list(lister, test_output_dir)
+    assert sorted(entry.name for entry in entries) == ['file1.py', 'file2.py']
+
+def test_missing_directory(test_output_dir):
+    '''Test that listing a missing directory ends with an empty last chunk'''
+    chunk_sizes, _ = _list(DirectoryLister(), os.path.join(test_output_dir, 'missing'))
+    assert chunk_sizes == [0]
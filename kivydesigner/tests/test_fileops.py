@@ -0,0 +1,69 @@
+import os
+from kivydesigner.fileops import FileOperationWorker
+from kivydesigner.tests.common import test_output_dir
+
+def _make_tree(directory, num_files):
+    '''Create a directory with a subdirectory, and num_files files in each.'''
+    os.makedirs(os.path.join(directory, 'subdir'))
+    for dirpath in (directory, os.path.join(directory, 'subdir')):
+        for idx in range(num_files):
+            with open(os.path.join(dirpath, f'file{idx}.py'), 'w') as f:
+                f.write(f'# {idx}')
+
+def test_delete_reports_progress(test_output_dir):
+    '''Test that a deleted directory reports each file, and that the last report is complete'''
+    build_dir = os.path.join(test_output_dir, 'build')
+    _make_tree(build_dir, 5)
+    progress = list()
+    worker = FileOperationWorker(progress_interval=0)
+    operation = worker.delete(build_dir, on_progress=lambda op: progress.append(op.num_done))
+    assert operation.wait(5)
+    assert operation.succeeded()
+    assert not os.path.exists(build_dir)
+    # 10 files and 2 directories
+    assert progress == list(range(1, 13))
+    assert operation.progress == 1
+
+def test_cancelled_copy_is_removed(test_output_dir):
+    '''Test that cancelling a copy removes the partial copy, and leaves the source'''
+    src, dst = os.path.join(test_output_dir, 'src'), os.path.join(test_output_dir, 'dst')
+    _make_tree(src, 5)
+    worker = FileOperationWorker(progress_interval=0)
+    def cancel_after_three_files(operation):
+        if operation.num_done == 3:
+            operation.cancel()
+    operation = worker.copy(src, dst, on_progress=cancel_after_three_files)
+    assert operation.wait(5)
+    assert operation.is_cancelled() and not operation.succeeded()
+    assert operation.num_done == 3
+    assert not os.path.exists(dst)
+    assert len(os.listdir(src)) == 6
+
+def test_operations_run_in_order(test_output_dir):
+    '''Test that queued operations run one at a time, in the submitted order'''
+    src = os.path.join(test_output_dir, 'src')
+    _make_tree(src, 2)
+    copy_path, moved_path = os.path.join(test_output_dir, 'copy'), os.path.join(test_output_dir, 'moved')
+    worker = FileOperationWorker()
+    operations = [worker.copy(src, copy_path), worker.move(copy_path, moved_path),
+        worker.rename(os.path.join(moved_path, 'file0.py'), os.path.join(moved_path, 'app.py'))]
+    assert operations[-1].wait(5)
+    assert all(operation.succeeded() for operation in operations)
+    assert not os.path.exists(copy_path)
+    assert sorted(os.listdir(moved_path)) == ['app.py', 'file1.py', 'subdir']
+    with open(os.path.join(moved_path, 'subdir', 'file1.py')) as f:
+        assert f.read() == '# 1'
+
+def test_failed_operations_report_the_error(test_output_dir):
+    '''Test that renaming over an existing file fails, without replacing the file'''
+    _make_tree(test_output_dir, 2)
+    file0, file1 = os.path.join(test_output_dir, 'file0.py'), os.path.join(test_output_dir, 'file1.py')
+    done = list()
+    worker = FileOperationWorker()
+    operation = worker.rename(file0, file1, on_done=done.append)
+    assert operation.wait(5)
+    assert isinstance(operation.error, FileExistsError)
+    assert done == [operation]
+    with open(file1) as f:
+        assert f.read() == '# 1'
+    assert os.path.exists(file0)
@@ -0,0 +1,116 @@
+import os
+import shutil
+import threading
+import pytest
+import kivydesigner.filewatcher as filewatcher
+from kivydesigner.filewatcher import FileWatcher, InotifyFileWatcher, PollingFileWatcher, inotify_available
+from kivydesigner.tests.common import test_output_dir
+
+WATCHER_TYPES = [
+    PollingFileWatcher,
+    pytest.param(InotifyFileWatcher, marks=pytest.mark.skipif(not inotify_available(), reason='inotify not available'))
+]
+
+class ChangeRecorder:
+    def __init__(self):
+        self.batches = []
+        self.received = threading.Event()
+
+    def __call__(self, changes):
+        self.batches.append(changes)
+        self.received.set()
+
+    def wait(self, timeout=5):
+        assert self.received.wait(timeout)
+        self.received.clear()
+        return self.batches[-1]
+
+def _start_watcher(watcher_type, root_path, recorder):
+    kwargs = {'poll_interval': 0.05} if watcher_type is PollingFileWatcher else {}
+    watcher = watcher_type(root_path, recorder, debounce=0.2, **kwargs)
+    watcher.start()
+    # Give the watcher thread time to complete its initial scan
+    threading.Event().wait(0.2)
+    return watcher
+
+@pytest.mark.parametrize('watcher_type', WATCHER_TYPES)
+def test_file_changes_are_reported(test_output_dir, watcher_type):
+    '''Test that created, modified and deleted files are reported'''
+    recorder = ChangeRecorder()
+    watcher = _start_watcher(watcher_type, test_output_dir, recorder)
+    try:
+        new_file = os.path.join(test_output_dir, 'widgets.py')
+        with open(new_file, 'w') as f:
+            f.write('class NewWidget(Widget): pass')
+        assert new_file in recorder.wait().paths
+
+        new_dir = os.path.join(test_output_dir, 'package')
+        os.mkdir(new_dir)
+        nested_file = os.path.join(new_dir, 'nested.py')
+        with open(nested_file, 'w') as f:
+            f.write('')
+        assert nested_file in recorder.wait().paths
+
+        shutil.rmtree(new_dir)
+        changes = recorder.wait()
+        assert changes.directories_changed
+        assert new_dir in changes.paths
+    finally:
+        watcher.stop()
+    assert not watcher.is_running()
+
+@pytest.mark.parametrize('watcher_type', WATCHER_TYPES)
+def test_bursts_are_coalesced(test_output_dir, watcher_type):
+    '''Test that a burst of changes is reported as a single batch, and that
+    ignored directories are not reported'''
+    recorder = ChangeRecorder()
+    watcher = _start_watcher(watcher_type, test_output_dir, recorder)
+    try:
+        os.mkdir(os.path.join(test_output_dir, '.git'))
+        burst_files = [os.path.join(test_output_dir, f'module{i}.py') for i in range(300)]
+        for filepath in burst_files:
+            with open(filepath, 'w') as f:
+                f.write('')
+            with open(os.path.join(test_output_dir, '.git', 'index'), 'w') as f:
+                f.write('')
+        changes = recorder.wait()
+        # Let any late batches arrive
+        threading.Event().wait(0.5)
+    finally:
+        watcher.stop()
+
+    assert len(recorder.batches) == 1
+    assert set(burst_files) <= changes.paths
+    assert not any('index' in path for path in changes.paths)
+
+class ScriptedFileWatcher(FileWatcher):
+    '''
+    Watcher with a fake clock. Each wait returns the next scripted 
+    (seconds, paths) step, or waits out the timeout once the script ends.
+    '''
+    def __init__(self, script, **kwargs):
+        super().__init__('.', self._on_changes, **kwargs)
+        self.script = list(script)
+        self.now = 100.0
+        self.flush_times = list()
+
+    def _on_changes(self, changes):
+        self.flush_times.append(self.now)
+        self._stopping.set()
+
+    def _wait_for_changes(self, timeout, changes):
+        if not self.script:
+            self.now += timeout
+            return False
+        seconds, paths = self.script.pop(0)
+        self.now += seconds
+        changes.paths.update(paths)
+        # Wakeups without changes, like the events of ignored directories
+        return True
+
+def test_empty_wakeups_do_not_start_the_max_delay(monkeypatch):
+    '''Test that the max_delay window starts with the first change, not the first wakeup'''
+    watcher = ScriptedFileWatcher([(0, ()), (1.9, ('a.py',))], debounce=1, max_delay=2)
+    monkeypatch.setattr(filewatcher.time, 'monotonic', lambda: watcher.now)
+    watcher._run()
+    assert watcher.flush_times == [pytest.approx(102.9)]
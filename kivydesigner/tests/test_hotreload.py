@@ -0,0 +1,229 @@
+import queue
+import threading
+import pytest
+from kivy.uix.label import Label
+from kivydesigner.hotreload import HotReloadInstructionQueue, KvStrInstruction, StopInstruction, \
+    KvDeltaInstruction, PyModuleInstruction, ProjectPathInstruction, text_delta, apply_text_delta, \
+    ResyncRequest, HotReloadApp, VisualizerPool, HOT_RELOAD_KV_FILENAME, MAX_CACHED_TREES
+
+class _ThreadContext:
+    '''
+    Context of thread queues, which deliver each instruction as soon as it
+    is put. Multiprocessing queues are flushed by a feeder thread, so the 
+    coalescing tests could not tell when every instruction arrived.
+    '''
+    Queue = queue.Queue
+    Event = threading.Event
+
+def test_stale_kv_strings_are_dropped():
+    '''Test that only the newest queued kv string is returned'''
+    reload_queue = HotReloadInstructionQueue(_ThreadContext)
+    for idx in range(5):
+        reload_queue.reload_kvstring(f'Label:\n    text: "{idx}"')
+
+    assert reload_queue.next_instruction() == KvStrInstruction('Label:\n    text: "4"', version=5)
+    assert reload_queue.empty()
+    assert reload_queue.next_instruction() is None
+
+def test_stop_takes_precedence():
+    '''Test that a pending stop instruction is returned instead of a newer kv string'''
+    reload_queue = HotReloadInstructionQueue(_ThreadContext)
+    reload_queue.reload_kvstring('Label:')
+    reload_queue.stop_reload()
+    reload_queue.reload_kvstring('Button:')
+
+    assert isinstance(reload_queue.next_instruction(), StopInstruction)
+
+def test_module_reloads_are_coalesced():
+    '''Test that queued module reloads are merged, and returned before the newest kv string'''
+    reload_queue = HotReloadInstructionQueue(_ThreadContext)
+    reload_queue.reload_kvstring('Label:')
+    reload_queue.reload_pymodules('project', ['project/a.py'])
+    reload_queue.reload_kvstring('Button:')
+    reload_queue.reload_pymodules('project', ['project/b.py', 'project/a.py'])
+
+    assert reload_queue.next_instruction() == PyModuleInstruction('project', ['project/a.py', 'project/b.py'])
+    assert not reload_queue.empty()
+    assert reload_queue.next_instruction() == KvStrInstruction('Button:', version=2)
+    assert reload_queue.empty()
+
+def test_project_path_comes_first():
+    '''Test that the newest project path is returned before the module reloads and kv string'''
+    reload_queue = HotReloadInstructionQueue(_ThreadContext)
+    reload_queue.set_project_path('old_project')
+    reload_queue.reload_kvstring('Label:')
+    reload_queue.set_project_path('project')
+    reload_queue.reload_pymodules('project', ['project/a.py'])
+
+    assert reload_queue.next_instruction() == ProjectPathInstruction('project')
+    assert reload_queue.next_instruction() == PyModuleInstruction('project', ['project/a.py'])
+    assert reload_queue.next_instruction() == KvStrInstruction('Label:', version=1)
+    assert reload_queue.empty()
+
+def test_wait_does_not_consume_instruction():
+    '''Test that wait blocks until an instruction arrives over the process queue, without consuming it'''
+    reload_queue = HotReloadInstructionQueue()
+    assert not reload_queue.wait(timeout=0.05)
+
+    reload_queue.reload_kvstring('Label:')
+    assert reload_queue.wait(timeout=5)
+    assert not reload_queue.empty()
+
+    assert reload_queue.next_instruction() == KvStrInstruction('Label:', version=1)
+    assert reload_queue.empty()
+
+def test_text_delta():
+    '''Test that text deltas only contain the edited characters, and round trip'''
+    old_text = 'Label:\n    text: "hello"\n'
+    edits = [
+        ('Label:\n    text: "hello!"\n', (23, 0, '!')),
+        ('Label:\n    text: "help"\n', (21, 2, 'p')),
+        ('Label:\n', (7, 18, '')),
+        ('', (0, len(old_text), '')),
+        (old_text + old_text, (len(old_text), 0, old_text)),
+        (old_text, (len(old_text), 0, '')),
+    ]
+    for new_text, expected_delta in edits:
+        delta = text_delta(old_text, new_text)
+        assert delta == expected_delta
+        assert apply_text_delta(old_text, *delta) == new_text
+
+def test_delta_transport():
+    '''Test that edits are sent as deltas, and resynced if the receiver diverges'''
+    reload_queue = HotReloadInstructionQueue(_ThreadContext)
+    sent_instructions = list()
+    put = reload_queue.queue.put
+    reload_queue.queue.put = lambda instruction: sent_instructions.append(instruction) or put(instruction)
+
+    document = 'BoxLayout:\n' + '    Label:\n        text: "label"\n' * 100
+    reload_queue.reload_kvstring(document)
+    for idx in range(3):
+        document = document.replace('BoxLayout:', f'BoxLayout:\n    # edit {idx}')
+        reload_queue.reload_kvstring(document)
+    assert [type(instruction) for instruction in sent_instructions] == [KvStrInstruction] + [KvDeltaInstruction] * 3
+    assert all(len(instruction.insert_text) < 20 for instruction in sent_instructions[1:])
+    assert reload_queue.next_instruction() == KvStrInstruction(document, version=4)
+
+    # Simulate a receiver that lost its document
+    reload_queue._document = None
+    document += '    Button:\n'
+    reload_queue.reload_kvstring(document)
+    assert reload_queue.next_instruction() is None
+    assert isinstance(reload_queue.next_reply(timeout=0), ResyncRequest)
+    assert reload_queue.resync()
+    assert isinstance(sent_instructions[-1], KvStrInstruction)
+    assert reload_queue.next_instruction() == KvStrInstruction(document, version=5)
+    assert not reload_queue.resync()
+    # Later edits are deltas against the resent document
+    document += '    Button:\n'
+    reload_queue.reload_kvstring(document)
+    assert isinstance(sent_instructions[-1], KvDeltaInstruction)
+    assert reload_queue.next_instruction() == KvStrInstruction(document, version=6)
+
+RULES_KV = \
+'''
+<ReloadedButton@Button>:
+    text: {text!r}
+
+BoxLayout:
+    ReloadedButton:
+'''
+
+@pytest.fixture
+def window():
+    '''
+    Create the kivy window, and draw a frame after the test, so the on_flip
+    handlers bound by the reloads fire and unbind before the next test.
+    '''
+    from kivy.base import EventLoop
+    EventLoop.ensure_window()
+    yield EventLoop.window
+    EventLoop.idle()
+
+def test_in_place_reload_replaces_rules(window):
+    '''Test that an in place reload patches property values, and rebuilds the tree on structural changes'''
+    from kivy.lang import Builder
+    app = HotReloadApp(HotReloadInstructionQueue())
+
+    app.reload_kvstring(RULES_KV.format(text='first'), version=1)
+    first_root = app.root
+    assert first_root.children[0].text == 'first'
+    assert first_root in window.children
+    assert not app.last_reload_patched
+    result = app.last_reload_result
+    assert (result.version, result.success, result.widget_count) == (1, True, 2)
+
+    # Only a property value changed, so the live tree is patched
+    app.reload_kvstring(RULES_KV.format(text='second'))
+    assert app.last_reload_patched
+    assert app.root is first_root
+    assert app.root.children[0].text == 'second'
+
+    app.reload_kvstring(RULES_KV.format(text='third') + '    Label:\n')
+    assert not app.last_reload_patched
+    assert app.root.children[1].text == 'third'
+    assert first_root not in window.children
+    assert Builder.files.count(HOT_RELOAD_KV_FILENAME) == 1
+
+    app.reload_kvstring('BoxLayout:\n    Label:\n        text: "ok"\n         Invalid Indentation', version=4)
+    assert isinstance(app.root, Label)
+    result = app.last_reload_result
+    assert (result.version, result.success, result.error_line) == (4, False, 4)
+    assert 'Invalid indentation' in result.error
+    window.remove_widget(app.root)
+    Builder.unload_file(HOT_RELOAD_KV_FILENAME)
+
+def test_undo_swaps_cached_tree(window):
+    '''Test that reloading a recently replaced document swaps its tree back in, with its rules'''
+    from kivy.factory import Factory
+    from kivy.lang import Builder
+    app = HotReloadApp(HotReloadInstructionQueue())
+
+    first_kv = RULES_KV.format(text='first')
+    app.reload_kvstring(first_kv)
+    first_root = app.root
+    app.reload_kvstring(RULES_KV.format(text='second') + '    Label:\n')
+    assert app.root is not first_root
+
+    # Comments do not change the cached document
+    app.reload_kvstring('# Undo\n' + first_kv)
+    assert not app.last_reload_patched
+    assert app.root is first_root
+    assert app.last_reload_result.success
+    assert Builder.files.count(HOT_RELOAD_KV_FILENAME) == 1
+    assert Factory.ReloadedButton().text == 'first'
+
+    # Only the most recent trees are kept
+    for idx in range(MAX_CACHED_TREES + 1):
+        app.reload_kvstring(RULES_KV.format(text='first') + '    Label:\n' * (idx + 1))
+    app.reload_kvstring(first_kv)
+    assert app.root is not first_root
+    window.remove_widget(app.root)
+    Builder.unload_file(HOT_RELOAD_KV_FILENAME)
+
+def test_pool_promotes_standby():
+    '''Test that the pool promotes a running standby, and cold starts otherwise'''
+    pool = VisualizerPool()
+    pool.start_standby()
+    standby = pool.standby
+    # The standby must keep running until it is promoted
+    standby.process.join(timeout=3)
+    assert standby.is_alive()
+    assert pool.acquire() is standby
+    assert pool.standby is None
+
+    cold_started = pool.acquire()
+    assert cold_started is not standby
+    for visualizer in (standby, cold_started):
+        visualizer.instructions.reload_kvstring('Label:')
+        # The visualizer replies with the build result, then with the
+        # completed trace once the reload is drawn
+        result = visualizer.instructions.next_reply(timeout=60)
+        assert (result.version, result.success, result.widget_count) == (1, True, 1)
+        trace = visualizer.instructions.next_reply(timeout=60)
+        assert trace.instruction_id == 1
+        assert trace.is_complete()
+        visualizer.stop(timeout=60)
+        assert not visualizer.is_alive()
+        assert visualizer.process.exitcode == 0
+    pool.shutdown()
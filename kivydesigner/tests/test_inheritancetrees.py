@@ -1,4 +1,5 @@
-from kivydesigner.inheritancetrees import InheritanceTrees, InheritanceTreesBuilder
+import ast
+from kivydesigner.inheritancetrees import InheritanceTrees, InheritanceTreesBuilder, ClassDefCollector
 from kivydesigner.tests.common import test_output_dir
 from pathlib import Path
 
@@ -8,7 +9,7 @@ def test_add_simple_class():
     assert len(tree) == 1
     cls = tree.get_class('SimpleWidget')
     assert cls.name == 'SimpleWidget'
-    assert cls.children == []
+    assert cls.children == set()
     assert cls.parents == []
     assert cls.source_path == __file__
 
@@ -80,12 +81,12 @@ def test_add_simple_class_with_parent():
     child = tree.get_class('SimpleWidgetChild')
     assert parent.name == 'SimpleWidget'
     assert parent.parents == []
-    assert parent.children == [child.name]
+    assert parent.children == {child.name}
     assert parent.source_path == ''
 
     assert child.name == 'SimpleWidgetChild'
     assert child.parents == [parent.name]
-    assert child.children == []
+    assert child.children == set()
     assert child.source_path == __file__
 
 def test_add_simple_class_with_parents_and_children():
@@ -109,15 +110,15 @@ def test_add_simple_class_with_parents_and_children():
     for top_parent in (top_parent1, top_parent2, middle_parent):
         assert top_parent.parents == []
 
-    assert top_parent1.children == [child.name]
-    assert top_parent2.children == [child.name]
-    assert middle_parent.children == [grandchild.name]
+    assert top_parent1.children == {child.name}
+    assert top_parent2.children == {child.name}
+    assert middle_parent.children == {grandchild.name}
 
     assert child.parents == [top_parent1.name, top_parent2.name]
-    assert child.children == [grandchild.name]
+    assert child.children == {grandchild.name}
 
     assert grandchild.parents == [child.name, middle_parent.name]
-    assert grandchild.children == []
+    assert grandchild.children == set()
 
 def test_generic_widgets_simple():
     '''Test that generic base classes are captured, using their example
@@ -137,6 +138,73 @@ def test_generic_widgets_simple():
     assert tree.get_subclasses('Generic[T]') == set(['GenericParent'])
     assert tree.get_subclasses('GenericParent') == set()
 
+def test_deep_and_diamond_hierarchies():
+    '''Test that subclass and superclass searches do not recurse, and visit
+    shared ancestors once'''
+    import sys
+    tree = InheritanceTrees()
+    depth = sys.getrecursionlimit() * 2
+    for i in range(depth):
+        tree.add_class(__file__, f'Level{i + 1}', [f'Level{i}'])
+    tree.add_class(__file__, 'DiamondLeft', ['Level0'])
+    tree.add_class(__file__, 'DiamondRight', ['Level0'])
+    tree.add_class(__file__, 'DiamondBottom', ['DiamondLeft', 'DiamondRight'])
+
+    assert len(tree.get_subclasses('Level0')) == depth + 3
+    assert len(tree.get_superclasses(f'Level{depth}')) == depth
+    assert tree.get_superclasses('DiamondBottom') == {'DiamondLeft', 'DiamondRight', 'Level0'}
+
+def test_cached_closures_are_invalidated():
+    '''Test that cached subclass and superclass searches are updated when
+    classes are added or removed'''
+    tree = InheritanceTrees()
+    tree.add_class('first_source', 'SimpleWidgetChild', ['SimpleWidget'])
+    assert tree.get_subclasses('SimpleWidget') == {'SimpleWidgetChild'}
+    assert tree.get_superclasses('SimpleWidgetChild') == {'SimpleWidget'}
+
+    # Modifying the returned set must not modify the cache
+    tree.get_subclasses('SimpleWidget').add('NotASubclass')
+    assert tree.get_subclasses('SimpleWidget') == {'SimpleWidgetChild'}
+
+    tree.add_class('second_source', 'SimpleWidgetGrandChild', ['SimpleWidgetChild'])
+    tree.add_class('second_source', 'SimpleWidget', ['Widget'])
+    assert tree.get_subclasses('SimpleWidget') == {'SimpleWidgetChild', 'SimpleWidgetGrandChild'}
+    assert tree.get_subclasses('Widget') == {'SimpleWidget', 'SimpleWidgetChild', 'SimpleWidgetGrandChild'}
+    assert tree.get_superclasses('SimpleWidgetGrandChild') == {'SimpleWidgetChild', 'SimpleWidget', 'Widget'}
+
+    tree.remove_source('second_source')
+    assert tree.get_subclasses('SimpleWidget') == {'SimpleWidgetChild'}
+    assert tree.get_subclasses('Widget') == set()
+    assert tree.get_superclasses('SimpleWidgetChild') == {'SimpleWidget'}
+    assert tree.get_superclasses('SimpleWidgetGrandChild') == set()
+
+    tree.remove_class('SimpleWidget')
+    assert tree.get_subclasses('SimpleWidget') == set()
+    assert tree.get_superclasses('SimpleWidgetChild') == set()
+
+def test_remove_source_index():
+    '''Test that removing a source only removes the classes defined in that source,
+    and keeps classes that are still referenced as parents'''
+    tree = InheritanceTrees()
+    tree.add_class(Path('first_source'), 'StandaloneWidget', [])
+    tree.add_class('first_source', 'SimpleWidget', ['Widget'])
+    tree.add_class('second_source', 'SimpleWidgetChild', ['SimpleWidget'])
+    tree.add_class('second_source', 'UnrelatedWidget', [])
+    assert tree.sources == {'first_source': {'StandaloneWidget', 'SimpleWidget'},
+        'second_source': {'SimpleWidgetChild', 'UnrelatedWidget'}}
+
+    # Path and str sources are interchangeable
+    tree.remove_source(Path('first_source'))
+    assert tree.get_class('StandaloneWidget') is None
+    assert tree.get_class('Widget') is None
+    assert tree.get_class('SimpleWidget').source_path == ''
+    assert tree.get_class('UnrelatedWidget').source_path == 'second_source'
+    assert 'first_source' not in tree.sources
+
+    tree.remove_source('second_source')
+    assert len(tree) == 0
+    assert tree.sources == {}
+
 SIMPLE_PY_1 = \
 '''
 from kivy import Widget
@@ -236,10 +304,62 @@ def test_removing_subclasses():
     for child in RELATIVE_LAYOUT_CHILDREN:
         assert kivy_tree.get_class(child) == None
 
+FAST_SCAN_AMBIGUOUS_PY = \
+'''
+class Outer(Widget):
+    class Nested(Label):
+        pass
+
+class GenericChild(GenericParent[T], Widget):
+    pass
+'''
+
+FAST_SCAN_STRINGS_PY = \
+"""
+'''
+class InDocstring(Widget):
+    pass
+'''
+# class InComment(Widget):
+class Real(
+    kivy.uix.widget.Widget,  
+    Mixin,
+    metaclass=WidgetMetaclass):
+    text = 'class NotAClass(Widget):'
+    '''Escaped quotes do not end the docstring \\'''
+class AlsoInDocstring(Widget):
+    '''
+"""
+
+def test_fast_scan_matches_ast():
+    '''Test that the class header scan and the full AST parse find the same 
+    classes, and that ambiguous sources are deferred to ast.parse'''
+    from kivydesigner.inheritancetrees import scan_class_headers
+    def ast_classdefs(file_source):
+        collector = ClassDefCollector()
+        collector.visit(ast.parse(file_source))
+        return collector.classdefs
+
+    for file_source in (SIMPLE_PY_1, SIMPLE_PY_2, SIMPLE_PY_1_UPDATED, FAST_SCAN_STRINGS_PY):
+        assert scan_class_headers(file_source) == ast_classdefs(file_source)
+    assert scan_class_headers(FAST_SCAN_STRINGS_PY) == [('Real', ['Widget', 'Mixin'])]
+    assert scan_class_headers('import kivy\n') == []
+    assert scan_class_headers(FAST_SCAN_AMBIGUOUS_PY) is None
+    assert scan_class_headers('class Broken(:\n') is None
+
+def test_fast_scan_keeps_classes_of_invalid_files(test_output_dir):
+    '''Test that the fast scan returns the classes of a file with a syntax error, 
+    which the full parse skips'''
+    from kivydesigner.inheritancetrees import read_class_definitions
+    filepath = Path(test_output_dir) / 'editing.py'
+    filepath.write_text('class EditedWidget(Widget):\n    def on_touch_down(self, touch:\n        pass\n')
+    assert read_class_definitions(filepath) == []
+    assert read_class_definitions(filepath, fast_scan=True) == [('EditedWidget', ['Widget'])]
+
 def test_known_kivy_widget_classes():
     '''Scan the current kivy installation and verify that our 
     hode coded list of known kivy widgets and App classes is correct.'''
-    def get_actual_kivy_widget_tree():
+    def get_actual_kivy_widget_tree(fast_scan=False):
         import kivy
         kivy_root_dir = kivy.__path__[0]
         dirs_to_exclude = (
@@ -251,7 +371,8 @@ def test_known_kivy_widget_classes():
         )
         builder = InheritanceTreesBuilder()
         builder.build_from_directory(kivy.__path__[0], 
-            lambda filepath: not any(filepath.is_relative_to(parent) for parent in dirs_to_exclude)) 
+            lambda filepath: not any(filepath.is_relative_to(parent) for parent in dirs_to_exclude),
+            fast_scan=fast_scan) 
         return builder.tree
 
     # actual_tree generated by scanning the current kivy installation
@@ -267,6 +388,9 @@ def test_known_kivy_widget_classes():
     assert actual_widgets == expected_widgets
     assert actual_apps == expected_apps
 
+    # The class header scan must produce an identical tree
+    assert get_actual_kivy_widget_tree(fast_scan=True).nodes == actual_tree.nodes
+
 def test_parsing_module_scoped_types():
     '''Test that parsing module-scoped types works correctly'''
     MODULE_SCOPED_CLASS_PY_1 = \
@@ -339,4 +463,28 @@ def test_source_file_update(test_output_dir):
 
     assert tree.get_subclasses('NewRootWidget') == {'SimpleWidget', 'SimpleWidgetChild', 'UnrelatedSimpleWidgetChild'}
     assert tree.get_class('Widget') is None
-    
\ No newline at end of file
+    
+def test_parallel_directory_build(test_output_dir):
+    '''Test that the parallel directory build produces the same tree as the serial build'''
+    import os
+    from kivydesigner.inheritancetrees import PARALLEL_BUILD_MIN_FILES
+    nested_dir = os.path.join(test_output_dir, 'nested')
+    os.mkdir(nested_dir)
+    for i in range(PARALLEL_BUILD_MIN_FILES):
+        parent_dir = nested_dir if i % 2 else test_output_dir
+        with open(os.path.join(parent_dir, f'module{i}.py'), 'w') as f:
+            f.write(f'class Widget{i}(Widget):\n    pass\n'
+                    f'class Child{i}(Widget{i}, module.Mixin):\n    pass\n')
+    with open(os.path.join(test_output_dir, 'invalid.py'), 'w') as f:
+        f.write('class Broken(:\n')
+
+    accept_all = lambda filepath: True
+    serial_builder = InheritanceTreesBuilder()
+    serial_builder.build_from_directory(test_output_dir, accept_all)
+    parallel_builder = InheritanceTreesBuilder()
+    parallel_builder.build_from_directory(test_output_dir, accept_all, parallel=True, max_workers=2)
+
+    serial_tree, parallel_tree = serial_builder.tree, parallel_builder.tree
+    assert len(serial_tree) == 2 * PARALLEL_BUILD_MIN_FILES + 2
+    assert serial_tree.nodes == parallel_tree.nodes
+    assert parallel_tree.get_subclasses('Mixin') == {f'Child{i}' for i in range(PARALLEL_BUILD_MIN_FILES)}
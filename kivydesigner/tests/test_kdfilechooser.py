@@ -0,0 +1,274 @@
+import errno
+import os
+import threading
+import time
+from kivy.clock import Clock
+from kivydesigner.uix.kdfilechooser import KDFilechooser
+from kivydesigner.tests.common import test_output_dir
+
+def _wait_for_listing(filechooser, timeout=10):
+    '''Tick the clock until the filechooser finished listing its directories.'''
+    end_time = time.perf_counter() + timeout
+    # The first update may only move the path to the rootpath
+    Clock.tick()
+    Clock.tick()
+    while filechooser.listing and time.perf_counter() < end_time:
+        Clock.tick()
+    assert not filechooser.listing
+
+def _wait_for_file_operations(filechooser, timeout=10):
+    end_time = time.perf_counter() + timeout
+    while filechooser.file_operations_running and time.perf_counter() < end_time:
+        Clock.tick()
+    assert not filechooser.file_operations_running
+
+def _node_names(nodes):
+    return [node.text for node in nodes]
+
+def test_entries_are_streamed_in_sorted_order(test_output_dir, monkeypatch):
+    '''Test that the listed chunks are added over several frames, with the directories first'''
+    for idx in range(30):
+        with open(os.path.join(test_output_dir, f'file{idx:02}.py'), 'w') as f:
+            f.write('')
+    for dirname in ('b_package', 'a_package'):
+        os.mkdir(os.path.join(test_output_dir, dirname))
+    monkeypatch.setattr(KDFilechooser, 'listing_frame_budget', 0)
+    monkeypatch.setattr(KDFilechooser, 'listing_refresh_interval', 0)
+
+    filechooser = KDFilechooser(rootpath=test_output_dir)
+    treeview = filechooser.layout.ids.treeview
+    num_entries = list()
+    end_time = time.perf_counter() + 10
+    Clock.tick()
+    Clock.tick()
+    while filechooser.listing and time.perf_counter() < end_time:
+        Clock.tick()
+        num_entries.append(len(treeview.root.nodes))
+    # The entries appear progressively, rather than all at once
+    assert len(set(num_entries)) > 2
+    expected_names = ['a_package', 'b_package'] + [f'file{idx:02}.py' for idx in range(30)]
+    assert _node_names(treeview.root.nodes) == expected_names
+
+def test_expand_directory(test_output_dir):
+    '''Test that expanding a directory lists its entries, and that collapsing it removes them'''
+    package_dir = os.path.join(test_output_dir, 'package')
+    os.mkdir(package_dir)
+    for filename in ('widgets.py', 'app.py'):
+        with open(os.path.join(package_dir, filename), 'w') as f:
+            f.write('')
+    filechooser = KDFilechooser(rootpath=test_output_dir)
+    _wait_for_listing(filechooser)
+    treeview = filechooser.layout.ids.treeview
+    package_node = treeview.root.nodes[0]
+
+    treeview.toggle_node(package_node)
+    _wait_for_listing(filechooser)
+    assert _node_names(package_node.nodes) == ['app.py', 'widgets.py']
+
+    treeview.toggle_node(package_node)
+    assert package_node.nodes == []
+
+def test_refresh_only_changes_the_modified_entries(test_output_dir):
+    '''Test that refreshing keeps the existing nodes, with their open and selected state'''
+    package_dir = os.path.join(test_output_dir, 'package')
+    os.mkdir(package_dir)
+    for filepath in ('readme.md', 'setup.py', 'package/app.py', 'package/widgets.py'):
+        with open(os.path.join(test_output_dir, filepath), 'w') as f:
+            f.write('')
+    filechooser = KDFilechooser(rootpath=test_output_dir)
+    _wait_for_listing(filechooser)
+    treeview = filechooser.layout.ids.treeview
+    package_node, readme_node, setup_node = treeview.root.nodes
+    treeview.toggle_node(package_node)
+    _wait_for_listing(filechooser)
+    app_node = package_node.nodes[0]
+    treeview.select_node(app_node)
+
+    os.remove(os.path.join(test_output_dir, 'setup.py'))
+    for filepath in ('package/main.py', 'license.txt'):
+        with open(os.path.join(test_output_dir, filepath), 'w') as f:
+            f.write('')
+    filechooser.refresh_entries()
+    _wait_for_listing(filechooser)
+
+    assert _node_names(treeview.root.nodes) == ['package', 'license.txt', 'readme.md']
+    assert _node_names(package_node.nodes) == ['app.py', 'main.py', 'widgets.py']
+    assert treeview.root.nodes[0] is package_node and treeview.root.nodes[2] is readme_node
+    assert package_node.is_open
+    assert package_node.nodes[0] is app_node and treeview.selected_node is app_node
+    assert setup_node.parent_node is None
+
+def test_get_node_by_path(test_output_dir):
+    '''Test that the path index follows the added, renamed and removed nodes'''
+    package_dir = os.path.join(test_output_dir, 'package')
+    os.mkdir(package_dir)
+    for filepath in ('package/app.py', 'package/widgets.py'):
+        with open(os.path.join(test_output_dir, filepath), 'w') as f:
+            f.write('')
+    filechooser = KDFilechooser(rootpath=test_output_dir)
+    _wait_for_listing(filechooser)
+    treeview = filechooser.layout.ids.treeview
+    package_node = treeview.get_node(package_dir)
+    assert package_node is treeview.root.nodes[0]
+    treeview.toggle_node(package_node)
+    _wait_for_listing(filechooser)
+    app_path = os.path.join(package_dir, 'app.py')
+    app_node = treeview.get_node(app_path)
+    assert app_node is package_node.nodes[0]
+
+    filechooser.selection = [app_path]
+    assert filechooser.layout.get_selected_node() is app_node
+
+    main_path = os.path.join(package_dir, 'main.py')
+    app_node.path = main_path
+    assert treeview.get_node(app_path) is None
+    assert treeview.get_node(main_path) is app_node
+
+    treeview.remove_node(app_node)
+    assert treeview.get_node(main_path) is None
+    assert not package_node.is_leaf
+
+    # Collapsing the directory removes its entries
+    widgets_path = os.path.join(package_dir, 'widgets.py')
+    assert treeview.get_node(widgets_path) is not None
+    treeview.toggle_node(package_node)
+    assert treeview.get_node(widgets_path) is None
+    assert treeview.get_node(package_dir) is package_node
+
+def test_delete_entry_in_the_background(test_output_dir, monkeypatch):
+    '''Test that deleted entries are removed immediately, and restored if the deletion fails'''
+    package_dir = os.path.join(test_output_dir, 'package')
+    os.mkdir(package_dir)
+    for filepath in ('setup.py', 'package/app.py'):
+        with open(os.path.join(test_output_dir, filepath), 'w') as f:
+            f.write('')
+    filechooser = KDFilechooser(rootpath=test_output_dir)
+    _wait_for_listing(filechooser)
+    treeview = filechooser.layout.ids.treeview
+    package_node, setup_node = treeview.root.nodes
+
+    filechooser.delete_entry(setup_node)
+    assert _node_names(treeview.root.nodes) == ['package']
+    _wait_for_file_operations(filechooser)
+    assert not os.path.exists(os.path.join(test_output_dir, 'setup.py'))
+
+    def fail_remove(path):
+        raise PermissionError(errno.EACCES, os.strerror(errno.EACCES), path)
+    monkeypatch.setattr(os, 'remove', fail_remove)
+    filechooser.delete_entry(package_node)
+    assert treeview.root.nodes == []
+    _wait_for_file_operations(filechooser)
+    _wait_for_listing(filechooser)
+    assert _node_names(treeview.root.nodes) == ['package']
+    assert os.path.exists(os.path.join(package_dir, 'app.py'))
+
+def test_failed_rename_is_rolled_back(test_output_dir):
+    '''Test that entries are renamed immediately, and renamed back if the rename fails'''
+    for filename in ('app.py', 'main.py'):
+        with open(os.path.join(test_output_dir, filename), 'w') as f:
+            f.write('')
+    filechooser = KDFilechooser(rootpath=test_output_dir)
+    _wait_for_listing(filechooser)
+    app_node = filechooser.layout.ids.treeview.root.nodes[0]
+    app_path = os.path.join(test_output_dir, 'app.py')
+    filechooser.selection = [app_path]
+
+    filechooser.rename_entry(app_node, 'main.py')
+    # The name of a listed sibling is ignored
+    assert app_node.text == 'app.py'
+    os.mkdir(os.path.join(test_output_dir, 'unlisted'))
+    filechooser.rename_entry(app_node, 'unlisted')
+    assert app_node.text == 'unlisted'
+    _wait_for_file_operations(filechooser)
+    assert (app_node.text, app_node.path) == ('app.py', app_path)
+    assert filechooser.selection == [app_path]
+
+    filechooser.rename_entry(app_node, 'zapp.py')
+    _wait_for_file_operations(filechooser)
+    assert app_node.path == os.path.join(test_output_dir, 'zapp.py')
+    assert os.path.exists(app_node.path) and not os.path.exists(app_path)
+
+def test_refresh_after_new_file(test_output_dir):
+    '''Test that the entries added by new_file are not added again by a refresh'''
+    package_dir = os.path.join(test_output_dir, 'package')
+    os.mkdir(package_dir)
+    with open(os.path.join(test_output_dir, 'a.py'), 'w') as f:
+        f.write('')
+    filechooser = KDFilechooser(rootpath=test_output_dir)
+    _wait_for_listing(filechooser)
+    layout = filechooser.layout
+    treeview = layout.ids.treeview
+    package_node = treeview.root.nodes[0]
+
+    layout.new_file()
+    assert _node_names(treeview.root.nodes) == ['package', 'a.py', 'new_file']
+    treeview.toggle_node(package_node)
+    _wait_for_listing(filechooser)
+    filechooser.selection = [package_dir]
+    layout.new_file()
+    assert _node_names(package_node.nodes) == ['new_file']
+
+    filechooser.reconcile_entries()
+    _wait_for_listing(filechooser)
+    assert _node_names(treeview.root.nodes) == ['package', 'a.py', 'new_file']
+    assert _node_names(package_node.nodes) == ['new_file']
+
+def test_rename_expanded_directory(test_output_dir):
+    '''Test that renaming an open directory moves the paths of its descendants'''
+    os.makedirs(os.path.join(test_output_dir, 'package', 'widgets'))
+    for filepath in ('package/app.py', 'package/widgets/button.py'):
+        with open(os.path.join(test_output_dir, filepath), 'w') as f:
+            f.write('')
+    filechooser = KDFilechooser(rootpath=test_output_dir)
+    _wait_for_listing(filechooser)
+    treeview = filechooser.layout.ids.treeview
+    package_node = treeview.root.nodes[0]
+    treeview.toggle_node(package_node)
+    _wait_for_listing(filechooser)
+    widgets_node, app_node = package_node.nodes
+    treeview.toggle_node(widgets_node)
+    _wait_for_listing(filechooser)
+    button_node = widgets_node.nodes[0]
+    filechooser.selection = [button_node.path]
+
+    filechooser.rename_entry(package_node, 'lib')
+    lib_dir = os.path.join(test_output_dir, 'lib')
+    button_path = os.path.join(lib_dir, 'widgets', 'button.py')
+    assert button_node.path == button_path
+    assert treeview.get_node(button_path) is button_node
+    assert treeview.get_node(os.path.join(lib_dir, 'app.py')) is app_node
+    assert treeview.get_node(os.path.join(test_output_dir, 'package', 'app.py')) is None
+    assert filechooser.selection == [button_path]
+
+    _wait_for_file_operations(filechooser)
+    filechooser.reconcile_entries()
+    _wait_for_listing(filechooser)
+    assert os.path.exists(button_path)
+    assert package_node.nodes == [widgets_node, app_node]
+    assert widgets_node.nodes == [button_node]
+
+def test_refresh_skips_pending_operations(test_output_dir, monkeypatch):
+    '''Test that a refresh during a deletion does not restore the deleted entry'''
+    for filename in ('app.py', 'setup.py'):
+        with open(os.path.join(test_output_dir, filename), 'w') as f:
+            f.write('')
+    filechooser = KDFilechooser(rootpath=test_output_dir)
+    _wait_for_listing(filechooser)
+    treeview = filechooser.layout.ids.treeview
+    release_remove = threading.Event()
+    remove = os.remove
+    def blocked_remove(path):
+        release_remove.wait(10)
+        remove(path)
+    monkeypatch.setattr(os, 'remove', blocked_remove)
+
+    filechooser.delete_entry(treeview.root.nodes[1])
+    filechooser.reconcile_entries()
+    _wait_for_listing(filechooser)
+    assert _node_names(treeview.root.nodes) == ['app.py']
+
+    release_remove.set()
+    _wait_for_file_operations(filechooser)
+    filechooser.reconcile_entries()
+    _wait_for_listing(filechooser)
+    assert _node_names(treeview.root.nodes) == ['app.py']
@@ -0,0 +1,57 @@
+from kivy.app import App
+from kivy.clock import Clock
+from kivydesigner.hotreload import ReloadResult
+from kivydesigner.uix.kivyvisualizer import KivyVisualizer
+
+class _ReloadRecorder:
+    def __init__(self):
+        self.kv_strs = list()
+
+    def hot_reload(self, kv_str):
+        self.kv_strs.append(kv_str)
+
+def test_hot_reload_is_debounced(monkeypatch):
+    '''Test that a burst of edits sends a single hot reload with the latest text'''
+    recorder = _ReloadRecorder()
+    monkeypatch.setattr(App, 'get_running_app', lambda: recorder)
+    visualizer = KivyVisualizer(reload_delay=0.5)
+    # Scheduled events are timed from the last clock tick
+    Clock.tick()
+
+    for text in ('L', 'La', 'Lab', 'Label:'):
+        visualizer.editor.text = text
+        Clock.tick()
+    assert recorder.kv_strs == []
+
+    # End the quiet period, instead of waiting for it
+    visualizer.reload_delay = 0
+    Clock.tick()
+    assert recorder.kv_strs == ['Label:']
+
+    visualizer.editor.text = 'Button:'
+    visualizer.flush_reload()
+    assert recorder.kv_strs == ['Label:', 'Button:']
+    Clock.tick()
+    assert recorder.kv_strs == ['Label:', 'Button:']
+
+def test_reload_errors_are_shown(monkeypatch):
+    '''Test that a failed reload shows its error below the editor, until a reload succeeds'''
+    monkeypatch.setattr(App, 'get_running_app', lambda: _ReloadRecorder())
+    visualizer = KivyVisualizer()
+    error = 'Parser: File "<inline>", line 2:\n...\n>>    2:    Invalid\n...\nInvalid indentation'
+    visualizer.show_reload_result(ReloadResult(1, False, error, error_line=2))
+    assert visualizer.reload_error == 'Line 2: Invalid indentation'
+    assert visualizer.error_label.height > 0
+
+    visualizer.show_reload_result(ReloadResult(2, True))
+    assert visualizer.reload_error == ''
+    assert visualizer.error_label.height == 0
+
+def test_reload_latency_is_shown(monkeypatch):
+    '''Test that the reload latency and its percentiles are shown below the editor'''
+    monkeypatch.setattr(App, 'get_running_app', lambda: _ReloadRecorder())
+    visualizer = KivyVisualizer()
+    assert visualizer.latency_label.height == 0
+    visualizer.show_reload_latency(0.0123, 0.010, 0.0456)
+    assert visualizer.latency_label.text == 'Reloaded in 12 ms (p50 10 ms, p99 46 ms)'
+    assert visualizer.latency_label.height > 0
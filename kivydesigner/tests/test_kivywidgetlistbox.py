@@ -0,0 +1,174 @@
+import os
+import time
+from kivy.clock import Clock
+from kivydesigner.tests.common import test_output_dir
+from kivydesigner.filewatcher import FileChanges
+import kivydesigner.uix.kivywidgetlistbox as kivywidgetlistbox
+from kivydesigner.uix.kivywidgetlistbox import KivyWidgetListBox
+
+WIDGETS_PY = \
+'''
+class ProjectWidget(Widget):
+    pass
+
+class ProjectApp(App):
+    pass
+'''
+
+WIDGETS_PY_UPDATED = \
+'''
+class ProjectWidget(Widget):
+    pass
+
+class AnotherProjectWidget(ProjectWidget):
+    pass
+'''
+
+OTHER_PY = \
+'''
+class OtherWidget(Label):
+    pass
+'''
+
+def _create_listbox(project_dir, monkeypatch):
+    # Keep the user scan cache out of the test
+    monkeypatch.setenv('XDG_CACHE_HOME', os.path.join(project_dir, '.cache'))
+    monkeypatch.setenv('LOCALAPPDATA', os.path.join(project_dir, '.cache'))
+    listbox = KivyWidgetListBox()
+    listbox.project_path = project_dir
+    _wait_for_scan(listbox)
+    return listbox
+
+def _wait_for_scan(listbox, timeout=10):
+    '''Tick the clock until the listbox finished its background scan.'''
+    end_time = time.perf_counter() + timeout
+    while listbox.scanning and time.perf_counter() < end_time:
+        Clock.tick()
+    assert not listbox.scanning
+
+def test_refresh_source_file(test_output_dir, monkeypatch):
+    '''Test that refreshing a single source file only patches the user defined groups'''
+    widgets_path = os.path.join(test_output_dir, 'widgets.py')
+    with open(widgets_path, 'w') as f:
+        f.write(WIDGETS_PY)
+    listbox = _create_listbox(test_output_dir, monkeypatch)
+    assert listbox.get_group_items('USER DEFINED WIDGETS') == ['ProjectWidget']
+    assert listbox.get_group_items('USER DEFINED APPS') == ['ProjectApp']
+
+    unchanged_entry = listbox._groups['USER DEFINED WIDGETS'][1]['ProjectWidget']
+    standard_widgets = list(listbox._groups['STANDARD KIVY WIDGETS'][1].values())
+
+    with open(widgets_path, 'w') as f:
+        f.write(WIDGETS_PY_UPDATED)
+    listbox.refresh_source_file(widgets_path)
+    other_path = os.path.join(test_output_dir, 'other.py')
+    with open(other_path, 'w') as f:
+        f.write(OTHER_PY)
+    listbox.refresh_source_file(other_path)
+
+    assert listbox.get_group_items('USER DEFINED WIDGETS') == ['AnotherProjectWidget', 'OtherWidget', 'ProjectWidget']
+    assert listbox.get_group_items('USER DEFINED APPS') == []
+    # Untouched entries are reused
+    assert listbox._groups['USER DEFINED WIDGETS'][1]['ProjectWidget'] is unchanged_entry
+    assert list(listbox._groups['STANDARD KIVY WIDGETS'][1].values()) == standard_widgets
+
+    os.remove(other_path)
+    listbox.refresh_source_file(other_path)
+    assert listbox.get_group_items('USER DEFINED WIDGETS') == ['AnotherProjectWidget', 'ProjectWidget']
+
+def test_refresh_ignores_files_outside_project(test_output_dir, monkeypatch):
+    '''Test that files outside of the project search path are not added'''
+    listbox = _create_listbox(test_output_dir, monkeypatch)
+    cache_dir = os.path.join(test_output_dir, '__pycache__')
+    os.mkdir(cache_dir)
+    for filepath in (os.path.join(cache_dir, 'other.py'), os.path.join(test_output_dir, 'other.txt')):
+        with open(filepath, 'w') as f:
+            f.write(OTHER_PY)
+        listbox.refresh_source_file(filepath)
+    assert listbox.get_group_items('USER DEFINED WIDGETS') == []
+
+def test_project_classes_do_not_leak(test_output_dir, monkeypatch):
+    '''Test that changing the project path removes the previous project's classes'''
+    with open(os.path.join(test_output_dir, 'widgets.py'), 'w') as f:
+        f.write(WIDGETS_PY)
+    listbox = _create_listbox(test_output_dir, monkeypatch)
+    empty_dir = os.path.join(test_output_dir, 'empty')
+    os.mkdir(empty_dir)
+    listbox.project_path = empty_dir
+    _wait_for_scan(listbox)
+
+    assert listbox.get_group_items('USER DEFINED WIDGETS') == []
+    assert KivyWidgetListBox.kivy_inheritance_tree.get_class('ProjectWidget') is None
+
+def test_scan_populates_progressively(test_output_dir, monkeypatch):
+    '''Test that the background scan merges the classes in batches, and matches a blocking scan'''
+    for idx in range(5):
+        with open(os.path.join(test_output_dir, f'widgets{idx}.py'), 'w') as f:
+            f.write(f'class ScannedWidget{idx}(Widget):\n    pass\n')
+    monkeypatch.setattr(KivyWidgetListBox, 'scan_batch_size', 1)
+    monkeypatch.setattr(KivyWidgetListBox, 'scan_refresh_interval', 0)
+    # Slow the scan down, so each file is merged on a separate frame
+    iter_classdefs = kivywidgetlistbox.iter_directory_class_definitions
+    def slow_iter_classdefs(*args, **kwargs):
+        for scanned_file in iter_classdefs(*args, **kwargs):
+            time.sleep(0.1)
+            yield scanned_file
+    monkeypatch.setattr(kivywidgetlistbox, 'iter_directory_class_definitions', slow_iter_classdefs)
+    merged_sizes = list()
+    update_group = KivyWidgetListBox.update_group
+    def recording_update_group(self, group_name, items):
+        if group_name == 'USER DEFINED WIDGETS':
+            merged_sizes.append(len(items))
+        update_group(self, group_name, items)
+    monkeypatch.setattr(KivyWidgetListBox, 'update_group', recording_update_group)
+
+    listbox = _create_listbox(test_output_dir, monkeypatch)
+    assert merged_sizes == [1, 2, 3, 4, 5]
+    scanned_widgets = listbox.get_group_items('USER DEFINED WIDGETS')
+    listbox.update_user_defined_widgets()
+    assert listbox.get_group_items('USER DEFINED WIDGETS') == scanned_widgets
+
+def test_scan_is_cancelled_by_new_project(test_output_dir, monkeypatch):
+    '''Test that changing the project path mid scan drops the classes of the previous scan'''
+    first_dir, second_dir = os.path.join(test_output_dir, 'first'), os.path.join(test_output_dir, 'second')
+    for project_dir, classname in ((first_dir, 'FirstWidget'), (second_dir, 'SecondWidget')):
+        os.mkdir(project_dir)
+        with open(os.path.join(project_dir, 'widgets.py'), 'w') as f:
+            f.write(f'class {classname}(Widget):\n    pass\n')
+    monkeypatch.setenv('XDG_CACHE_HOME', os.path.join(test_output_dir, '.cache'))
+    listbox = KivyWidgetListBox()
+    listbox.project_path = first_dir
+    assert listbox.scanning
+    listbox.project_path = second_dir
+    # Let the cancelled scan finish queueing its batches
+    time.sleep(0.2)
+    _wait_for_scan(listbox)
+    assert listbox.get_group_items('USER DEFINED WIDGETS') == ['SecondWidget']
+
+def test_refresh_during_scan_is_deferred(test_output_dir, monkeypatch):
+    '''Test that files refreshed mid scan are refreshed once the scan finishes, without duplicates'''
+    widgets_path = os.path.join(test_output_dir, 'widgets.py')
+    with open(widgets_path, 'w') as f:
+        f.write(WIDGETS_PY)
+    listbox = _create_listbox(test_output_dir, monkeypatch)
+    listbox.scan_user_defined_widgets()
+    assert listbox.scanning
+
+    with open(widgets_path, 'w') as f:
+        f.write(WIDGETS_PY_UPDATED)
+    listbox.refresh_source_file(widgets_path)
+    assert listbox.get_group_items('USER DEFINED WIDGETS') == []
+    _wait_for_scan(listbox)
+    assert listbox.get_group_items('USER DEFINED WIDGETS') == ['AnotherProjectWidget', 'ProjectWidget']
+    assert listbox.get_group_items('USER DEFINED APPS') == []
+
+def test_directory_changes_scan_in_background(test_output_dir, monkeypatch):
+    '''Test that moved directories rescan the project without blocking the kivy thread'''
+    listbox = _create_listbox(test_output_dir, monkeypatch)
+    os.mkdir(os.path.join(test_output_dir, 'package'))
+    with open(os.path.join(test_output_dir, 'package', 'other.py'), 'w') as f:
+        f.write(OTHER_PY)
+    listbox.apply_file_changes(FileChanges({os.path.join(test_output_dir, 'package')}, directories_changed=True))
+    assert listbox.scanning
+    _wait_for_scan(listbox)
+    assert listbox.get_group_items('USER DEFINED WIDGETS') == ['OtherWidget']
@@ -0,0 +1,114 @@
+import pytest
+from kivy.factory import Factory
+from kivy.lang import Builder
+from kivy.lang.parser import Parser
+from kivy.metrics import dp
+from kivydesigner.kvdiff import KvPatchError, diff_kv, apply_property_updates, update_builder_rules, \
+    normalize_kv, kv_digest
+
+KV_FILENAME = 'test_kvdiff.kv'
+
+BASE_KV = \
+'''
+<DiffButton@Button>:
+    font_size: {rule_font_size}
+
+<Label>:
+    bold: {label_bold}
+
+BoxLayout:
+    padding: {padding}
+    Label:
+        id: title
+        text: {title}
+    BoxLayout:
+        DiffButton:
+            text: 'ok'
+        DiffButton:
+            font_size: 30
+'''
+
+BASE_VALUES = {'rule_font_size': 12, 'label_bold': False, 'padding': 'dp(4)', 'title': "'Title'"}
+
+def _parse(**values):
+    return Parser(content=BASE_KV.format(**{**BASE_VALUES, **values}), filename=KV_FILENAME)
+
+@pytest.fixture
+def kv_root():
+    '''Build the base kv document, and unload its rules after the test.'''
+    root = Builder.load_string(BASE_KV.format(**BASE_VALUES), filename=KV_FILENAME)
+    yield root
+    Builder.unload_file(KV_FILENAME)
+
+def test_diff_property_values():
+    '''Test that changed constant values are reported with their rule or widget path'''
+    old_parser = _parse()
+    assert diff_kv(old_parser, _parse()) == []
+
+    updates = diff_kv(old_parser, _parse(rule_font_size=20, title="'New Title'", padding='dp(8)'))
+    assert [(update.prop.name, update.rule_index, update.widget_path) for update in updates] == \
+        [('font_size', 0, ()), ('padding', None, ()), ('text', None, (0,))]
+
+def test_structural_changes_are_not_diffed():
+    '''Test that structure changes, and changes to bound values, require a rebuild'''
+    old_parser = _parse()
+    structural_changes = [
+        # Bound values are set up by the Builder
+        {'title': 'self.width'},
+        {'padding': 'self.width / 10'},
+    ]
+    for values in structural_changes:
+        assert diff_kv(old_parser, _parse(**values)) is None
+
+    base_kv = BASE_KV.format(**BASE_VALUES)
+    structural_kvs = [
+        base_kv + '    Button:\n',
+        base_kv.replace('id: title', 'id: heading'),
+        base_kv.replace("text: 'ok'", "text: 'ok'\n            on_press: print('pressed')"),
+        base_kv.replace('<Label>:', '<Label>:\n    canvas:\n        Color:\n            rgba: 1, 0, 0, 1'),
+        base_kv.replace('<Label>:', '<Label,Button>:'),
+        '#:set spacing 10\n' + base_kv,
+    ]
+    for kv_str in structural_kvs:
+        assert diff_kv(old_parser, Parser(content=kv_str, filename=KV_FILENAME)) is None
+
+def test_apply_property_updates(kv_root):
+    '''Test that updates are applied to the live widgets, respecting rule precedence'''
+    parser = _parse(rule_font_size=20, label_bold=True, padding='dp(8)', title="'New Title'")
+    updates = diff_kv(_parse(), parser)
+    apply_property_updates(kv_root, parser, updates)
+    update_builder_rules(KV_FILENAME, parser, updates)
+
+    inner_layout = kv_root.children[0]
+    plain_button, sized_button = reversed(inner_layout.children)
+    assert kv_root.ids.title.text == 'New Title'
+    assert kv_root.ids.title.bold
+    assert kv_root.padding == [dp(8)] * 4
+    assert plain_button.font_size == 20
+    # The instance rule takes precedence over the class rule
+    assert sized_button.font_size == 30
+    # Widgets created after the patch use the updated class rule
+    assert Factory.DiffButton().font_size == 20
+
+def test_apply_to_mismatched_tree(kv_root):
+    '''Test that a live tree that does not match the document raises a KvPatchError'''
+    kv_root.remove_widget(kv_root.ids.title)
+    parser = _parse(title="'New Title'")
+    with pytest.raises(KvPatchError):
+        apply_property_updates(kv_root, parser, diff_kv(_parse(), parser))
+
+def test_kv_digest_ignores_comments_and_whitespace():
+    '''Test that documents differing only by comments and whitespace have the same digest'''
+    base_kv = BASE_KV.format(**BASE_VALUES)
+    commented_kv = '# Header comment\n' + base_kv.replace('<Label>:', '<Label>:   \n    # bold labels\n\n')
+    assert normalize_kv(commented_kv) == normalize_kv(base_kv)
+    assert kv_digest(commented_kv) == kv_digest(base_kv)
+
+    changed_kvs = [
+        '#:set spacing 10\n' + base_kv,
+        base_kv.replace("text: 'ok'", "text: 'ok!'"),
+        # Indentation is part of the document structure
+        base_kv.replace('        DiffButton:\n            font_size', '    DiffButton:\n        font_size'),
+    ]
+    for kv_str in changed_kvs:
+        assert kv_digest(kv_str) != kv_digest(base_kv)
@@ -0,0 +1,108 @@
+import os
+import sys
+import importlib
+import pytest
+from kivy.factory import Factory
+from kivydesigner import inheritancetrees
+from kivydesigner.inheritancetrees import InheritanceTreesBuilder, is_project_source
+from kivydesigner.pyreload import ModuleReloader
+from kivydesigner.scancache import ScanCache
+from kivydesigner.tests.common import test_output_dir
+
+BASE_PY = \
+'''
+from kivy.uix.widget import Widget
+from kivy.factory import Factory
+
+class ReloadBase(Widget):
+    greeting = '{greeting}'
+
+Factory.register('ReloadBase', cls=ReloadBase)
+'''
+
+CHILD_PY = \
+'''
+from kivy.factory import Factory
+from reload_base import ReloadBase
+
+class ReloadChild(ReloadBase):
+    pass
+
+Factory.register('ReloadChild', cls=ReloadChild)
+'''
+
+UNRELATED_PY = \
+'''
+class ReloadUnrelated:
+    pass
+'''
+
+PROJECT_MODULES = ('reload_base', 'reload_child', 'reload_unrelated')
+
+def _write(project_dir, module_name, source):
+    filepath = os.path.join(project_dir, f'{module_name}.py')
+    with open(filepath, 'w') as f:
+        f.write(source)
+    return filepath
+
+def _scan_cache(project_dir):
+    return ScanCache(os.path.join(project_dir, '.scan-cache.json'))
+
+@pytest.fixture
+def project_dir(test_output_dir):
+    '''Import a small project, and forget its modules and classes after the test.'''
+    _write(test_output_dir, 'reload_base', BASE_PY.format(greeting='hello'))
+    _write(test_output_dir, 'reload_child', CHILD_PY)
+    _write(test_output_dir, 'reload_unrelated', UNRELATED_PY)
+    sys.path.insert(0, test_output_dir)
+    importlib.invalidate_caches()
+    for module_name in PROJECT_MODULES:
+        importlib.import_module(module_name)
+    yield test_output_dir
+    Factory.unregister('ReloadBase', 'ReloadChild')
+    for module_name in PROJECT_MODULES:
+        sys.modules.pop(module_name, None)
+    while test_output_dir in sys.path:
+        sys.path.remove(test_output_dir)
+
+def test_reload_subclasses_after_base(project_dir):
+    '''Test that a changed module is reloaded before the modules subclassing its classes'''
+    reloader = ModuleReloader(project_dir, _scan_cache(project_dir))
+    unrelated_module = sys.modules['reload_unrelated']
+    changed_file = _write(project_dir, 'reload_base', BASE_PY.format(greeting='hello again'))
+
+    assert reloader.reload_files([changed_file]) == ['reload_base', 'reload_child']
+    assert sys.modules['reload_unrelated'] is unrelated_module
+    assert Factory.ReloadBase.greeting == 'hello again'
+    assert issubclass(Factory.ReloadChild, Factory.ReloadBase)
+    assert Factory.ReloadChild().greeting == 'hello again'
+
+def test_failed_reload_keeps_previous_classes(project_dir):
+    '''Test that a module with a syntax error keeps its previously registered classes'''
+    reloader = ModuleReloader(project_dir, _scan_cache(project_dir))
+    previous_class = Factory.ReloadBase
+    changed_file = _write(project_dir, 'reload_base', BASE_PY.format(greeting='hello') + 'class:\n')
+
+    assert reloader.reload_files([changed_file]) == ['reload_child']
+    assert Factory.ReloadBase is previous_class
+
+def test_project_is_scanned_on_first_change(project_dir, monkeypatch):
+    '''Test that the reloader only builds its tree once a file changes, from the scan cache'''
+    scan_cache = _scan_cache(project_dir)
+    InheritanceTreesBuilder().build_from_directory(project_dir, is_project_source, 
+        scan_cache=scan_cache, fast_scan=True)
+    reloader = ModuleReloader(project_dir, scan_cache)
+    assert reloader.reload_files([]) == []
+    assert reloader._tree_builder is None
+
+    parsed_files = list()
+    for read_function in ('read_class_definitions', 'read_source_file'):
+        def record_read(filepath, fast_scan=False, read_file=getattr(inheritancetrees, read_function)):
+            parsed_files.append(os.path.basename(filepath))
+            return read_file(filepath, fast_scan)
+        monkeypatch.setattr(inheritancetrees, read_function, record_read)
+    changed_file = _write(project_dir, 'reload_base', BASE_PY.format(greeting='hello again!'))
+
+    assert reloader.reload_files([changed_file]) == ['reload_base', 'reload_child']
+    # Only the changed file is parsed, the other files are loaded from the cache
+    assert set(parsed_files) == {'reload_base.py'}
@@ -0,0 +1,138 @@
+import os
+import time
+from kivy.clock import Clock
+from kivydesigner.uix.recyclefilechooser import RecycleFilechooser, ExplorerRow
+from kivydesigner.tests.common import test_output_dir
+
+def _wait_for_listing(explorer, timeout=10):
+    '''Tick the clock until the explorer finished listing its directories.'''
+    end_time = time.perf_counter() + timeout
+    Clock.tick()
+    while explorer.listing and time.perf_counter() < end_time:
+        Clock.tick()
+    assert not explorer.listing
+    # Let the RecycleView create the views of the new data
+    Clock.tick()
+
+def _wait_for_file_operations(explorer, timeout=10):
+    end_time = time.perf_counter() + timeout
+    while explorer.file_operations_running and time.perf_counter() < end_time:
+        Clock.tick()
+    assert not explorer.file_operations_running
+
+def _visible_rows(explorer):
+    return [('  ' * row['depth']) + row['text'] for row in explorer.recycleview.data]
+
+def _create_files(root_dir, filepaths):
+    for filepath in filepaths:
+        filepath = os.path.join(root_dir, filepath)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, 'w') as f:
+            f.write('')
+
+def test_rows_of_open_directories_are_flattened(test_output_dir):
+    '''Test that the rows are sorted directories first, and indented by their depth'''
+    _create_files(test_output_dir, ('setup.py', 'package/widgets.py', 'package/app.py', '.hidden'))
+    explorer = RecycleFilechooser(rootpath=test_output_dir)
+    _wait_for_listing(explorer)
+    assert _visible_rows(explorer) == ['package', 'setup.py']
+
+    package_row = explorer.get_row(os.path.join(test_output_dir, 'package'))
+    explorer.toggle_row(package_row)
+    _wait_for_listing(explorer)
+    assert _visible_rows(explorer) == ['package', '  app.py', '  widgets.py', 'setup.py']
+
+    explorer.toggle_row(package_row)
+    assert _visible_rows(explorer) == ['package', 'setup.py']
+
+def test_only_visible_rows_are_instantiated(test_output_dir):
+    '''Test that a large directory only creates the widgets of the visible rows'''
+    _create_files(test_output_dir, (f'module{idx:04}.py' for idx in range(2000)))
+    explorer = RecycleFilechooser(rootpath=test_output_dir, size=(300, 400), size_hint=(None, None))
+    _wait_for_listing(explorer)
+    assert len(explorer.recycleview.data) == 2000
+    rows = explorer.recycleview.layout_manager.children
+    assert 0 < len(rows) < 100
+    assert all(isinstance(row, ExplorerRow) for row in rows)
+
+def test_rename_with_the_shared_editor(test_output_dir):
+    '''Test that edit mode moves the single editor into the edited row, and renames the file'''
+    _create_files(test_output_dir, ('app.py', 'main.py'))
+    explorer = RecycleFilechooser(rootpath=test_output_dir, size=(300, 400), size_hint=(None, None))
+    _wait_for_listing(explorer)
+    app_row = explorer.get_row(os.path.join(test_output_dir, 'app.py'))
+    explorer.select_row(app_row)
+    explorer.enable_edit_mode()
+    Clock.tick()
+    assert explorer.editor.parent.path == app_row['path']
+    assert explorer.editor.text == 'app.py'
+
+    explorer.editor.text = 'zapp.py'
+    explorer.editor.dispatch('on_text_validate')
+    explorer.disable_edit_mode()
+    _wait_for_file_operations(explorer)
+    Clock.tick()
+    new_path = os.path.join(test_output_dir, 'zapp.py')
+    assert os.path.exists(new_path)
+    assert explorer.selection == [new_path]
+    assert explorer.get_row(new_path) is app_row
+    assert _visible_rows(explorer) == ['main.py', 'zapp.py']
+    assert explorer.editor.parent is None
+
+def test_refresh_keeps_the_row_state(test_output_dir):
+    '''Test that refreshing only adds and removes the changed rows'''
+    _create_files(test_output_dir, ('setup.py', 'package/app.py'))
+    explorer = RecycleFilechooser(rootpath=test_output_dir)
+    _wait_for_listing(explorer)
+    package_row = explorer.get_row(os.path.join(test_output_dir, 'package'))
+    explorer.toggle_row(package_row)
+    _wait_for_listing(explorer)
+    app_row = explorer.get_row(os.path.join(test_output_dir, 'package', 'app.py'))
+    explorer.select_row(app_row)
+
+    os.remove(os.path.join(test_output_dir, 'setup.py'))
+    _create_files(test_output_dir, ('package/main.py', 'readme.md'))
+    explorer.refresh_entries()
+    _wait_for_listing(explorer)
+    assert _visible_rows(explorer) == ['package', '  app.py', '  main.py', 'readme.md']
+    assert explorer.get_row(os.path.join(test_output_dir, 'package', 'app.py')) is app_row
+    assert app_row['is_selected'] and package_row['is_open']
+
+def test_failed_delete_is_rolled_back(test_output_dir, monkeypatch):
+    '''Test that deleted rows are removed immediately, and restored if the deletion fails'''
+    _create_files(test_output_dir, ('setup.py', 'package/app.py'))
+    explorer = RecycleFilechooser(rootpath=test_output_dir)
+    _wait_for_listing(explorer)
+
+    def fail_rmdir(path):
+        raise OSError(f'Can not remove {path}')
+    monkeypatch.setattr(os, 'rmdir', fail_rmdir)
+    explorer.delete_row(explorer.get_row(os.path.join(test_output_dir, 'package')))
+    assert _visible_rows(explorer) == ['setup.py']
+    _wait_for_file_operations(explorer)
+    _wait_for_listing(explorer)
+    # The package directory is still there, without its deleted file
+    assert _visible_rows(explorer) == ['package', 'setup.py']
+    assert os.listdir(os.path.join(test_output_dir, 'package')) == []
+
+def test_rename_onto_a_sibling_is_ignored(test_output_dir):
+    '''Test that renaming a row to the name of a sibling leaves both rows in place'''
+    _create_files(test_output_dir, ('app.py', 'main.py'))
+    explorer = RecycleFilechooser(rootpath=test_output_dir, size=(300, 400), size_hint=(None, None))
+    _wait_for_listing(explorer)
+    app_path, main_path = (os.path.join(test_output_dir, name) for name in ('app.py', 'main.py'))
+    app_row, main_row = explorer.get_row(app_path), explorer.get_row(main_path)
+    explorer.select_row(app_row)
+    explorer.enable_edit_mode()
+    Clock.tick()
+
+    explorer.editor.text = 'main.py'
+    explorer.editor.dispatch('on_text_validate')
+    explorer.disable_edit_mode()
+    _wait_for_file_operations(explorer)
+    Clock.tick()
+    assert not explorer.file_operations_running
+    assert explorer.get_row(app_path) is app_row
+    assert explorer.get_row(main_path) is main_row
+    assert _visible_rows(explorer) == ['app.py', 'main.py']
+    assert explorer.editor.parent is None
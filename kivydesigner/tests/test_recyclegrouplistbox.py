@@ -0,0 +1,69 @@
+from kivy.clock import Clock
+from kivydesigner.uix.recyclegrouplistbox import RecycleGroupListBox
+
+def _visible_texts(listbox):
+    return [row['text'] for row in listbox.recycleview.data]
+
+def test_groups_are_flattened():
+    '''Test that the groups and the entries of open groups are flattened into the data'''
+    listbox = RecycleGroupListBox()
+    listbox.add_group('APPS', ['MyApp'])
+    listbox.add_group('WIDGETS', ['Label', 'Button'])
+    assert _visible_texts(listbox) == ['APPS', 'MyApp', 'WIDGETS', 'Button', 'Label']
+
+    unchanged_row = listbox._groups['WIDGETS'][1]['Label']
+    listbox.update_group('WIDGETS', ['Slider', 'Label', 'Image'])
+    assert listbox.get_group_items('WIDGETS') == ['Image', 'Label', 'Slider']
+    assert listbox._groups['WIDGETS'][1]['Label'] is unchanged_row
+
+    listbox.toggle_group('APPS')
+    assert _visible_texts(listbox) == ['APPS', 'WIDGETS', 'Image', 'Label', 'Slider']
+    # Collapsed groups keep their entries
+    assert listbox.get_group_items('APPS') == ['MyApp']
+    listbox.toggle_group('APPS')
+    assert _visible_texts(listbox) == ['APPS', 'MyApp', 'WIDGETS', 'Image', 'Label', 'Slider']
+
+    listbox.clear()
+    assert listbox.recycleview.data == []
+    assert listbox.get_group_items('WIDGETS') == []
+
+def test_only_visible_rows_are_instantiated():
+    '''Test that the recycleview only creates widgets for the visible rows'''
+    listbox = RecycleGroupListBox(size=(200, 300), size_hint=(None, None))
+    listbox.add_group('WIDGETS', [f'Widget{idx}' for idx in range(10000)])
+    Clock.tick()
+    Clock.tick()
+    rows = listbox.recycleview.layout_manager.children
+    assert 0 < len(rows) < 50
+    assert all(row.text for row in rows)
+
+def test_select_row():
+    '''Test that selecting an entry unselects the previous entry, and selecting a group toggles it'''
+    listbox = RecycleGroupListBox()
+    listbox.add_group('WIDGETS', ['Button', 'Label'])
+    listbox.select_row(1)
+    assert listbox.selected_item == 'Button'
+    listbox.select_row(2)
+    assert listbox.selected_item == 'Label'
+    assert not listbox._groups['WIDGETS'][1]['Button']['is_selected']
+
+    listbox.select_row(0)
+    assert _visible_texts(listbox) == ['WIDGETS']
+    # The selection is kept, but the group has the focus
+    assert listbox.selected_item == 'Label'
+    assert not listbox._groups['WIDGETS'][1]['Label']['is_focused']
+
+def test_filter_text():
+    '''Test that the filter text only shows the matching entries, and the groups'''
+    listbox = RecycleGroupListBox()
+    listbox.add_group('APPS', ['MyApp'])
+    listbox.add_group('WIDGETS', ['RecycleGridLayout', 'GridLayout', 'Label'])
+    listbox.filter_text = 'RGL'
+    assert _visible_texts(listbox) == ['APPS', 'WIDGETS', 'RecycleGridLayout']
+    listbox.filter_text = 'grid'
+    assert _visible_texts(listbox) == ['APPS', 'WIDGETS', 'GridLayout', 'RecycleGridLayout']
+
+    listbox.update_group('WIDGETS', ['RecycleGridLayout', 'Label', 'GridView'])
+    assert _visible_texts(listbox) == ['APPS', 'WIDGETS', 'GridView', 'RecycleGridLayout']
+    listbox.filter_text = ''
+    assert _visible_texts(listbox) == ['APPS', 'MyApp', 'WIDGETS', 'GridView', 'Label', 'RecycleGridLayout']
@@ -0,0 +1,53 @@
+import os
+import json
+from kivydesigner.reloadtrace import ReloadTrace, ReloadStats, percentile, STAGES, INTERVALS
+from kivydesigner.tests.common import test_output_dir
+
+def _trace(instruction_id, start, stage_durations):
+    '''Return a complete trace starting at start, with the given seconds between stages.'''
+    trace = ReloadTrace(instruction_id)
+    stamp = round(start * 1e9)
+    for stage, duration in zip(STAGES, (0,) + stage_durations):
+        stamp += round(duration * 1e9)
+        trace.stamps[stage] = stamp
+    return trace
+
+def test_percentile():
+    '''Test the nearest-rank percentile'''
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([3], 99) == 3
+    assert percentile([], 50) is None
+
+def test_rolling_stats():
+    '''Test that only the most recent complete traces are included in the stats'''
+    stats = ReloadStats(max_traces=10)
+    for idx in range(20):
+        stats.add(_trace(idx, idx, (0.001, 0.001, idx * 0.01, 0.001)))
+    incomplete_trace = ReloadTrace(20)
+    incomplete_trace.stamp('enqueue')
+    stats.add(incomplete_trace)
+
+    assert [trace.instruction_id for trace in stats.traces] == list(range(10, 20))
+    assert abs(stats.p50 - (0.003 + 0.14)) < 1e-9
+    assert abs(stats.p99 - (0.003 + 0.19)) < 1e-9
+    summary = stats.summary()
+    assert set(summary) == {name for name, _, _ in INTERVALS} | {'total'}
+    assert abs(summary['build'][1] - 0.19) < 1e-9
+
+def test_write_chrome_trace(test_output_dir):
+    '''Test that each trace is exported as a reload span, and a span per interval'''
+    stats = ReloadStats()
+    stats.add(_trace(1, 2.0, (0.001, 0.002, 0.003, 0.004)))
+    trace_path = os.path.join(test_output_dir, 'reload_trace.json')
+    stats.write_chrome_trace(trace_path)
+
+    with open(trace_path) as f:
+        events = json.load(f)['traceEvents']
+    assert [event['name'] for event in events] == ['reload 1', 'queued', 'scheduled', 'build', 'draw']
+    assert all(event['ph'] == 'X' for event in events)
+    assert events[0]['ts'] == events[1]['ts'] == 2.0 * 1e6
+    assert abs(events[0]['dur'] - 10000) < 1e-3
+    assert abs(events[3]['dur'] - 3000) < 1e-3
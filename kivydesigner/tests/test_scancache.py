@@ -0,0 +1,127 @@
+import os
+import kivydesigner.inheritancetrees as inheritancetrees
+from kivydesigner.inheritancetrees import InheritanceTreesBuilder
+from kivydesigner.scancache import ScanCache
+from kivydesigner.tests.common import test_output_dir
+
+WIDGET_PY = \
+'''
+class CachedWidget(Widget):
+    pass
+
+class CachedWidgetChild(CachedWidget):
+    pass
+'''
+
+WIDGET_PY_UPDATED = \
+'''
+class CachedWidget(Layout):
+    pass
+'''
+
+def _setup_project(root_dir):
+    project_dir = os.path.join(root_dir, 'project')
+    cache_dir = os.path.join(root_dir, 'cache')
+    os.mkdir(project_dir)
+    with open(os.path.join(project_dir, 'widgets.py'), 'w') as f:
+        f.write(WIDGET_PY)
+    return project_dir, cache_dir
+
+def _scan(project_dir, cache_dir, fast_scan=False):
+    builder = InheritanceTreesBuilder()
+    builder.build_from_directory(project_dir, lambda filepath: True,
+        scan_cache=ScanCache.for_project(project_dir, cache_dir), fast_scan=fast_scan)
+    return builder.tree
+
+def _count_parsed_files(monkeypatch):
+    parsed_files = []
+    read_source_file = inheritancetrees.read_source_file
+    def counting_read(filepath, **kwargs):
+        parsed_files.append(filepath)
+        return read_source_file(filepath, **kwargs)
+    monkeypatch.setattr(inheritancetrees, 'read_source_file', counting_read)
+    return parsed_files
+
+def test_warm_scan_skips_parsing(test_output_dir, monkeypatch):
+    '''Test that a warm scan loads unchanged files from the cache'''
+    project_dir, cache_dir = _setup_project(test_output_dir)
+    parsed_files = _count_parsed_files(monkeypatch)
+
+    cold_tree = _scan(project_dir, cache_dir)
+    assert len(parsed_files) == 1
+    assert len(ScanCache.for_project(project_dir, cache_dir)) == 1
+
+    warm_tree = _scan(project_dir, cache_dir)
+    assert len(parsed_files) == 1
+    assert warm_tree.nodes == cold_tree.nodes
+    assert warm_tree.get_subclasses('Widget') == {'CachedWidget', 'CachedWidgetChild'}
+
+def test_touched_file_is_not_reparsed(test_output_dir, monkeypatch):
+    '''Test that a file with a new mtime, but identical contents, is loaded from the cache'''
+    project_dir, cache_dir = _setup_project(test_output_dir)
+    parsed_files = _count_parsed_files(monkeypatch)
+    _scan(project_dir, cache_dir)
+
+    widget_path = os.path.join(project_dir, 'widgets.py')
+    stat = os.stat(widget_path)
+    os.utime(widget_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    tree = _scan(project_dir, cache_dir)
+    assert len(parsed_files) == 1
+    assert tree.get_subclasses('Widget') == {'CachedWidget', 'CachedWidgetChild'}
+
+def test_modified_file_is_reparsed(test_output_dir, monkeypatch):
+    '''Test that modified files are re-parsed, and deleted files are dropped from the cache'''
+    project_dir, cache_dir = _setup_project(test_output_dir)
+    parsed_files = _count_parsed_files(monkeypatch)
+    _scan(project_dir, cache_dir)
+
+    widget_path = os.path.join(project_dir, 'widgets.py')
+    with open(widget_path, 'w') as f:
+        f.write(WIDGET_PY_UPDATED)
+    tree = _scan(project_dir, cache_dir)
+    assert len(parsed_files) == 2
+    assert tree.get_subclasses('Layout') == {'CachedWidget'}
+    assert tree.get_class('CachedWidgetChild') is None
+
+    os.remove(widget_path)
+    _scan(project_dir, cache_dir)
+    assert len(ScanCache.for_project(project_dir, cache_dir)) == 0
+
+def test_file_modified_after_parsing_is_reparsed(test_output_dir, monkeypatch):
+    '''Test that the cached stat is the stat of the parsed contents, not of the current file'''
+    project_dir, cache_dir = _setup_project(test_output_dir)
+    widget_path = os.path.join(project_dir, 'widgets.py')
+    read_source_file = inheritancetrees.read_source_file
+    def read_then_modify(filepath, **kwargs):
+        result = read_source_file(filepath, **kwargs)
+        with open(widget_path, 'w') as f:
+            f.write(WIDGET_PY_UPDATED)
+        return result
+    monkeypatch.setattr(inheritancetrees, 'read_source_file', read_then_modify)
+    assert _scan(project_dir, cache_dir).get_class('CachedWidgetChild') is not None
+
+    monkeypatch.undo()
+    tree = _scan(project_dir, cache_dir)
+    assert tree.get_subclasses('Layout') == {'CachedWidget'}
+    assert tree.get_class('CachedWidgetChild') is None
+
+def test_scan_modes_are_cached_separately(test_output_dir, monkeypatch):
+    '''Test that classes found by a fast scan are not reused by a full parse'''
+    project_dir, cache_dir = _setup_project(test_output_dir)
+    parsed_files = _count_parsed_files(monkeypatch)
+    _scan(project_dir, cache_dir, fast_scan=True)
+    _scan(project_dir, cache_dir, fast_scan=True)
+    assert len(parsed_files) == 1
+
+    _scan(project_dir, cache_dir)
+    assert len(parsed_files) == 2
+
+def test_corrupt_cache_is_ignored(test_output_dir):
+    '''Test that an unreadable cache file is treated as an empty cache'''
+    project_dir, cache_dir = _setup_project(test_output_dir)
+    _scan(project_dir, cache_dir)
+    cache = ScanCache.for_project(project_dir, cache_dir)
+    cache.cache_filepath.write_text('{not json')
+
+    assert len(ScanCache.for_project(project_dir, cache_dir)) == 0
+    assert _scan(project_dir, cache_dir).get_subclasses('Widget') == {'CachedWidget', 'CachedWidgetChild'}
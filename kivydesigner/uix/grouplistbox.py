@@ -1,3 +1,4 @@
+import bisect
 from pathlib import Path
 
 from kivy.clock import Clock
@@ -42,12 +43,51 @@ class GroupListBox(BoxLayout):
     layout = ObjectProperty(None)
     title = StringProperty("")
 
+    def __init__(self, **kwargs):
+        self._groups = dict()
+        '''Map of group name to a (ListBoxGroup, {item: ListBoxEntry}) tuple.'''
+        super().__init__(**kwargs)
+
     def add_group(self, group_name, items):
         group = self.treeview.add_node(ListBoxGroup(text=group_name, is_open=True))
+        entries = dict()
         for item in sorted(items):
-            self.treeview.add_node(ListBoxEntry(text=item), group)
+            entries[item] = self.treeview.add_node(ListBoxEntry(text=item), group)
+        self._groups[group_name] = (group, entries)
+
+    def update_group(self, group_name, items):
+        '''
+        Update the group to contain exactly the given items. Only the entries
+        that were added or removed are changed, and the group stays sorted. 
+        Add the group if it does not exist.
+        '''
+        if group_name not in self._groups:
+            self.add_group(group_name, items)
+            return
+
+        group, entries = self._groups[group_name]
+        items = set(items)
+        for item in entries.keys() - items:
+            self.treeview.remove_node(entries.pop(item))
+        sorted_texts = [node.text for node in group.nodes]
+        for item in sorted(items - entries.keys()):
+            entry = self.treeview.add_node(ListBoxEntry(text=item), group)
+            # add_node appends the entry. Move it to its sorted position.
+            group.nodes.pop()
+            idx = bisect.bisect(sorted_texts, item)
+            sorted_texts.insert(idx, item)
+            group.nodes.insert(idx, entry)
+            entries[item] = entry
+
+    def get_group_items(self, group_name):
+        '''Return the sorted list of items within the group.'''
+        if group_name not in self._groups:
+            return []
+        group, _ = self._groups[group_name]
+        return [node.text for node in group.nodes]
 
     def clear(self):
         all_nodes = tuple(self.treeview.iterate_all_nodes())
         for node in all_nodes:
-            self.treeview.remove_node(node)
\ No newline at end of file
+            self.treeview.remove_node(node)
+        self._groups.clear()
\ No newline at end of file
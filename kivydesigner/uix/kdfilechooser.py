@@ -1,23 +1,28 @@
 from pathlib import Path 
+from collections import deque
+import bisect
 import os
 import os.path 
-import shutil
+import time
 from functools import partial
+from weakref import ref
 
 from kivy.lang import Builder
-from kivy.clock import Clock
-from kivy.uix.filechooser import FileChooserController, FileChooserLayout
+from kivy.clock import Clock, mainthread
+from kivy.uix.filechooser import FileChooserController, FileChooserLayout, filesize_units
 from kivy.uix.treeview import TreeView, TreeViewNode
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
 from kivy.uix.textinput import TextInput
 from kivy.uix.behaviors import FocusBehavior
 from kivy.core.text import DEFAULT_FONT
-from kivy.properties import BooleanProperty, StringProperty, ListProperty
+from kivy.properties import BooleanProperty, StringProperty, ListProperty, NumericProperty, ObjectProperty
 from plyer import filechooser
 
 from kivydesigner.uix.resources import get_png_resource
 from kivydesigner.uix.modalmsg import ModalMsg
+from kivydesigner.dirlisting import DirectoryLister
+from kivydesigner.fileops import FileOperationWorker, DELETE, RENAME, COPY, MOVE
 
 '''
 The file chooser has the following structure. Defined in py and kvlang.
@@ -31,12 +36,15 @@ KDFilechooser:
 
 The KDFileChooser is responsible generating and filtering the available files. Files
 are searched for each time a directory is opened, so it handles node expansions. 
+Entries are deleted and renamed in the background by a FileOperationWorker, see 
+fileops.py. The entries are updated immediately, and rolled back if the operation fails.
 
 The KDFileChooserLayout species the layout of the file entries. This implementation 
 has a header with icon buttons and a treeview used to view the directory structure. 
 
 The KDFileTreeView is a stylized TreeView that is capable of directing focus to the 
-selected node, if the node is in edit mode. 
+selected node, if the node is in edit mode. Nodes are inserted in sorted order, 
+directories first, since the entries of a directory arrive in chunks. 
 
 The KDFileChooserEntries node are capable of displaying files and directores. Both node
 types support two modes - read only mode and edit mode. While in edit mode the user can 
@@ -46,8 +54,104 @@ rename the file or directory. Users can cancel edits by pressing escape.
 kv_filepath = Path(__file__).with_suffix('.kv')
 Builder.load_file(str(kv_filepath), rulesonly=True)
 
+def get_entry_icon_path(is_dir, is_open, icon_height, filepath):
+    '''
+    Return the icon of an explorer entry. Directories have tree icons
+    and files have filetype logos if they are suppored by the kivydesign app.
+    '''
+    if is_dir:
+        suffix = 'opened' if is_open else 'closed'
+        return f'atlas://data/images/defaulttheme/tree_{suffix}'
+    else:
+        ext = Path(filepath).suffix
+        if ext == '.py':
+            icon_name = 'python-icon'
+        elif ext == '.kv':
+            icon_name = 'kivy-icon'
+        else:
+            icon_name = 'default-file'
+        return get_png_resource(icon_name, icon_height)
+
+def _node_sort_key(node):
+    # The ../ entry comes first, then the directories, then the files.
+    # Matches the order of the default sort_func, alphanumeric_folders_first
+    return (not node.text.endswith('..' + os.path.sep), node.is_leaf, node.path)
+
 class KDFileTreeView(FocusBehavior, TreeView):
 
+    controller = ObjectProperty(None)
+    '''The KDFilechooser, which runs the file operations of the nodes.'''
+
+    def __init__(self, **kwargs):
+        self._nodes_by_path = dict()
+        '''Map of path to the KDFilechooserEntry of every node in the tree.'''
+        self._indexed_paths = dict()
+        '''Map of each indexed node to its key in _nodes_by_path, to follow renames.'''
+        super().__init__(**kwargs)
+
+    def get_node(self, path):
+        '''Return the node of the path, or None if the path is not in the tree.'''
+        return self._nodes_by_path.get(path)
+
+    def add_node(self, node, parent=None):
+        node = super().add_node(node, parent)
+        if isinstance(node, KDFilechooserEntry):
+            self._nodes_by_path[node.path] = node
+            self._indexed_paths[node] = node.path
+            node.fbind('path', self._on_node_path)
+        return node
+
+    def remove_node(self, node):
+        parent = node.parent_node
+        is_leaf = parent.is_leaf if parent is not None else None
+        super().remove_node(node)
+        # TreeView makes the parent a leaf once its last node is removed,
+        # but an empty directory is still a directory.
+        if isinstance(parent, KDFilechooserEntry):
+            parent.is_leaf = is_leaf
+        self._unindex_nodes([node])
+
+    def remove_child_nodes(self, node=None):
+        '''Remove every descendant of the node, or of the root node.'''
+        if node is None or node is self.root:
+            node = self.root
+            for indexed_node in self._indexed_paths:
+                indexed_node.funbind('path', self._on_node_path)
+            self._nodes_by_path.clear()
+            self._indexed_paths.clear()
+        else:
+            self._unindex_nodes(node.nodes)
+        node.nodes = []
+        self._trigger_layout()
+
+    def _unindex_nodes(self, nodes):
+        nodes = list(nodes)
+        while nodes:
+            node = nodes.pop()
+            path = self._indexed_paths.pop(node, None)
+            if path is None:
+                continue
+            node.funbind('path', self._on_node_path)
+            if self._nodes_by_path.get(path) is node:
+                del self._nodes_by_path[path]
+            nodes.extend(node.nodes)
+
+    def _on_node_path(self, node, path):
+        old_path = self._indexed_paths[node]
+        if self._nodes_by_path.get(old_path) is node:
+            del self._nodes_by_path[old_path]
+        self._nodes_by_path[path] = node
+        self._indexed_paths[node] = path
+
+    def add_sorted_node(self, node, parent=None):
+        '''Add the node at its sorted position among its siblings.'''
+        node = self.add_node(node, parent)
+        siblings = node.parent_node.nodes
+        # add_node appends the node. Move it to its sorted position.
+        siblings.pop()
+        siblings.insert(bisect.bisect(siblings, _node_sort_key(node), key=_node_sort_key), node)
+        return node
+
     def on_touch_down(self, touch):
         '''
         Get focus on valid touches. Nodes are selected and toggled
@@ -103,18 +207,12 @@ class KDFileTreeView(FocusBehavior, TreeView):
     def delete_file_node(self, node):
         '''
         Delete node from the treeview, and remove the corresponding 
-        file/directory from the file system. Ask the user before proceeding
-        with the deletion. 
+        file/directory from the file system in the background. Ask the user
+        before proceeding with the deletion. 
         '''
         def _delete_internal(node_to_delete, do_remove):
-            if not do_remove:
-                return
-            filepath = node_to_delete.path
-            if os.path.isdir(filepath):
-                shutil.rmtree(filepath)
-            else:
-                os.remove(filepath)
-            self.remove_node(node_to_delete)
+            if do_remove:
+                self.controller.delete_entry(node_to_delete)
 
         dir_msg = '' if node.is_leaf else " and its contents"
         msg_to_user = f'Are you sure you want to delete {node.text}{dir_msg}?'
@@ -152,6 +250,8 @@ class KDFilechooserEntry(BoxLayout, TreeViewNode):
 
     locked = BooleanProperty(False)
     '''Locked entries cannot be opened, and are treated as leaf nodes'''
+    controller = ObjectProperty(None)
+    '''The KDFilechooser, which runs the file operations of the entry.'''
     path = StringProperty('')
     '''Full path to the file or directory represented by the current node'''
     entries = ListProperty([])
@@ -248,16 +348,9 @@ class KDFilechooserEntry(BoxLayout, TreeViewNode):
         Fired when the TextInput is exited without cancelling the change
         (i.e. without pressing 'escape')
         '''
-        original_directory = os.path.dirname(self.path) 
-        new_path = os.path.join(original_directory, edit_field.text)
-        try:
-            os.rename(self.path, new_path)
-            self.path = new_path 
-            self.text = edit_field.text
-        except:
-            # Allow the rename to silently fail. 
-            # In the future we might display the error as a popup label
-            pass 
+        # Allow the rename to silently fail. The controller renames the entry back.
+        # In the future we might display the error as a popup label
+        self.controller.rename_entry(self, edit_field.text)
 
     def on_focus(self, edit_field, is_focused):
         '''
@@ -267,27 +360,427 @@ class KDFilechooserEntry(BoxLayout, TreeViewNode):
         self._set_text_viewer(is_focused)
     
     def get_entry_icon_path(self, is_dir, is_open, icon_height, filepath):
+        return get_entry_icon_path(is_dir, is_open, icon_height, filepath)
+
+_FILE_OPERATION_VERBS = {DELETE: 'Deleting', RENAME: 'Renaming', COPY: 'Copying', MOVE: 'Moving'}
+
+class FileOperationsBehavior(object):
+    '''
+    Runs the file operations of an explorer on a FileOperationWorker, and
+    tracks their progress for the FileOperationBar. Explorers update their
+    entries before submitting an operation, and roll the entries back in
+    the on_done callback if the operation failed or was cancelled.
+    '''
+    file_operations_running = BooleanProperty(False)
+    file_operation_text = StringProperty('')
+    '''Description of the reported file operation.'''
+    file_operation_progress = NumericProperty(0)
+    '''Progress of the reported file operation, from 0 to 1.'''
+
+    def __init__(self, **kwargs):
+        self.file_operations = FileOperationWorker()
+        self._running_file_operations = list()
+        super().__init__(**kwargs)
+
+    def start_file_operation(self, kind, src, dst=None, on_done=None):
+        '''
+        Submit the file operation, and return its FileOperation. on_done is
+        called on the main thread with the operation, once it is done.
+        '''
+        operation = self.file_operations.submit(kind, src, dst,
+            on_progress=self._on_file_operation_progress,
+            on_done=partial(self._on_file_operation_done, on_done))
+        self._running_file_operations.append(operation)
+        self._show_file_operation(operation)
+        return operation
+
+    def cancel_file_operations(self):
+        '''Cancel the running and queued file operations.'''
+        self.file_operations.cancel_all()
+
+    def is_file_operation_pending(self, path):
         '''
-        Set the images within the entry. Directories have error icons 
-        and files have filetype logos if they are suppored by the kivydesign app.
+        Return True if a running or queued file operation reads or writes the
+        path, or one of its parent directories. Refreshes must leave these 
+        entries alone, since the explorer already shows their expected state.
         '''
-        if is_dir:
-            suffix = 'opened' if is_open else 'closed'
-            return f'atlas://data/images/defaulttheme/tree_{suffix}'
+        path = os.path.abspath(path)
+        for operation in self._running_file_operations:
+            for operation_path in (operation.src, operation.dst):
+                if operation_path is not None and (path == operation_path 
+                        or path.startswith(operation_path + os.sep)):
+                    return True
+        return False
+
+    def _show_file_operation(self, operation):
+        self.file_operations_running = True
+        self.file_operation_text = f'{_FILE_OPERATION_VERBS[operation.kind]} {os.path.basename(operation.src)}'
+        self.file_operation_progress = operation.progress
+
+    @mainthread
+    def _on_file_operation_progress(self, operation):
+        # Progress may be reported after the operation is done
+        if operation in self._running_file_operations:
+            self._show_file_operation(operation)
+
+    @mainthread
+    def _on_file_operation_done(self, on_done, operation):
+        self._running_file_operations.remove(operation)
+        if on_done is not None:
+            on_done(operation)
+        if self._running_file_operations:
+            self._show_file_operation(self._running_file_operations[0])
         else:
-            ext = Path(filepath).suffix
-            if ext == '.py':
-                icon_name = 'python-icon'
-            elif ext == '.kv':
-                icon_name = 'kivy-icon'
-            else:
-                icon_name = 'default-file'
-            return get_png_resource(icon_name, icon_height)
+            self.file_operations_running = False
+            self.file_operation_text = ''
+            self.file_operation_progress = 0
 
-class KDFilechooser(FileChooserController):
+class KDFilechooser(FileOperationsBehavior, FileChooserController):
     _ENTRY_TEMPLATE = 'KDFilechooserEntryTemplate'
     '''_ENTRY_TEMPLATE is used to create the individual entires using
     the context outlined in the comment for KDFilechooserEntryTemplate.'''
+    __events__ = FileChooserController.__events__ + ('on_entry_removed',)
+
+    listing = BooleanProperty(False)
+    '''True while directories are listed in the background.'''
+    listing_frame_budget = 0.02
+    '''Seconds per frame spent creating the entries of the listed directories.'''
+    listing_refresh_interval = 0.25
+    '''Minimum seconds between adding batches of created entries to the tree, while
+    waiting for a slow listing. Each batch lays out the whole tree, so adding the
+    entries every frame would stall the UI on large directories. The first entries
+    of a listing are added immediately, and then each batch is at least as large
+    as the entries added before it, so a listing only lays out the tree a
+    logarithmic number of times.'''
+
+    def __init__(self, **kwargs):
+        self.lister = DirectoryLister()
+        self._listings = dict()
+        '''Map of the parent entry, or None for the root, to its running ListingRequest.'''
+        self._listed_chunks = deque()
+        self._created_entries = list()
+        '''(parent, request, entry widget) tuples, created but not yet added to the tree.'''
+        self._finished_listings = list()
+        self._last_refresh = None
+        self._num_added_entries = 0
+        self._add_chunks_trigger = Clock.create_trigger(self._add_listed_chunks)
+        self._reconciled_listings = deque()
+        self._reconcile_trigger = Clock.create_trigger(self._reconcile_listed_entries)
+        super().__init__(**kwargs)
+
+    def _update_files(self, *args, **kwargs):
+        '''
+        List the directory in the background. Replaces the synchronous listing
+        of FileChooserController. The root entries are cleared immediately,
+        and the new entries are added as the listing progresses.
+        '''
+        parent = kwargs.get('parent', None)
+        if parent is None:
+            self.path = os.path.abspath(self.path)
+        path = os.path.abspath(kwargs.get('path', self.path))
+
+        if parent is None:
+            is_root = os.path.dirname(path) == path
+            if self.rootpath:
+                rootpath = os.path.realpath(self.rootpath)
+                if not os.path.realpath(path).startswith(rootpath):
+                    self.path = rootpath
+                    return
+                is_root = os.path.realpath(path) == rootpath
+            self.cancel_listings()
+            self._items = []
+            self.files[:] = []
+            self.dispatch('on_entries_cleared')
+            if not is_root:
+                self._add_listed_entry(None, self._create_parent_dir_entry(path))
+        else:
+            self._cancel_listing(parent)
+            parent.entries[:] = []
+
+        self._listings[parent] = self.lister.list_directory(path, partial(self._queue_listed_chunk, parent))
+        self._last_refresh = None
+        self._num_added_entries = 0
+        self.listing = True
+
+    def cancel_listings(self):
+        '''Cancel every running directory listing.'''
+        for request in self._listings.values():
+            request.cancel()
+        self._listings.clear()
+        self._listed_chunks.clear()
+        self._created_entries.clear()
+        self._finished_listings.clear()
+        self._reconciled_listings.clear()
+        self.listing = False
+
+    def close_subselection(self, entry):
+        self._cancel_listing(entry)
+        super().close_subselection(entry)
+
+    def _cancel_listing(self, parent):
+        request = self._listings.pop(parent, None)
+        if request is not None:
+            request.cancel()
+        self.listing = bool(self._listings)
+
+    def _queue_listed_chunk(self, parent, request, chunk, is_last):
+        '''Called from the listing thread.'''
+        self._listed_chunks.append((parent, request, chunk, is_last))
+        self._add_chunks_trigger()
+
+    def _add_listed_chunks(self, *args):
+        '''
+        Create the entries of the listed chunks, for about listing_frame_budget
+        seconds. The remaining entries are created on the next frames. The
+        created entries are added to the tree at most every listing_refresh_interval.
+        '''
+        start, num_created = time.perf_counter(), 0
+        while self._listed_chunks:
+            # Create at least one entry per frame
+            if num_created and time.perf_counter() - start >= self.listing_frame_budget:
+                break
+            parent, request, chunk, is_last = self._listed_chunks[0]
+            if request.is_cancelled():
+                self._listed_chunks.popleft()
+                continue
+            if not isinstance(chunk, deque):
+                chunk = deque(self._filter_listed_entries(chunk))
+                self._listed_chunks[0] = (parent, request, chunk, is_last)
+            if chunk:
+                entry = self._create_listed_entry_widget(chunk.popleft(), parent)
+                self._created_entries.append((parent, request, entry))
+                num_created += 1
+                continue
+            self._listed_chunks.popleft()
+            if is_last:
+                self._finished_listings.append((parent, request))
+
+        now = time.perf_counter()
+        caught_up = not self._listed_chunks and (self._finished_listings
+            or now - self._last_refresh >= self.listing_refresh_interval)
+        if (self._created_entries or self._finished_listings) and (self._last_refresh is None
+                or len(self._created_entries) >= self._num_added_entries or caught_up):
+            self._last_refresh = now
+            self._add_created_entries()
+        if self._listed_chunks:
+            self._add_chunks_trigger()
+
+    def _add_created_entries(self):
+        for parent, request, entry in self._created_entries:
+            if not request.is_cancelled():
+                self._add_listed_entry(parent, entry)
+        self._num_added_entries += len(self._created_entries)
+        self._created_entries.clear()
+        for parent, request in self._finished_listings:
+            if self._listings.get(parent) is request:
+                del self._listings[parent]
+        self._finished_listings.clear()
+        self.listing = bool(self._listings)
+
+    def _filter_listed_entries(self, chunk):
+        '''Apply the hidden file, and filename filters to the chunk, and sort it.'''
+        if not self.show_hidden:
+            chunk = [entry for entry in chunk if not self.file_system.is_hidden(entry.path)]
+        if self.filters:
+            filtered_paths = set(self._apply_filters([entry.path for entry in chunk]))
+            chunk = [entry for entry in chunk if entry.path in filtered_paths]
+        return sorted(chunk, key=lambda entry: (not entry.is_dir, entry.path))
+
+    def _create_listed_entry_widget(self, listed_entry, parent):
+        def get_nice_size():
+            # Lazy, like FileChooserController. Uses the stat result cached by the DirEntry.
+            if listed_entry.is_dir:
+                return ''
+            try:
+                size = listed_entry.stat().st_size
+            except OSError:
+                return '--'
+            for unit in filesize_units:
+                if size < 1024.0:
+                    return '%1.0f %s' % (size, unit)
+                size /= 1024.0
+
+        ctx = {'name': listed_entry.name,
+               'get_nice_size': get_nice_size,
+               'path': listed_entry.path,
+               'controller': ref(self),
+               'isdir': listed_entry.is_dir,
+               'parent': parent,
+               'sep': os.path.sep}
+        return self._create_entry_widget(ctx)
+
+    def _create_parent_dir_entry(self, path):
+        back = '..' + os.path.sep
+        # Like FileChooserController, the ../ entry path is only absolute on windows
+        parent_path = os.path.dirname(path) if os.name == 'nt' else back
+        return self._create_entry_widget(dict(
+            name=back, size='', path=parent_path, controller=ref(self),
+            isdir=True, parent=None, sep=os.path.sep,
+            get_nice_size=lambda: ''))
+
+    def refresh_entries(self):
+        '''
+        Refresh the root and each open directory. Shared with the
+        RecycleFilechooser, so the designer can refresh either explorer.
+        '''
+        self.reconcile_entries()
+
+    def reconcile_entries(self, parents=None):
+        '''
+        List the root and each open directory again, or only the given parent
+        entries, and add or remove only the entries that changed. None is the
+        root. Directories that are still being listed are skipped, since
+        their listing is already up to date.
+        '''
+        # The directory mtime may not have changed on file systems with a
+        # coarse mtime resolution, so do not trust the cached listings
+        if parents is None:
+            self.lister.invalidate()
+            parents = [None] + list(self._iter_open_entries(self._items))
+        for parent in parents:
+            if parent in self._listings:
+                continue
+            if parent is not None and not (parent.is_open and parent.parent_node):
+                continue
+            path = self.path if parent is None else parent.path
+            if self.is_file_operation_pending(path):
+                continue
+            self.lister.invalidate(path)
+            self._listings[parent] = self.lister.list_directory(path, 
+                partial(self._queue_reconciled_chunk, parent, list()))
+            self.listing = True
+
+    def delete_entry(self, entry):
+        '''
+        Delete the file or directory of the entry in the background. The
+        entry is removed immediately, and restored if the deletion fails
+        or is cancelled.
+        '''
+        parent = entry.parent_node if isinstance(entry.parent_node, KDFilechooserEntry) else None
+        self._remove_listed_entry(parent, entry)
+        self.start_file_operation(DELETE, entry.path, on_done=partial(self._on_delete_done, parent))
+
+    def rename_entry(self, entry, new_name):
+        '''
+        Rename the file or directory of the entry in the background. The
+        entry, and the entries of its descendants, are renamed immediately, 
+        and renamed back if the rename fails. Names of existing siblings are 
+        ignored.
+        '''
+        old_path, old_name = entry.path, entry.text
+        new_path = os.path.join(os.path.dirname(old_path), new_name)
+        siblings = entry.parent_node.entries if isinstance(entry.parent_node, KDFilechooserEntry) else self._items
+        if new_path == old_path or any(sibling.path == new_path for sibling in siblings):
+            # The tree view indexes a single node per path
+            return
+        self._set_entry_path(entry, new_path, new_name)
+        self.start_file_operation(RENAME, old_path, new_path,
+            on_done=partial(self._on_rename_done, entry, old_path, old_name))
+
+    def _on_delete_done(self, parent, operation):
+        if not operation.succeeded():
+            # Restore the entries of the files that were not deleted
+            self.reconcile_entries([parent])
+
+    def _on_rename_done(self, entry, old_path, old_name, operation):
+        if entry.path != operation.dst:
+            return
+        if not operation.succeeded():
+            self._set_entry_path(entry, old_path, old_name)
+        # Renaming cancelled the listings of the open directories
+        self.reconcile_entries([entry] + list(self._iter_open_entries(entry.entries)))
+
+    def _set_entry_path(self, entry, path, name):
+        '''Move the entry, and the entries of its descendants, to the path.'''
+        old_path = entry.path
+        entries = [entry]
+        while entries:
+            cur_entry = entries.pop()
+            cur_path = path + cur_entry.path[len(old_path):]
+            # Listings of the previous path would add entries with the previous paths
+            self._cancel_listing(cur_entry)
+            if cur_entry.path in self.selection:
+                self.selection = [cur_path if selected == cur_entry.path else selected for selected in self.selection]
+            if cur_entry.path in self.files:
+                self.files[self.files.index(cur_entry.path)] = cur_path
+            # The tree view index follows the path
+            cur_entry.path = cur_path
+            entries.extend(cur_entry.entries)
+        entry.text = name
+
+    def on_entry_removed(self, entry, parent):
+        if self.layout:
+            self.layout.dispatch('on_entry_removed', entry, parent)
+
+    def _iter_open_entries(self, entries):
+        for entry in entries:
+            if entry.is_open and not entry.locked:
+                yield entry
+                yield from self._iter_open_entries(entry.entries)
+
+    def _queue_reconciled_chunk(self, parent, listed_entries, request, chunk, is_last):
+        '''Called from the listing thread. Reconcile once the whole directory is listed.'''
+        listed_entries.extend(chunk)
+        if is_last:
+            self._reconciled_listings.append((parent, request, listed_entries))
+            self._reconcile_trigger()
+
+    def _reconcile_listed_entries(self, *args):
+        while self._reconciled_listings:
+            parent, request, listed_entries = self._reconciled_listings.popleft()
+            if request.is_cancelled() or self._listings.get(parent) is not request:
+                continue
+            del self._listings[parent]
+            self._reconcile_directory(parent, self._filter_listed_entries(listed_entries))
+        self.listing = bool(self._listings)
+
+    def _reconcile_directory(self, parent, listed_entries):
+        '''
+        Add and remove the entries of the directory, to match the listed entries.
+        Entries of pending file operations are left as they are, until the
+        operation is done.
+        '''
+        entries = self._items if parent is None else parent.entries
+        listed_entries = {listed_entry.path: listed_entry for listed_entry in listed_entries
+            if not self.is_file_operation_pending(listed_entry.path)}
+        removed_entries = list()
+        for entry in entries:
+            if self.is_file_operation_pending(entry.path):
+                continue
+            listed_entry = listed_entries.pop(entry.path, None)
+            # A file replaced by a directory of the same name, or vice versa, is re-added
+            if listed_entry is not None and (entry.locked or entry.is_leaf == (not listed_entry.is_dir)):
+                continue
+            if not entry.text.endswith('..' + os.path.sep):
+                removed_entries.append(entry)
+                if listed_entry is not None:
+                    listed_entries[listed_entry.path] = listed_entry
+
+        for entry in removed_entries:
+            self._remove_listed_entry(parent, entry)
+        for listed_entry in listed_entries.values():
+            self._add_listed_entry(parent, self._create_listed_entry_widget(listed_entry, parent))
+
+    def _remove_listed_entry(self, parent, entry):
+        for removed_entry in [entry] + list(self._iter_open_entries(entry.entries)):
+            self._cancel_listing(removed_entry)
+        entries = self._items if parent is None else parent.entries
+        if entry in entries:
+            entries.remove(entry)
+        if parent is None and entry.path in self.files:
+            self.files.remove(entry.path)
+        if entry.path in self.selection:
+            self.selection.remove(entry.path)
+        self.dispatch('on_entry_removed', entry, parent)
+
+    def _add_listed_entry(self, parent, entry):
+        if parent is None:
+            self._items.append(entry)
+            self.files.append(entry.path)
+            self.dispatch('on_entry_added', entry, parent)
+        else:
+            parent.entries.append(entry)
+            self.dispatch('on_subentry_to_entry', entry, parent)
 
     def entry_touched(self, entry, touch):
         '''
@@ -342,10 +835,11 @@ class KDFilechooserLayout(FileChooserLayout):
     title = StringProperty('')
     '''The top label's display text.'''
 
+    __events__ = FileChooserLayout.__events__ + ('on_entry_removed',)
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.fbind('on_entries_cleared', self.scroll_to_top)
-        self._open_node_cache = set()
 
     def scroll_to_top(self, *args):
         self.ids.scrollview.scroll_y = 1.0
@@ -356,30 +850,24 @@ class KDFilechooserLayout(FileChooserLayout):
         return 'NO FOLDER OPENED'
 
     def refresh_entries(self):
-        '''Refresh the entries, to update with any changes to the directory.'''
-        treev = self.ids.treeview
-        # Updating the treeview will clear and re-add the nodes
-        # The new nodes will not have remember the open state
-        # Cache here, and reapply after re-adding if still present
-        self._open_node_cache.clear()
-        for node in treev.iterate_open_nodes():
-            # Might look like a weird check, but iterate_open_nodes iterates over
-            # all nodes except for those who have a closed parent. Therefore it 
-            # does returned closed nodes and leaf nodes.
-            if node.is_open:
-                self._open_node_cache.add(node.path)
-        self.controller._trigger_update()
+        '''
+        Refresh the entries, to update with any changes to the directory. Only
+        the changed entries are added or removed, so the open, selected and 
+        edited entries are kept as they are.
+        '''
+        self.controller.refresh_entries()
 
     def on_entry_added(self, node, parent): 
-        treev = self.ids.treeview
-        treev.add_node(node, parent)
+        self.ids.treeview.add_sorted_node(node, parent)
 
-        if node.path in self._open_node_cache:
-            # Restore node & child open state, if necessary
-            for child in treev.iterate_all_nodes(node):
-                if child.path in self._open_node_cache:
-                    treev.toggle_node(child)
-                    self._open_node_cache.remove(child.path)
+    def on_subentry_to_entry(self, subentry, entry):
+        if entry.locked:
+            return
+        self.ids.treeview.add_sorted_node(subentry, entry)
+
+    def on_entry_removed(self, node, parent):
+        if node.parent_node is not None:
+            self.ids.treeview.remove_node(node)
 
     def collapse_all_nodes(self):
         treev = self.ids.treeview
@@ -392,10 +880,7 @@ class KDFilechooserLayout(FileChooserLayout):
         if len(self.controller.selection) == 0:
             return None 
 
-        treev = self.ids.treeview
-        for node in treev.iterate_all_nodes():
-            if node.path == self.controller.selection[0]:
-                return node
+        return self.ids.treeview.get_node(self.controller.selection[0])
         
     def new_file(self):
         '''
@@ -413,8 +898,11 @@ class KDFilechooserLayout(FileChooserLayout):
                 new_parent = cur_selection.parent_node 
                 new_dirname = os.path.dirname(cur_selection.path)
         else:
-            new_parent = self.ids.treeview.root
+            new_parent = None
             new_dirname = self.controller.rootpath
+        # Root entries have no parent entry, like the listed entries
+        if not isinstance(new_parent, KDFilechooserEntry):
+            new_parent = None
 
         new_filename = 'new_file'
         new_path = os.path.join(new_dirname, new_filename)
@@ -437,8 +925,8 @@ class KDFilechooserLayout(FileChooserLayout):
         new_entry = self.controller._create_entry_widget(ctx)
         self.ids.treeview.select_node(new_entry)
         new_entry.enable_edit_mode()
-        self.controller.dispatch('on_entry_added', new_entry, new_parent)
-        self.controller.files.append(new_path)
+        # Register the entry like a listed entry, so refreshes find it
+        self.controller._add_listed_entry(new_parent, new_entry)
         self.controller.selection = [new_path,]
 
     def select_root_path(self):
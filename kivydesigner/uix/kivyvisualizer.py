@@ -1,17 +1,95 @@
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.codeinput import CodeInput
+from kivy.uix.label import Label
+from kivy.clock import Clock
+from kivy.metrics import dp
+from kivy.properties import NumericProperty, StringProperty
 from kivy.app import App
 
 class KivyVisualizer(BoxLayout):
+
+    reload_delay = NumericProperty(0.3)
+    '''Quiet period, in seconds, the editor text must be unchanged for before
+    a hot reload is sent. Only the latest text is sent, so typing quickly
+    triggers a single rebuild instead of one rebuild per keystroke.'''
+
+    reload_error = StringProperty('')
+    '''Error of the last hot reload, or an empty string if it succeeded.
+    The error is shown below the editor.'''
+
+    reload_latency = StringProperty('')
+    '''Latency of the last hot reload, and the rolling percentiles of the 
+    recent reloads. Shown below the editor. See show_reload_latency.'''
+
     def __init__(self, **kwargs):
+        self._pending_kv_str = None
+        self._reload_trigger = Clock.create_trigger(self._send_pending_reload,
+            kwargs.get('reload_delay', self.reload_delay))
+        kwargs.setdefault('orientation', 'vertical')
         super().__init__(**kwargs)
         self.reload_func_ref = App.get_running_app().hot_reload
         self.editor = CodeInput(do_wrap=False)
         self.editor.bind(text=self.handle_kv_change)
         self.add_widget(self.editor)
+        self.error_label = Label(size_hint_y=None, height=0, opacity=0, color=(1, 0.4, 0.4, 1),
+            halign='left', valign='middle', shorten=True, shorten_from='right')
+        self.error_label.bind(size=lambda label, size: setattr(label, 'text_size', size))
+        self.add_widget(self.error_label)
+        self.latency_label = Label(size_hint_y=None, height=0, opacity=0, color=(0.6, 0.6, 0.6, 1),
+            font_size='12sp', halign='right', valign='middle')
+        self.latency_label.bind(size=lambda label, size: setattr(label, 'text_size', size))
+        self.add_widget(self.latency_label)
+
+    def on_reload_error(self, instance, value):
+        self.error_label.text = value
+        self.error_label.height = dp(24) if value else 0
+        self.error_label.opacity = 1 if value else 0
+
+    def on_reload_latency(self, instance, value):
+        self.latency_label.text = value
+        self.latency_label.height = dp(20) if value else 0
+        self.latency_label.opacity = 1 if value else 0
+
+    def show_reload_latency(self, latency, p50, p99):
+        '''Show the seconds from sending the last reload until it was drawn, and the percentiles.'''
+        self.reload_latency = f'Reloaded in {latency * 1000:.0f} ms (p50 {p50 * 1000:.0f} ms, p99 {p99 * 1000:.0f} ms)'
+
+    def show_reload_result(self, result):
+        '''
+        Show the error of a failed hotreload.ReloadResult below the editor, or
+        clear the previous error if the reload succeeded.
+        '''
+        if result.success:
+            self.reload_error = ''
+            return
+        # The last line of kivy's build errors holds the message
+        lines = [line.strip() for line in result.error.splitlines() if line.strip()]
+        message = lines[-1] if lines else 'Unknown error'
+        if result.error_line is not None:
+            message = f'Line {result.error_line}: {message}'
+        self.reload_error = message
+
+    def on_reload_delay(self, instance, value):
+        self._reload_trigger.cancel()
+        self._reload_trigger = Clock.create_trigger(self._send_pending_reload, value)
+        if self._pending_kv_str is not None:
+            self._reload_trigger()
 
     def handle_kv_change(self, instance, value):
-        self.reload_func_ref(value)
+        # Restart the quiet period, keeping only the latest text
+        self._pending_kv_str = value
+        self._reload_trigger.cancel()
+        self._reload_trigger()
+
+    def flush_reload(self):
+        '''Immediately send the pending hot reload, if any.'''
+        self._reload_trigger.cancel()
+        self._send_pending_reload()
+
+    def _send_pending_reload(self, *args):
+        kv_str, self._pending_kv_str = self._pending_kv_str, None
+        if kv_str is not None:
+            self.reload_func_ref(kv_str)
 
     def open_file(self, new_filepath):
         try:
@@ -19,3 +97,5 @@ class KivyVisualizer(BoxLayout):
                 self.editor.text = reader.read()
         except Exception as err:
             self.editor.text = f'Could not open {new_filepath} \n {str(err)}'
+        # Opening a file is a single change, so there is no reason to wait
+        self.flush_reload()
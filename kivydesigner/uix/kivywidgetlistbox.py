@@ -1,13 +1,16 @@
+from collections import deque
 from pathlib import Path
 import copy
-import site
+import threading
 
 from kivy.clock import Clock
-from kivy.properties import StringProperty
-from kivydesigner.uix.grouplistbox import GroupListBox
-from kivydesigner.inheritancetrees import InheritanceTreesBuilder
+from kivy.properties import StringProperty, BooleanProperty
+from kivydesigner.uix.recyclegrouplistbox import RecycleGroupListBox
+from kivydesigner.inheritancetrees import InheritanceTreesBuilder, iter_directory_class_definitions, \
+    is_project_source
+from kivydesigner.scancache import ScanCache
 
-class KivyWidgetListBox(GroupListBox):
+class KivyWidgetListBox(RecycleGroupListBox):
 
     project_path = StringProperty(None, allow_none=True)
     '''Search path used to populate the listbox with user defined widgets and apps.
@@ -18,63 +21,226 @@ class KivyWidgetListBox(GroupListBox):
     '''Static set of all kivy standard library apps.'''
     standard_library_widgets = kivy_inheritance_tree.get_subclasses('Widget')
     '''Static set of all kivy standard library widgets.'''
+    max_incremental_refresh = 50
+    '''Batches of file changes larger than this trigger a full (cached) project scan
+    instead of refreshing each file individually.'''
+    scan_batch_size = 50
+    '''Number of scanned classes the background scan queues at once.'''
+    scan_refresh_interval = 0.25
+    '''Minimum seconds between refreshes of the user defined groups during a
+    background scan. Each refresh lays out the listbox, so refreshing every 
+    frame would stall the UI on large projects.'''
+    scanning = BooleanProperty(False)
+    '''True while the project is scanned in the background. See scan_user_defined_widgets.'''
 
     def __init__(self, **kwargs):
+        # Deep copy, since user defined classes must never be added to the static tree
+        self.tree_builder = InheritanceTreesBuilder()
+        self.inheritance_tree = copy.deepcopy(KivyWidgetListBox.kivy_inheritance_tree)
+        self._scan_cancel = None
+        '''threading.Event of the running background scan, set to cancel the scan.'''
+        self._scan_batches = deque()
+        self._pending_refresh = list()
+        '''Source files changed during the background scan, refreshed once it finishes.'''
+        self._merge_trigger = Clock.create_trigger(self._merge_scan_batches, self.scan_refresh_interval)
         super().__init__(**kwargs)
-        self.inheritance_tree = copy.copy(KivyWidgetListBox.kivy_inheritance_tree)
-        
+
     def on_project_path(self, instance, value):
         '''
         Update the list of user defined widgets when the project path changes.
+        The project is scanned in the background.
         '''
-        self.update_user_defined_widgets()
+        self.scan_user_defined_widgets()
+
+    @property
+    def inheritance_tree(self):
+        return self.tree_builder.tree
+
+    @inheritance_tree.setter
+    def inheritance_tree(self, tree):
+        self.tree_builder.tree = tree
+
+    def has_project(self):
+        return bool(self.project_path and Path(self.project_path).is_dir())
+
+    def is_project_source(self, filepath):
+        '''See inheritancetrees.is_project_source.'''
+        return is_project_source(filepath)
 
     def update_user_defined_widgets(self):
         '''
         Flush all previous user defined widgets and apps from inheritance tree
-        and treeview, and repopulate the treeview with the user defined widgets
-        in the project path.
+        and listbox, and repopulate the listbox with the user defined widgets
+        in the project path. Source files that are unchanged since the
+        previous scan are loaded from the project ScanCache.
 
-        The project path must be a valid directory. 
+        The project path must be a valid directory.
         '''
         self.clear()
-        if not (self.project_path and Path(self.project_path).is_dir()):
-            self.add_group('STANDARD KIVY APPS', self.standard_library_apps)
-            self.add_group('STANDARD KIVY WIDGETS', self.standard_library_widgets)
+        if not self.has_project():
+            self._add_standard_groups()
             return
 
-        builder = InheritanceTreesBuilder()
-        builder.tree = self.inheritance_tree
-
-        dirs_to_exclude = [Path(path) for path in site.getsitepackages()]
-        parent_prefixes_to_exclude = ('.', '_', '__')
-        def is_valid_path(filepath):
-            from_excluded_dir = any(filepath.is_relative_to(parent) for parent in dirs_to_exclude)
-            if from_excluded_dir:
-                return False
-            # Parts will return a list of the directory names and 
-            # the root drive path. This excludes paths such as
-            # __pycache__ and .git. Instead of doing an exhaustive search, 
-            # just check if the child directory starts with a prefix
-            if filepath.is_dir():
-                child_dir = filepath.parts[-1]
-                return not any(child_dir.startswith(prefix) for prefix in parent_prefixes_to_exclude)
-            return True
         # Search project path for user defined widgets and apps.
-        # Exclude external packages from search.
-        builder.build_from_directory(self.project_path, is_valid_path)
-
-        user_defined_widgets = self.inheritance_tree.get_subclasses('Widget')
-        user_defined_widgets -= self.standard_library_widgets
-        user_defined_apps = self.inheritance_tree.get_subclasses('App')
-        user_defined_apps -= self.standard_library_apps
+        # Exclude external packages from search. Unchanged files are
+        # loaded from the project's scan cache instead of being re-parsed.
+        self.tree_builder.build_from_directory(self.project_path, self.is_project_source, parallel=True,
+            scan_cache=ScanCache.for_project(self.project_path), fast_scan=True)
 
+        user_defined_apps, user_defined_widgets = self._get_user_defined_classes()
         self.add_group('USER DEFINED APPS', user_defined_apps)
         self.add_group('USER DEFINED WIDGETS', user_defined_widgets)
         self.add_group('STANDARD KIVY WIDGETS', self.standard_library_widgets)
         self.add_group('STANDARD KIVY APPS', self.standard_library_apps)
 
+    def scan_user_defined_widgets(self):
+        '''
+        Like update_user_defined_widgets, but scan the project path on a 
+        background thread, without blocking the kivy thread. The user defined
+        groups are populated progressively, as the scanned classes are merged
+        on the kivy thread, at most once per scan_refresh_interval. 
+        
+        Starting another scan, or clearing the listbox, cancels the scan.
+        '''
+        self.clear()
+        if not self.has_project():
+            self._add_standard_groups()
+            return
+
+        self.add_group('USER DEFINED APPS', set())
+        self.add_group('USER DEFINED WIDGETS', set())
+        self.add_group('STANDARD KIVY WIDGETS', self.standard_library_widgets)
+        self.add_group('STANDARD KIVY APPS', self.standard_library_apps)
+        self._scan_cancel = threading.Event()
+        self.scanning = True
+        threading.Thread(target=self._scan_project, args=(self.project_path, self._scan_cancel), 
+            daemon=True).start()
+
+    def cancel_scan(self):
+        '''Cancel the running background scan, if any.'''
+        if self._scan_cancel is not None:
+            self._scan_cancel.set()
+            self._scan_cancel = None
+        self._scan_batches.clear()
+        self._pending_refresh.clear()
+        self.scanning = False
+
+    def _add_standard_groups(self):
+        self.add_group('STANDARD KIVY APPS', self.standard_library_apps)
+        self.add_group('STANDARD KIVY WIDGETS', self.standard_library_widgets)
+
+    def _scan_project(self, project_path, cancel):
+        '''
+        Read the class definitions of the project, and queue them in batches
+        for the kivy thread. Runs on a background thread.
+        '''
+        batch, batch_size = list(), 0
+        try:
+            scanned_files = iter_directory_class_definitions(project_path, self.is_project_source, 
+                parallel=True, scan_cache=ScanCache.for_project(project_path), fast_scan=True)
+            for filepath, classdefs in scanned_files:
+                if cancel.is_set():
+                    scanned_files.close()
+                    return
+                batch.append((filepath, classdefs))
+                batch_size += len(classdefs)
+                if batch_size >= self.scan_batch_size:
+                    self._queue_scan_batch(cancel, batch, False)
+                    batch, batch_size = list(), 0
+        finally:
+            # Always report the end of the scan, so scanning is reset
+            self._queue_scan_batch(cancel, batch, True)
+
+    def _queue_scan_batch(self, cancel, batch, is_last):
+        self._scan_batches.append((cancel, batch, is_last))
+        self._merge_trigger()
+
+    def _merge_scan_batches(self, *args):
+        '''Merge the queued batches of scanned classes into the user defined groups.'''
+        scan_cancel, merged, finished = self._scan_cancel, False, False
+        while self._scan_batches:
+            cancel, batch, is_last = self._scan_batches.popleft()
+            # Drop the batches of cancelled scans
+            if cancel is not scan_cancel:
+                continue
+            for filepath, classdefs in batch:
+                self.tree_builder.build_from_classdefs(filepath, classdefs)
+            merged = merged or bool(batch)
+            finished = is_last
+
+        if merged:
+            user_defined_apps, user_defined_widgets = self._get_user_defined_classes()
+            self.update_group('USER DEFINED APPS', user_defined_apps)
+            self.update_group('USER DEFINED WIDGETS', user_defined_widgets)
+        if finished:
+            self._scan_cancel = None
+            self.scanning = False
+            pending_refresh, self._pending_refresh = self._pending_refresh, list()
+            if pending_refresh:
+                self.refresh_source_files(pending_refresh)
+
+    def refresh_source_file(self, filepath):
+        '''
+        Re-parse a single created, modified or deleted source file, and add or
+        remove only the affected entries from the user defined groups.
+        Files outside of the project search path are ignored.
+        '''
+        self.refresh_source_files([filepath])
+
+    def refresh_source_files(self, filepaths):
+        '''
+        Re-parse each created, modified or deleted source file, and then patch
+        the user defined groups once. See refresh_source_file. 
+        
+        While a background scan runs, the scan may or may not have read the
+        files yet, so the files are refreshed once the scan finishes.
+        '''
+        if not self.has_project():
+            return
+        if self.scanning:
+            self._pending_refresh.extend(filepaths)
+            return
+        for filepath in filepaths:
+            if self._is_project_source_file(Path(filepath)):
+                # Parse like the scan, so the refreshed classes match a full scan
+                self.tree_builder.refresh_source_file(Path(filepath), fast_scan=True)
+        user_defined_apps, user_defined_widgets = self._get_user_defined_classes()
+        self.update_group('USER DEFINED APPS', user_defined_apps)
+        self.update_group('USER DEFINED WIDGETS', user_defined_widgets)
+
+    def apply_file_changes(self, changes):
+        '''
+        Update the user defined groups from a filewatcher.FileChanges batch. 
+        Small batches are refreshed file by file. Large batches, and batches
+        where directories moved, trigger a background scan of the project, 
+        which only re-parses the changed files thanks to the ScanCache.
+        '''
+        changed_sources = [path for path in changes.paths if path.endswith('.py')]
+        if changes.directories_changed or len(changed_sources) > self.max_incremental_refresh:
+            self.scan_user_defined_widgets()
+        elif changed_sources:
+            self.refresh_source_files(changed_sources)
+
+    def _is_project_source_file(self, filepath):
+        if filepath.suffix != '.py':
+            return False
+        try:
+            relative_dirs = filepath.parent.relative_to(self.project_path).parts
+        except ValueError:
+            return False
+        if any(dirname.startswith(('.', '_')) for dirname in relative_dirs):
+            return False
+        return self.is_project_source(filepath)
+
+    def _get_user_defined_classes(self):
+        '''Return the sets of user defined apps and widgets in the inheritance tree.'''
+        user_defined_widgets = self.inheritance_tree.get_subclasses('Widget')
+        user_defined_widgets -= self.standard_library_widgets
+        user_defined_apps = self.inheritance_tree.get_subclasses('App')
+        user_defined_apps -= self.standard_library_apps
+        return user_defined_apps, user_defined_widgets
+
     def clear(self):
+        self.cancel_scan()
         super().clear()
-        self.inheritance_tree = copy.copy(KivyWidgetListBox.kivy_inheritance_tree)
-
+        self.inheritance_tree = copy.deepcopy(KivyWidgetListBox.kivy_inheritance_tree)
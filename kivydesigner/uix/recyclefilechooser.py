@@ -0,0 +1,543 @@
+from pathlib import Path
+from collections import deque
+from functools import partial
+import os
+import os.path
+
+from kivy.lang import Builder
+from kivy.clock import Clock
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.textinput import TextInput
+from kivy.uix.behaviors import FocusBehavior
+from kivy.properties import (BooleanProperty, StringProperty, ListProperty,
+    NumericProperty, ObjectProperty)
+from plyer import filechooser
+
+# Loads the KDFilechooserIconButton rule, shared by both explorers
+from kivydesigner.uix.kdfilechooser import get_entry_icon_path, FileOperationsBehavior
+from kivydesigner.uix.modalmsg import ModalMsg
+from kivydesigner.dirlisting import DirectoryLister, ListedEntry
+from kivydesigner.fileops import DELETE, RENAME
+
+kv_filepath = Path(__file__).with_suffix('.kv')
+Builder.load_file(str(kv_filepath), rulesonly=True)
+
+'''
+The RecycleFilechooser is a virtualized project explorer, for very large
+project trees. It has the same header buttons, events and keybinds as the
+KDFilechooser, and can replace it in KivyDesigner.kv. Both explorers
+provide the rootpath property and the refresh_entries method the designer
+uses to follow the project on disk.
+
+The tree is a flat data model. Each row is a dict holding the path, depth,
+and the directory, open, selected and edit state of a file or directory.
+The rows of each listed directory are kept sorted, directories first, and
+the rows of the open directories are flattened into the RecycleView data.
+The RecycleView only creates ExplorerRow widgets for the visible rows, and
+rebinds them to other rows as the user scrolls.
+
+Directories are listed in the background by a DirectoryLister, like the
+KDFilechooser. Collapsing a directory keeps its rows, so re-opening it
+only reconciles the rows with a new listing.
+
+Edit mode uses a single TextInput, owned by the explorer. The editor is
+moved into the ExplorerRow bound to the edited row, and follows the row
+as the views are recycled.
+'''
+
+def _make_row(listed_entry, depth):
+    # Every row has every key, since the RecycleView only
+    # applies the keys of a row to the recycled widget.
+    return {'path': listed_entry.path, 'text': listed_entry.name, 'depth': depth,
+            'is_dir': listed_entry.is_dir, 'is_open': False,
+            'is_selected': False, 'is_editing': False}
+
+def _row_sort_key(row):
+    # Directories first, like the KDFilechooser
+    return (not row['is_dir'], row['path'])
+
+class ExplorerRow(RecycleDataViewBehavior, BoxLayout):
+    path = StringProperty('')
+    text = StringProperty('')
+    depth = NumericProperty(0)
+    is_dir = BooleanProperty(False)
+    is_open = BooleanProperty(False)
+    is_selected = BooleanProperty(False)
+    is_editing = BooleanProperty(False)
+    '''True if the row holds the editor of the explorer.'''
+
+    def __init__(self, **kwargs):
+        self.index = None
+        self.explorer = None
+        super().__init__(**kwargs)
+
+    def refresh_view_attrs(self, rv, index, data):
+        self.index = index
+        self.explorer = rv.explorer
+        return super().refresh_view_attrs(rv, index, data)
+
+    def on_is_editing(self, instance, is_editing):
+        editor, label = self.explorer.editor, self.ids.label
+        if is_editing:
+            if editor.parent is not None:
+                editor.parent.remove_widget(editor)
+            self.remove_widget(label)
+            # Force a center vertical alignment
+            editor.padding = [0, max((self.height - editor.minimum_height) // 2, 0)]
+            self.add_widget(editor)
+        else:
+            if editor.parent is self:
+                self.remove_widget(editor)
+            if label.parent is None:
+                self.add_widget(label)
+
+    def on_touch_down(self, touch):
+        if not self.collide_point(*touch.pos):
+            return False
+        if self.is_editing:
+            return super().on_touch_down(touch)
+        if self.explorer is not None and self.index is not None:
+            self.explorer.row_touched(self.index, touch)
+        return True
+
+class ExplorerRecycleView(FocusBehavior, RecycleView):
+    explorer = ObjectProperty(None)
+
+    def on_touch_down(self, touch):
+        '''Get focus on valid touches, unless the touch may be for the editor.'''
+        if not self.collide_point(*touch.pos):
+            return False
+        if (not self.explorer.editor.focus and self.is_focusable and
+            ('button' not in touch.profile or
+             not touch.button.startswith('scroll'))):
+            self.focus = True
+            FocusBehavior.ignored_touch.append(touch)
+        return super(FocusBehavior, self).on_touch_down(touch)
+
+    def keyboard_on_key_up(self, window, keycode):
+        '''Same keybinds as the KDFileTreeView.'''
+        if keycode[1] == 'f2' and self.explorer.selected_row:
+            self.explorer.enable_edit_mode()
+            return True
+        elif keycode[1] == 'delete' and self.explorer.selected_row:
+            self.explorer.delete_selected_row()
+            return True
+        return super().keyboard_on_key_up(window, keycode)
+
+class RecycleFilechooser(FileOperationsBehavior, BoxLayout):
+
+    rootpath = StringProperty('')
+    '''Directory shown by the explorer.'''
+    title = StringProperty('')
+    selection = ListProperty([])
+    '''Path of the selected row, like the FileChooserController selection.'''
+    show_hidden = BooleanProperty(False)
+    listing = BooleanProperty(False)
+    '''True while directories are listed in the background.'''
+    recycleview = ObjectProperty(None)
+
+    __events__ = ('on_submit',)
+
+    def __init__(self, **kwargs):
+        self.lister = DirectoryLister()
+        self._children = dict()
+        '''Map of each listed directory path to its sorted rows.'''
+        self._rows_by_path = dict()
+        self._listings = dict()
+        '''Map of directory path to its running ListingRequest.'''
+        self._listed_chunks = deque()
+        self._reconciled_entries = dict()
+        '''Map of directory path to the listed entries, until the listing is complete.'''
+        self._add_chunks_trigger = Clock.create_trigger(self._add_listed_chunks)
+        self._refresh_trigger = Clock.create_trigger(self._refresh_data)
+        self.selected_row = None
+        self._editing_row = None
+        self.editor = self._create_editor()
+        super().__init__(**kwargs)
+
+    def on_submit(self, selection, touch=None):
+        pass
+
+    def on_rootpath(self, instance, rootpath):
+        self.cancel_listings()
+        self._children.clear()
+        self._rows_by_path.clear()
+        self.selected_row = None
+        self._editing_row = None
+        self.selection = []
+        if rootpath:
+            self._list_directory(os.path.abspath(rootpath))
+        self._refresh_data()
+
+    def get_title_name(self, rootpath):
+        if rootpath and os.path.isdir(rootpath):
+            return os.path.basename(rootpath).upper()
+        return 'NO FOLDER OPENED'
+
+    def get_row(self, path):
+        '''Return the row of the path, or None if the path was not listed.'''
+        return self._rows_by_path.get(path)
+
+    def cancel_listings(self):
+        '''Cancel every running directory listing.'''
+        for request in self._listings.values():
+            request.cancel()
+        self._listings.clear()
+        self._listed_chunks.clear()
+        self._reconciled_entries.clear()
+        self.listing = False
+
+    def row_touched(self, index, touch):
+        '''Select and toggle the row at each click, and submit files on double click.'''
+        if 'button' in touch.profile and touch.button.startswith('scroll'):
+            return
+        row = self.recycleview.data[index]
+        self.select_row(row)
+        if row['is_dir']:
+            self.toggle_row(row)
+        elif touch.is_double_tap:
+            self.dispatch('on_submit', self.selection, touch)
+
+    def select_row(self, row):
+        if row is self.selected_row:
+            return
+        if self._editing_row is not None:
+            self.disable_edit_mode()
+        if self.selected_row is not None:
+            self.selected_row['is_selected'] = False
+        row['is_selected'] = True
+        self.selected_row = row
+        self.selection = [row['path']]
+        self.recycleview.refresh_from_data()
+
+    def toggle_row(self, row):
+        '''Expand or collapse the directory row.'''
+        row['is_open'] = not row['is_open']
+        if row['is_open']:
+            self._list_directory(row['path'], reconcile=row['path'] in self._children)
+        else:
+            self._cancel_listing(row['path'])
+        self._refresh_data()
+
+    def collapse_all_nodes(self):
+        for row in self._rows_by_path.values():
+            if row['is_open']:
+                row['is_open'] = False
+                self._cancel_listing(row['path'])
+        self._refresh_data()
+
+    def refresh_entries(self):
+        '''
+        Refresh the rows, to update with any changes to the directories. The
+        root and each open directory are listed again, and only the changed
+        rows are added or removed.
+        '''
+        self.lister.invalidate()
+        if not self.rootpath:
+            return
+        for path in [os.path.abspath(self.rootpath)] + [row['path'] for row in self._iter_open_rows()]:
+            if path not in self._listings and not self.is_file_operation_pending(path):
+                self._list_directory(path, reconcile=True)
+
+    def enable_edit_mode(self):
+        '''Edit the name of the selected row.'''
+        row = self.selected_row
+        if row is None or row is self._editing_row:
+            return
+        self.disable_edit_mode()
+        row['is_editing'] = True
+        self._editing_row = row
+        editor = self.editor
+        editor.text = row['text']
+        file_ext = Path(row['text']).suffix
+        selection_idx = row['text'].find(file_ext) if file_ext else len(row['text'])
+        editor.select_text(0, selection_idx)
+        def _set_cursor(dt):
+            editor.cursor = [selection_idx, 0]
+        Clock.schedule_once(_set_cursor, 0)
+        self.recycleview.refresh_from_data()
+        editor.focus = True
+
+    def disable_edit_mode(self):
+        row = self._editing_row
+        if row is None:
+            return
+        self._editing_row = None
+        row['is_editing'] = False
+        self.editor.focus = False
+        self.recycleview.refresh_from_data()
+
+    def new_file(self):
+        '''
+        Add a new file, in the same directory as the selected row. Place
+        the file in the root directory if no row is selected.
+
+        The newly added file will start in edit mode.
+        '''
+        row = self.selected_row
+        if row is None:
+            dirname = os.path.abspath(self.rootpath)
+        elif row['is_dir'] and row['is_open']:
+            dirname = row['path']
+        else:
+            dirname = os.path.dirname(row['path'])
+        if dirname not in self._children:
+            return
+
+        new_filename = 'new_file'
+        new_path = os.path.join(dirname, new_filename)
+        i = 1
+        while os.path.exists(new_path):
+            i += 1
+            new_filename = f'new_file{i}'
+            new_path = os.path.join(dirname, new_filename)
+        open(new_path, 'x')
+
+        new_row = self._add_row(dirname, ListedEntry(new_filename, new_path, is_dir=False))
+        self._refresh_data()
+        self.select_row(new_row)
+        self.enable_edit_mode()
+
+    def delete_selected_row(self):
+        '''
+        Delete the selected row, and remove the corresponding file/directory
+        from the file system in the background. Ask the user before proceeding
+        with the deletion.
+        '''
+        row = self.selected_row
+        def _delete_internal(win, do_remove):
+            if do_remove:
+                self.delete_row(row)
+
+        dir_msg = " and its contents" if row['is_dir'] else ''
+        modal_win = ModalMsg(message=f'Are you sure you want to delete {row["text"]}{dir_msg}?')
+        modal_win.open(_delete_internal)
+
+    def delete_row(self, row):
+        '''
+        Delete the file or directory of the row in the background. The row is
+        removed immediately, and restored if the deletion fails or is cancelled.
+        '''
+        self._remove_rows([row])
+        self._refresh_data()
+        self.start_file_operation(DELETE, row['path'],
+            on_done=partial(self._on_delete_done, os.path.dirname(row['path'])))
+
+    def select_root_path(self):
+        new_dir = filechooser.choose_dir(path=self.rootpath,
+          title='Select a folder to open in the project explorer')
+        if new_dir:
+            self.rootpath = os.path.realpath(new_dir[0])
+
+    def _create_editor(self):
+        # Transparent background, white text, white cursor,
+        # and transparent blue selection. Same as the KDFilechooserEntry.
+        editor = TextInput(multiline=False, padding=[0, 0],
+          halign='left', background_color=[0,0,0,0],
+          foreground_color=[1,1,1,1],
+          selection_color=(0.196, 0.592, 0.992, 0.4),
+          cursor_color=[1,1,1,1])
+        editor.bind(on_text_validate=self._on_editor_validate)
+        editor.bind(focus=self._on_editor_focus)
+        return editor
+
+    def _on_editor_validate(self, editor):
+        '''
+        Rename the edited row in the background. The row is renamed
+        immediately, and renamed back if the rename fails, so renames
+        silently fail like the KDFilechooserEntry.
+        '''
+        row = self._editing_row
+        if row is None or editor.text == row['text']:
+            return
+        old_path = row['path']
+        new_path = os.path.join(os.path.dirname(old_path), editor.text)
+        if new_path in self._rows_by_path:
+            # Renaming onto a sibling would index two rows under one path
+            return
+        self._rename_row(row, new_path)
+        self._refresh_data()
+        self.start_file_operation(RENAME, old_path, new_path,
+            on_done=partial(self._on_rename_done, row, old_path))
+
+    def _on_delete_done(self, dirname, operation):
+        if operation.succeeded() or dirname not in self._children:
+            return
+        dir_row = self._rows_by_path.get(dirname)
+        if dir_row is None or dir_row['is_open']:
+            # Restore the rows of the files that were not deleted
+            self.lister.invalidate(dirname)
+            self._list_directory(dirname, reconcile=True)
+
+    def _on_rename_done(self, row, old_path, operation):
+        if not operation.succeeded() and row['path'] == operation.dst:
+            self._rename_row(row, old_path)
+            self._refresh_data()
+
+    def _on_editor_focus(self, editor, is_focused):
+        # Leaving the editor, or pressing escape, ends edit mode
+        if not is_focused:
+            self.disable_edit_mode()
+
+    def _list_directory(self, path, reconcile=False):
+        self._cancel_listing(path)
+        self._listings[path] = self.lister.list_directory(path,
+            partial(self._queue_listed_chunk, path, reconcile))
+        self.listing = True
+
+    def _cancel_listing(self, path):
+        request = self._listings.pop(path, None)
+        if request is not None:
+            request.cancel()
+        self._reconciled_entries.pop(path, None)
+        self.listing = bool(self._listings)
+
+    def _queue_listed_chunk(self, path, reconcile, request, chunk, is_last):
+        '''Called from the listing thread.'''
+        self._listed_chunks.append((path, reconcile, request, chunk, is_last))
+        self._add_chunks_trigger()
+
+    def _add_listed_chunks(self, *args):
+        '''
+        Add the rows of the listed chunks. Rows are plain dicts, so every
+        chunk is added at once. Reconciled directories are only updated once
+        they are completely listed.
+        '''
+        while self._listed_chunks:
+            path, reconcile, request, chunk, is_last = self._listed_chunks.popleft()
+            if request.is_cancelled() or self._listings.get(path) is not request:
+                continue
+            if not self.show_hidden:
+                chunk = [entry for entry in chunk if not entry.is_hidden]
+            if reconcile:
+                listed_entries = self._reconciled_entries.setdefault(path, list())
+                listed_entries.extend(chunk)
+                if is_last:
+                    self._reconcile_rows(path, self._reconciled_entries.pop(path))
+            else:
+                rows = self._children.setdefault(path, list())
+                depth = self._get_depth(path)
+                for entry in chunk:
+                    row = _make_row(entry, depth)
+                    rows.append(row)
+                    self._rows_by_path[entry.path] = row
+                # Merging the sorted rows and a chunk is linear for timsort
+                rows.sort(key=_row_sort_key)
+            if is_last:
+                del self._listings[path]
+        self.listing = bool(self._listings)
+        self._refresh_trigger()
+
+    def _get_depth(self, path):
+        '''Return the depth of the rows of the directory.'''
+        parent_row = self._rows_by_path.get(path)
+        return 0 if parent_row is None else parent_row['depth'] + 1
+
+    def _reconcile_rows(self, path, listed_entries):
+        '''
+        Add and remove the rows of the directory, to match the listed entries.
+        Rows of pending file operations are left as they are.
+        '''
+        rows = self._children.setdefault(path, list())
+        listed_entries = {entry.path: entry for entry in listed_entries
+            if not self.is_file_operation_pending(entry.path)}
+        removed_rows = list()
+        for row in rows:
+            if self.is_file_operation_pending(row['path']):
+                continue
+            entry = listed_entries.pop(row['path'], None)
+            if entry is None or entry.is_dir != row['is_dir']:
+                removed_rows.append(row)
+                if entry is not None:
+                    listed_entries[entry.path] = entry
+        self._remove_rows(removed_rows)
+        depth = self._get_depth(path)
+        for entry in listed_entries.values():
+            row = _make_row(entry, depth)
+            rows.append(row)
+            self._rows_by_path[entry.path] = row
+        if listed_entries:
+            rows.sort(key=_row_sort_key)
+
+    def _add_row(self, dirname, entry):
+        '''Add the row of an entry created by the explorer.'''
+        row = _make_row(entry, self._get_depth(dirname))
+        rows = self._children[dirname]
+        rows.append(row)
+        rows.sort(key=_row_sort_key)
+        self._rows_by_path[entry.path] = row
+        return row
+
+    def _remove_rows(self, rows):
+        '''Remove the rows, and the rows of their descendants.'''
+        removed_paths = {row['path'] for row in rows}
+        for dirname in {os.path.dirname(path) for path in removed_paths}:
+            siblings = self._children.get(dirname)
+            if siblings is not None:
+                siblings[:] = [row for row in siblings if row['path'] not in removed_paths]
+        rows = list(rows)
+        while rows:
+            row = rows.pop()
+            self._rows_by_path.pop(row['path'], None)
+            if row is self._editing_row:
+                self.disable_edit_mode()
+            if row is self.selected_row:
+                self.selected_row = None
+                self.selection = []
+            if row['is_dir']:
+                self._cancel_listing(row['path'])
+                rows.extend(self._children.pop(row['path'], ()))
+
+    def _rename_row(self, row, new_path):
+        '''Move the row, and the rows of its descendants, to the new path.'''
+        old_path = row['path']
+        siblings = self._children[os.path.dirname(old_path)]
+        rows = [row]
+        while rows:
+            cur_row = rows.pop()
+            cur_path = cur_row['path']
+            cur_row['path'] = new_path + cur_path[len(old_path):]
+            self._rows_by_path.pop(cur_path, None)
+            self._rows_by_path[cur_row['path']] = cur_row
+            if cur_row['is_dir']:
+                self._cancel_listing(cur_path)
+                if cur_path in self._children:
+                    self._children[cur_row['path']] = self._children.pop(cur_path)
+                    rows.extend(self._children[cur_row['path']])
+        row['text'] = os.path.basename(new_path)
+        siblings.sort(key=_row_sort_key)
+        if row is self.selected_row:
+            self.selection = [new_path]
+
+    def _iter_open_rows(self):
+        '''Iterate over the visible rows of the open directories.'''
+        for row in self._iter_visible_rows():
+            if row['is_open']:
+                yield row
+
+    def _iter_visible_rows(self):
+        if not self.rootpath:
+            return
+        stack = [iter(self._children.get(os.path.abspath(self.rootpath), ()))]
+        while stack:
+            row = next(stack[-1], None)
+            if row is None:
+                stack.pop()
+                continue
+            yield row
+            if row['is_open']:
+                stack.append(iter(self._children.get(row['path'], ())))
+
+    def _refresh_data(self, *args):
+        '''Flatten the rows of the open directories into the RecycleView data.'''
+        if self.recycleview is not None:
+            self.recycleview.data = list(self._iter_visible_rows())
+
+if __name__ == '__main__':
+    from kivy.app import runTouchApp
+    import kivydesigner.uix.register_uix
+
+    rootdir = Path(__file__).parent.parent.parent
+    runTouchApp(RecycleFilechooser(rootpath=str(rootdir)))
@@ -0,0 +1,194 @@
+import bisect
+from pathlib import Path
+
+from kivy.properties import ObjectProperty, StringProperty, BooleanProperty
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.label import Label
+from kivy.lang import Builder
+from kivy.uix.boxlayout import BoxLayout
+from kivydesigner.classsearch import ClassNameIndex
+
+kv_filepath = Path(__file__).with_suffix('.kv')
+Builder.load_file(str(kv_filepath))
+
+'''
+The RecycleGroupListBox is a virtualized GroupListBox, for very large
+widget catalogs. It has the same interface as the GroupListBox, but the
+groups and entries are rows of a flat data model instead of TreeView nodes.
+
+Each row is a dict holding the text, and the group and selection state of
+the row. The RecycleView only creates ListBoxRow widgets for the visible
+rows, and rebinds them to other rows as the user scrolls. Collapsing a
+group removes its entry rows from the RecycleView data, but the rows
+themselves are kept by the group, so their state survives the collapse.
+
+Typing in the search box filters the entries with a ClassNameIndex of every
+item. Each keystroke only replaces the RecycleView data with the matching
+rows, so no widgets are created or removed while the user types.
+'''
+
+def _make_row(text, is_group=False):
+    # Every row has every key, since the RecycleView only
+    # applies the keys of a row to the recycled widget.
+    return {'text': text, 'is_group': is_group, 'is_open': is_group,
+            'is_selected': False, 'is_focused': False}
+
+class ListBoxRow(RecycleDataViewBehavior, Label):
+    is_group = BooleanProperty(False)
+    is_open = BooleanProperty(False)
+    is_selected = BooleanProperty(False)
+    is_focused = BooleanProperty(False)
+    '''See ListBoxNode.is_focused.'''
+
+    def __init__(self, **kwargs):
+        self.index = None
+        self.listbox = None
+        super().__init__(**kwargs)
+
+    def refresh_view_attrs(self, rv, index, data):
+        self.index = index
+        self.listbox = rv.listbox
+        return super().refresh_view_attrs(rv, index, data)
+
+    def on_touch_down(self, touch):
+        if not self.collide_point(*touch.pos):
+            return False
+        if self.listbox is not None and self.index is not None:
+            self.listbox.select_row(self.index)
+        return True
+
+class ListBoxRecycleView(RecycleView):
+    listbox = ObjectProperty(None)
+
+class RecycleGroupListBox(BoxLayout):
+
+    recycleview = ObjectProperty(None)
+    title = StringProperty("")
+    filter_text = StringProperty("")
+    '''Only the entries matching the filter text are shown. See classsearch.py.'''
+
+    def __init__(self, **kwargs):
+        self._groups = dict()
+        '''Map of group name to a (group row, {item: entry row}, sorted entry rows) tuple.'''
+        self._search_index = None
+        '''ClassNameIndex of the items of every group, built on the first search.'''
+        self._focused_row = None
+        self._selected_row = None
+        super().__init__(**kwargs)
+
+    def add_group(self, group_name, items):
+        entries = {item: _make_row(item) for item in items}
+        rows = [entries[item] for item in sorted(entries)]
+        self._groups[group_name] = (_make_row(group_name, is_group=True), entries, rows)
+        if self._search_index is not None:
+            for item in entries:
+                self._search_index.add(item)
+        self._refresh_data()
+
+    def update_group(self, group_name, items):
+        '''
+        Update the group to contain exactly the given items. Only the rows
+        that were added or removed are changed, and the group stays sorted.
+        Add the group if it does not exist.
+        '''
+        if group_name not in self._groups:
+            self.add_group(group_name, items)
+            return
+
+        _, entries, rows = self._groups[group_name]
+        items = set(items)
+        removed_items = entries.keys() - items
+        if removed_items:
+            for item in removed_items:
+                entries.pop(item)
+                self._unindex_item(item)
+            rows[:] = [row for row in rows if row['text'] in entries]
+        sorted_texts = [row['text'] for row in rows]
+        for item in sorted(items - entries.keys()):
+            row = _make_row(item)
+            idx = bisect.bisect(sorted_texts, item)
+            sorted_texts.insert(idx, item)
+            rows.insert(idx, row)
+            entries[item] = row
+            if self._search_index is not None:
+                self._search_index.add(item)
+        self._refresh_data()
+
+    def get_group_items(self, group_name):
+        '''Return the sorted list of items within the group.'''
+        if group_name not in self._groups:
+            return []
+        _, _, rows = self._groups[group_name]
+        return [row['text'] for row in rows]
+
+    def on_filter_text(self, instance, value):
+        self._refresh_data()
+
+    def toggle_group(self, group_name):
+        '''Expand or collapse the group.'''
+        group_row, _, _ = self._groups[group_name]
+        group_row['is_open'] = not group_row['is_open']
+        self._refresh_data()
+
+    def select_row(self, index):
+        '''
+        Select the entry row at the index of the RecycleView data, or toggle
+        the group row. Either way, the row becomes the focused row.
+        '''
+        row = self.recycleview.data[index]
+        if self._focused_row is not None:
+            self._focused_row['is_focused'] = False
+        row['is_focused'] = True
+        self._focused_row = row
+        if row['is_group']:
+            self.toggle_group(row['text'])
+            return
+        if self._selected_row is not None:
+            self._selected_row['is_selected'] = False
+        row['is_selected'] = True
+        self._selected_row = row
+        self.recycleview.refresh_from_data()
+
+    @property
+    def selected_item(self):
+        '''Return the text of the selected entry, or None.'''
+        return self._selected_row['text'] if self._selected_row else None
+
+    def clear(self):
+        '''Drop every group. The widgets are kept, and rebound to future rows.'''
+        self._groups = dict()
+        self._search_index = None
+        self._focused_row = None
+        self._selected_row = None
+        self.recycleview.data = []
+
+    def _get_search_index(self):
+        if self._search_index is None:
+            self._search_index = ClassNameIndex(item for _, entries, _ in self._groups.values() for item in entries)
+        return self._search_index
+
+    def _unindex_item(self, item):
+        # Items may belong to several groups
+        if self._search_index is not None and not any(item in entries for _, entries, _ in self._groups.values()):
+            self._search_index.remove(item)
+
+    def _refresh_data(self):
+        '''
+        Flatten the groups, and the entries of the open groups, into the
+        RecycleView data. Only the entries matching the filter text are added.
+        '''
+        matches = self._get_search_index().search(self.filter_text) if self.filter_text else None
+        data = list()
+        for group_row, entries, rows in self._groups.values():
+            data.append(group_row)
+            if not group_row['is_open']:
+                continue
+            if matches is None:
+                data.extend(rows)
+            elif len(matches) < len(rows) // 8:
+                # Sorting a few matches is cheaper than checking every row
+                data.extend(entries[item] for item in sorted(item for item in matches if item in entries))
+            else:
+                data.extend(row for row in rows if row['text'] in matches)
+        self.recycleview.data = data
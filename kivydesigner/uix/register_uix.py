@@ -10,6 +10,8 @@ Factory.register('FileToolbarGroup', module='kivydesigner.uix.toolbar')
 Factory.register('KivyVisualizer', module='kivydesigner.uix.kivyvisualizer')
 Factory.register('KDFilechooser', module='kivydesigner.uix.kdfilechooser')
 Factory.register('KDFilechooserLayout', module='kivydesigner.uix.kdfilechooser')
+Factory.register('RecycleFilechooser', module='kivydesigner.uix.recyclefilechooser')
 Factory.register('ModalMsg', module='kivydesigner.uix.modalmsg')
 Factory.register('GroupListBox', module='kivydesigner.uix.grouplistbox')
+Factory.register('RecycleGroupListBox', module='kivydesigner.uix.recyclegrouplistbox')
 Factory.register('KivyWidgetListBox', module='kivydesigner.uix.kivywidgetlistbox')
\ No newline at end of file